@@ -1,32 +1,59 @@
-from flask import Flask, render_template, request, jsonify, Response, redirect
+from flask import Flask, render_template, request, jsonify, Response, redirect, send_file
+from flask_sock import Sock
 import tempfile
 import ast
 import json
 import os
-import uuid
+import threading
 import requests as http_requests
-from services.context_parser import parse_context
+from services.context_parser import parse_context, stream_context
+from services.extraction_cache import extraction_cache
+from services.extractor_pool import extractor_pool
+from services.batch_ingestion import (
+    batch_limits,
+    batch_queue,
+    discover_items,
+    resolve_batch_output,
+    resolve_batch_path,
+    run_batch,
+)
+from services.job_queue import QueueFullError, current_job, job_queue
+from services.chat_sessions import create_session_store
 from services.form_schema_chat import (
     create_chat_session,
+    apply_compaction,
     chat_message_stream,
     finalize_stream,
-    parse_status_from_reply,
+    latest_exchange,
+    StatusStreamParser,
     request_summary_stream,
+    start_compaction,
+    start_form_data_update,
+    still_unmerged,
+    update_form_data,
 )
-from utils.paths import PROJECT_ROOT
-from utils.clients import DEEPGRAM_API_KEY, DEEPGRAM_BASE_URL
-from services.form_schema_generator import (
-    fill_form_with_data,
-    load_form_definition
-)
+from services.form_registry import get_form
+from services.pdf_to_json import check_page_selection, page_ranges
+from services.spreadsheet_to_json import resolve_sheet, workbook_sheet_names
+from services.speech_to_text import transcribe_upload
+from services.streaming_stt import open_stt_stream
+from services.text_to_speech import TTS_MIME_TYPE, TTS_MODEL, TTS_VOICE, TTS_VOICES, normalize_tts_text, synthesize_stream
+from services.tts_cache import make_tts_key, tts_cache
+from services.tts_pipeline import SpeechPipeline, wait_for_prefetch
+from services.form_schema_generator import fill_form_with_data
+from utils.pdf_rendering import PDF_MAX_DPI, warm_render_pool
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", os.urandom(24))
+sock = Sock(app)
 
-chat_sessions = {}
+chat_sessions = create_session_store()
 
-SCHEMA_PATH = os.path.join(PROJECT_ROOT, "forms_schema", "questionaire_schema.json")
-FORM_DEF_PATH = os.path.join(PROJECT_ROOT, "forms_schema", "questionaire.json")
+# PDF render workers import this module again as __mp_main__; only the server warms up
+if __name__ != "__mp_main__":
+    # Build extraction programs and open the provider connection off the request path
+    threading.Thread(target=extractor_pool.warm, daemon=True).start()
+    threading.Thread(target=warm_render_pool, daemon=True).start()
 
 TYPE_MAP = {
     "text": "text",
@@ -47,78 +74,173 @@ def form_context_route():
     return render_template('form_context.html', mode=mode)
 
 
-@app.route('/parse-context', methods=['POST'])
-def parse_context_route():
-    print("\n" + "=" * 60)
-    print("[parse-context] REQUEST RECEIVED")
-    print("=" * 60)
+def remove_temp_file(tmp_path):
+    if tmp_path and os.path.exists(tmp_path):
+        print(f"[parse-context] Cleaning up temp file: {tmp_path}")
+        os.unlink(tmp_path)
+
+
+def read_context_options():
+    """Parser options from the form, validated; raises ValueError on bad input."""
+    options = {}
+    if request.form.get("pages"):
+        # Checked here so a malformed selection is a 400, not a failed extraction
+        page_ranges(request.form["pages"])
+        options["pages"] = request.form["pages"]
+    if request.form.get("dpi"):
+        try:
+            dpi = int(request.form["dpi"])
+        except ValueError:
+            raise ValueError(f"dpi must be an integer, got '{request.form['dpi']}'")
+        if dpi < 1:
+            raise ValueError(f"dpi must be positive, got {dpi}")
+        options["dpi"] = min(dpi, PDF_MAX_DPI)
+    if request.form.get("sheet"):
+        options["sheet"] = request.form["sheet"]
+    return options
+
+
+def read_context_request():
+    """
+    Read the inputs shared by the parse-context routes.
+
+    Returns:
+        (path_or_text, parser_type, options, tmp_path); tmp_path is the saved
+        upload the caller must remove, or None for text input
+
+    Raises:
+        ValueError: if a file type is requested without a file, or an option
+            is malformed
+    """
     print(f"[parse-context] Content-Type header: {request.content_type}")
     print(f"[parse-context] Form fields: {list(request.form.keys())}")
     print(f"[parse-context] Files: {list(request.files.keys())}")
 
     context_type = request.form.get("type", "text")
     print(f"[parse-context] context_type: '{context_type}'")
+    # Validated before the upload is saved, so a bad option leaves no temp file
+    options = read_context_options()
+    tmp_path = None
+
+    if context_type == "text":
+        path_or_text = request.form.get("text", "")
+        print(f"[parse-context] Text input length: {len(path_or_text)} chars")
+        print(f"[parse-context] Text preview: '{path_or_text[:200]}{'...' if len(path_or_text) > 200 else ''}'")
+    else:
+        file = request.files.get("file")
+        print(f"[parse-context] File object: {file}")
+        if file:
+            print(f"[parse-context] File name: '{file.filename}'")
+            print(f"[parse-context] File content_type: '{file.content_type}'")
+        if not file:
+            print("[parse-context] ERROR: No file found in request")
+            raise ValueError("No file provided")
+
+        suffix = os.path.splitext(file.filename)[1] or ".bin"
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        file.save(tmp)
+        tmp.close()
+        tmp_path = tmp.name
+        file_size = os.path.getsize(tmp_path)
+        path_or_text = tmp_path
+        print(f"[parse-context] Saved to temp file: '{tmp_path}' ({file_size} bytes)")
+
+    parser_type = TYPE_MAP.get(context_type, "text")
+    print(f"[parse-context] Mapped parser_type: '{parser_type}'")
+
+    # Options that don't fit the upload (unknown sheet, pages past the end)
+    # are the caller's mistake, reported before extraction starts
+    try:
+        if parser_type == "spreadsheet" and options.get("sheet") and tmp_path.endswith((".xlsx", ".xls")):
+            resolve_sheet(workbook_sheet_names(tmp_path), options["sheet"])
+        elif parser_type == "pdf" and tmp_path.lower().endswith(".pdf"):
+            check_page_selection(tmp_path, options.get("pages"))
+    except Exception:
+        remove_temp_file(tmp_path)
+        raise
+
+    return path_or_text, parser_type, options, tmp_path
+
+
+def result_payload(prediction, form):
+    """Build the /parse-context response body from an extraction result."""
+    form_data = prediction.json_result
+    if isinstance(form_data, str):
+        try:
+            form_data = json.loads(form_data)
+        except json.JSONDecodeError:
+            form_data = ast.literal_eval(form_data)
+    reasoning = prediction.reasoning
+    print(f"[parse-context] form_data (type={type(form_data).__name__}): {form_data}")
+    print(f"[parse-context] reasoning: {reasoning[:300] if reasoning else 'None'}{'...' if reasoning and len(reasoning) > 300 else ''}")
+
+    payload = {
+        "success": True,
+        "form_data": form_data,
+        "reasoning": reasoning,
+        "field_schema": form.field_schema,
+        "cached": prediction.get("cached", False),
+    }
+    if prediction.get("pages"):
+        payload["pages"] = prediction.pages
+    return payload
+
+
+def run_parse_context(path_or_text, parser_type, form, options):
+    """Run an extraction and build the /parse-context response payload."""
+    result_schema = form.schema_str
+    print(f"[parse-context] Using schema for form '{form.form_id}' ({len(result_schema)} chars)")
+
+    print(f"[parse-context] Calling parse_context(path_or_text, '{parser_type}', schema, {options})...")
+    prediction = parse_context(path_or_text, parser_type, result_schema, options)
+    print(f"[parse-context] parse_context returned: {type(prediction)}")
+    return result_payload(prediction, form)
+
+
+@app.route('/parse-context', methods=['POST'])
+def parse_context_route():
+    print("\n" + "=" * 60)
+    print("[parse-context] REQUEST RECEIVED")
+    print("=" * 60)
     tmp_path = None
 
     try:
-        if context_type == "text":
-            path_or_text = request.form.get("text", "")
-            print(f"[parse-context] Text input length: {len(path_or_text)} chars")
-            print(f"[parse-context] Text preview: '{path_or_text[:200]}{'...' if len(path_or_text) > 200 else ''}'")
-        else:
-            file = request.files.get("file")
-            print(f"[parse-context] File object: {file}")
-            if file:
-                print(f"[parse-context] File name: '{file.filename}'")
-                print(f"[parse-context] File content_type: '{file.content_type}'")
-            if not file:
-                print("[parse-context] ERROR: No file found in request")
-                return jsonify({"success": False, "error": "No file provided"}), 400
-
-            suffix = os.path.splitext(file.filename)[1] or ".bin"
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            file.save(tmp)
-            tmp.close()
-            tmp_path = tmp.name
-            file_size = os.path.getsize(tmp_path)
-            path_or_text = tmp_path
-            print(f"[parse-context] Saved to temp file: '{tmp_path}' ({file_size} bytes)")
-
-        parser_type = TYPE_MAP.get(context_type, "text")
-        print(f"[parse-context] Mapped parser_type: '{parser_type}'")
-
-        print(f"[parse-context] Loading schema from: {SCHEMA_PATH}")
-        with open(SCHEMA_PATH, "r") as f:
-            result_schema = f.read()
-        print(f"[parse-context] Schema loaded ({len(result_schema)} chars)")
-
-        print(f"[parse-context] Calling parse_context(path_or_text, '{parser_type}', schema)...")
-        prediction = parse_context(path_or_text, parser_type, result_schema)
-        print(f"[parse-context] parse_context returned: {type(prediction)}")
-        form_data = prediction.json_result
-        if isinstance(form_data, str):
+        form = get_form(request.form.get("form_id"))
+    except KeyError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        try:
+            path_or_text, parser_type, options, tmp_path = read_context_request()
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if request.form.get("async") == "1":
+            timeout = request.form.get("timeout", type=float)
             try:
-                form_data = json.loads(form_data)
-            except json.JSONDecodeError:
-                form_data = ast.literal_eval(form_data)
-        reasoning = prediction.reasoning
-        print(f"[parse-context] form_data (type={type(form_data).__name__}): {form_data}")
-        print(f"[parse-context] reasoning: {reasoning[:300] if reasoning else 'None'}{'...' if reasoning and len(reasoning) > 300 else ''}")
-
-        print(f"[parse-context] Loading schema for field types...")
-        with open(SCHEMA_PATH, "r") as sf:
-            schema_obj = json.loads(sf.read())
-        field_schema = schema_obj.get("properties", {})
+                job = job_queue.submit(
+                    "parse-context", run_parse_context, path_or_text, parser_type, form, options,
+                    timeout=timeout, cleanup=lambda path=tmp_path: remove_temp_file(path)
+                )
+            except QueueFullError as e:
+                return jsonify({"success": False, "error": f"Server busy: {e}"}), 503, {"Retry-After": "5"}
+            # The job owns the temp file from here on
+            tmp_path = None
+            print(f"[parse-context] Queued as job {job.id}")
+            return jsonify({
+                "success": True,
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/jobs/{job.id}",
+                "events_url": f"/jobs/{job.id}/events",
+            }), 202
+
+        payload = run_parse_context(path_or_text, parser_type, form, options)
 
         print("[parse-context] SUCCESS - returning response")
         print("=" * 60 + "\n")
 
-        return jsonify({
-            "success": True,
-            "form_data": form_data,
-            "reasoning": reasoning,
-            "field_schema": field_schema,
-        })
+        return jsonify(payload)
 
     except Exception as e:
         print(f"[parse-context] EXCEPTION: {type(e).__name__}: {e}")
@@ -127,9 +249,176 @@ def parse_context_route():
         raise e
 
     finally:
-        if tmp_path and os.path.exists(tmp_path):
-            print(f"[parse-context] Cleaning up temp file: {tmp_path}")
-            os.unlink(tmp_path)
+        remove_temp_file(tmp_path)
+
+
+@app.route('/parse-context-stream', methods=['POST'])
+def parse_context_stream_route():
+    print("\n" + "=" * 60)
+    print("[parse-context] STREAM REQUEST RECEIVED")
+    print("=" * 60)
+
+    try:
+        form = get_form(request.form.get("form_id"))
+        path_or_text, parser_type, options, tmp_path = read_context_request()
+    except (KeyError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    # The generator outlives the request, so it owns the temp file
+    def generate():
+        try:
+            yield f"data: {json.dumps({'start': True, 'field_schema': form.field_schema})}\n\n"
+            for event in stream_context(path_or_text, parser_type, form.schema_str, options):
+                if "result" in event:
+                    done_payload = {'done': True, **result_payload(event["result"], form)}
+                    yield f"data: {json.dumps(done_payload)}\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            print(f"[parse-context] STREAM EXCEPTION: {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            yield f"data: {json.dumps({'done': True, 'success': False, 'error': str(e)})}\n\n"
+        finally:
+            remove_temp_file(tmp_path)
+
+    return Response(generate(), mimetype="text/event-stream")
+
+
+def run_batch_job(items, result_schema, output_path, concurrency, rate, resume):
+    job = current_job()
+    return run_batch(
+        items, result_schema, output_path,
+        concurrency=concurrency, rate=rate, resume=resume,
+        on_progress=lambda summary: job.update(progress=summary)
+    )
+
+
+@app.route('/batch', methods=['POST'])
+def batch_route():
+    """Start a bulk extraction of a server-side folder or manifest as a background job."""
+    data = request.get_json(silent=True) or {}
+    try:
+        form = get_form(data.get("form_id"))
+        source = resolve_batch_path(data.get("source") or "")
+        output_path = resolve_batch_output(data.get("output"), source)
+        concurrency, rate = batch_limits(data.get("concurrency"), data.get("rate"))
+        items = discover_items(source, confined=True)
+    except (KeyError, ValueError, TypeError, OSError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        job = batch_queue.submit(
+            "batch", run_batch_job, items, form.schema_str, output_path,
+            concurrency, rate, bool(data.get("resume", True))
+        )
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Server busy: {e}"}), 503, {"Retry-After": "5"}
+
+    print(f"[batch] Queued {len(items)} items from {source} as job {job.id}")
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "items": len(items),
+        "output": output_path,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }), 202
+
+
+def find_job(job_id):
+    """(queue, job) for a job id from either queue, or (None, None)."""
+    for queue in (job_queue, batch_queue):
+        job = queue.get(job_id)
+        if job is not None:
+            return queue, job
+    return None, None
+
+
+@app.route('/jobs', methods=['GET'])
+def jobs_stats_route():
+    return jsonify({**job_queue.stats(), "batch": batch_queue.stats()})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    _, job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def job_cancel_route(job_id):
+    queue, job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    queue.cancel(job_id)
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events_route(job_id):
+    _, job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def generate():
+        version = -1
+        while True:
+            new_version = job.wait_for_change(version, timeout=15)
+            if new_version == version:
+                # Keep idle proxies from closing the stream
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.done:
+                break
+
+    return Response(generate(), mimetype="text/event-stream")
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats_route():
+    if extraction_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **extraction_cache.stats()})
+
+
+def speech_events(segments):
+    """SSE events announcing sentence audio, in playback order."""
+    for segment in segments:
+        yield f"data: {json.dumps({'speech': segment})}\n\n"
+
+
+def reply_events(stream, speech=None):
+    """
+    Relay a chat completion stream as SSE events and return the full reply.
+
+    The STATUS block is withheld from the tokens and sent as a single
+    field_status event as soon as it closes.
+    """
+    status_parser = StatusStreamParser()
+    full_reply = ""
+
+    def events(visible, field_status):
+        if visible:
+            yield f"data: {json.dumps({'token': visible})}\n\n"
+            if speech:
+                yield from speech_events(speech.feed(visible))
+        if field_status is not None:
+            yield f"data: {json.dumps({'field_status': field_status})}\n\n"
+
+    for chunk in stream:
+        delta = chunk.choices[0].delta
+        if delta.content:
+            full_reply += delta.content
+            yield from events(*status_parser.feed(delta.content))
+    yield from events(*status_parser.flush())
+    if speech:
+        yield from speech_events(speech.flush())
+    return full_reply
 
 
 @app.route('/chat-start', methods=['POST'])
@@ -137,31 +426,28 @@ def chat_start_route():
     data = request.get_json(silent=True) or {}
     role = data.get("role", "patient")
 
-    with open(SCHEMA_PATH, "r") as f:
-        schema_str = f.read()
-    session_id = str(uuid.uuid4())
-    messages = create_chat_session(schema_str, role=role)
-    chat_sessions[session_id] = messages
+    try:
+        form = get_form(data.get("form_id"))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 400
+
+    messages = create_chat_session(form.schema_str, role=role)
+    session_id = chat_sessions.create({"messages": messages, "form_id": form.form_id, "form_data": {}})
 
     greeting = "Hello, I'm here for my appointment." if role == "patient" else "I need to enter patient intake data."
+    speech = SpeechPipeline() if data.get("speak") else None
 
     def generate():
         stream, msgs = chat_message_stream(messages, greeting)
-        full_reply = ""
-        for chunk in stream:
-            delta = chunk.choices[0].delta
-            if delta.content:
-                full_reply += delta.content
-                yield f"data: {json.dumps({'token': delta.content})}\n\n"
-        visible_text, field_status = parse_status_from_reply(full_reply)
+        full_reply = yield from reply_events(stream, speech)
         finalize_stream(msgs, full_reply)
         # Remove the fake user message, keep system + assistant
-        chat_sessions[session_id] = [m for m in msgs if m["role"] != "user"]
-        done_payload = {'done': True, 'session_id': session_id}
-        if field_status:
-            done_payload['field_status'] = field_status
-            done_payload['visible_end'] = len(visible_text)
-        yield f"data: {json.dumps(done_payload)}\n\n"
+        chat_sessions.save(session_id, {
+            "messages": [m for m in msgs if m["role"] != "user"],
+            "form_id": form.form_id,
+            "form_data": {},
+        })
+        yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
 
     return Response(generate(), mimetype="text/event-stream")
 
@@ -172,43 +458,111 @@ def chat_message_route():
     session_id = data.get("session_id")
     user_msg = data.get("message", "")
 
-    if not session_id or session_id not in chat_sessions:
+    session = chat_sessions.get(session_id) if session_id else None
+    if session is None:
         return jsonify({"error": "Invalid session"}), 400
 
-    messages = chat_sessions[session_id]
+    messages = session["messages"]
+    try:
+        form = get_form(session.get("form_id"))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 400
+    speech = SpeechPipeline() if data.get("speak") else None
 
     def generate():
-        stream, msgs = chat_message_stream(messages, user_msg)
-        full_reply = ""
-        for chunk in stream:
-            delta = chunk.choices[0].delta
-            if delta.content:
-                full_reply += delta.content
-                yield f"data: {json.dumps({'token': delta.content})}\n\n"
-        visible_text, field_status = parse_status_from_reply(full_reply)
+        # Exchanges a failed or pending update hasn't merged yet are retried with this one
+        unmerged = session.get("unmerged_messages", []) + latest_exchange(messages, user_msg)
+        form_update = start_form_data_update(form.schema_str, session.get("form_data") or {}, unmerged)
+        history, summary = apply_compaction(session_id, messages, session.get("summary"))
+        stream, msgs = chat_message_stream(history, user_msg, summary)
+        full_reply = yield from reply_events(stream, speech)
         finalize_stream(msgs, full_reply)
-        chat_sessions[session_id] = msgs
-        done_payload = {'done': True}
-        if field_status:
-            done_payload['field_status'] = field_status
-            done_payload['visible_end'] = len(visible_text)
-        yield f"data: {json.dumps(done_payload)}\n\n"
+        # The reply is saved and the client released right away; the form
+        # data lands in the session whenever its update finishes
+        chat_sessions.save(session_id, {
+            **session,
+            "messages": msgs,
+            "summary": summary,
+            "unmerged_messages": unmerged,
+        })
+        form_update.add_done_callback(lambda future: save_form_data_update(session_id, unmerged, future))
+        # Summarized after the reply and applied on the next turn
+        start_compaction(session_id, msgs, summary)
+        yield f"data: {json.dumps({'done': True})}\n\n"
 
     return Response(generate(), mimetype="text/event-stream")
 
 
+def save_form_data(session_id, merged, form_data):
+    """Store `form_data` built from the `merged` messages, unless a later update got there first."""
+    def change(fields):
+        remaining = still_unmerged(fields.get("unmerged_messages", []), merged)
+        if remaining is None:
+            return None
+        return {"form_data": form_data, "unmerged_messages": remaining}
+
+    chat_sessions.update(session_id, change)
+
+
+def save_form_data_update(session_id, merged, future):
+    """Done callback of a chat turn's form data update."""
+    try:
+        save_form_data(session_id, merged, future.result())
+    except Exception as e:
+        print(f"[chat] Form data update failed, {len(merged)} messages left to merge: {type(e).__name__}: {e}")
+
+
+@app.route('/chat-form-data', methods=['POST'])
+def chat_form_data_route():
+    """Form data collected so far in a chat, kept up to date after every turn."""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get("session_id")
+    session = chat_sessions.get(session_id) if session_id else None
+    if session is None:
+        return jsonify({"success": False, "error": "Invalid session"}), 400
+
+    try:
+        form = get_form(session.get("form_id"))
+    except KeyError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    form_data = session.get("form_data") or {}
+    if session.get("unmerged_messages"):
+        # A turn's update failed or is still running: catch up now rather than return partial data
+        try:
+            form_data = update_form_data(form.schema_str, form_data, session["unmerged_messages"])
+        except Exception as e:
+            print(f"[chat] Form data catch-up failed: {type(e).__name__}: {e}")
+            return jsonify({"success": False, "error": "Form data is incomplete"}), 503
+        save_form_data(session_id, session["unmerged_messages"], form_data)
+
+    return jsonify({
+        "success": True,
+        "form_data": form_data,
+        "reasoning": None,
+        "field_schema": form.field_schema,
+        "cached": False,
+    })
+
+
+@app.route('/chat-sessions/stats', methods=['GET'])
+def chat_sessions_stats_route():
+    return jsonify(chat_sessions.stats())
+
+
 @app.route('/chat-summary', methods=['POST'])
 def chat_summary_route():
     data = request.get_json()
     session_id = data.get("session_id")
 
-    if not session_id or session_id not in chat_sessions:
+    session = chat_sessions.get(session_id) if session_id else None
+    if session is None:
         return jsonify({"error": "Invalid session"}), 400
 
-    messages = chat_sessions[session_id]
+    messages = session["messages"]
 
     def generate():
-        stream, msgs = request_summary_stream(messages)
+        stream, msgs = request_summary_stream(messages, session.get("summary"))
         full_reply = ""
         for chunk in stream:
             delta = chunk.choices[0].delta
@@ -216,34 +570,62 @@ def chat_summary_route():
                 full_reply += delta.content
                 yield f"data: {json.dumps({'token': delta.content})}\n\n"
         finalize_stream(msgs, full_reply)
-        chat_sessions[session_id] = msgs
+        chat_sessions.save(session_id, {**session, "messages": msgs})
         yield f"data: {json.dumps({'done': True, 'summary': full_reply})}\n\n"
 
     return Response(generate(), mimetype="text/event-stream")
 
 
-@app.route('/tts', methods=['POST'])
+# Synthesized audio is addressed by its text, voice and model, so it never changes
+TTS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.route('/tts', methods=['GET', 'POST'])
 def tts_route():
-    data = request.get_json()
-    text = data.get("text", "")
-    text = text.replace("*", "").replace("_", "").replace("`", "")
+    data = request.get_json(silent=True) or request.args
+    text = normalize_tts_text(data.get("text", ""))
+    voice = data.get("voice") or TTS_VOICE
     if not text:
         return jsonify({"error": "No text provided"}), 400
+    if voice not in TTS_VOICES:
+        return jsonify({"error": f"Unknown voice: {voice}"}), 400
 
-    resp = http_requests.post(
-        "https://api.deepgram.com/v1/speak?model=aura-2-thalia-en",
-        headers={
-            "Authorization": f"Token {DEEPGRAM_API_KEY}",
-            "Content-Type": "application/json",
-        },
-        json={"text": text},
-        stream=True,
-    )
+    key = make_tts_key(text, voice, TTS_MODEL)
+    headers = {"ETag": f'"{key}"', "Cache-Control": TTS_CACHE_CONTROL}
+    if request.if_none_match.contains(key):
+        return Response(status=304, headers=headers)
 
-    return Response(
-        resp.iter_content(chunk_size=4096),
-        mimetype="audio/mpeg",
-    )
+    try:
+        # Sentences announced by a chat stream may still be synthesizing
+        wait_for_prefetch(key)
+    except Exception as e:
+        print(f"[tts] Prefetch of {key[:12]} not usable: {type(e).__name__}: {e}")
+
+    cached_path = tts_cache.get(key) if tts_cache else None
+    if cached_path:
+        response = send_file(cached_path, mimetype=TTS_MIME_TYPE, conditional=True)
+        response.headers.update(headers)
+        response.headers["X-TTS-Cache"] = "hit"
+        return response
+
+    try:
+        chunks = synthesize_stream(text, voice=voice)
+    except http_requests.RequestException as e:
+        print(f"[tts] Synthesis failed: {e}")
+        return jsonify({"error": "Speech synthesis failed"}), 502
+    if tts_cache:
+        chunks = tts_cache.store_stream(key, chunks)
+
+    response = Response(chunks, mimetype=TTS_MIME_TYPE, headers=headers)
+    response.headers["X-TTS-Cache"] = "miss" if tts_cache else "disabled"
+    return response
+
+
+@app.route('/tts/stats', methods=['GET'])
+def tts_stats_route():
+    if tts_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **tts_cache.stats()})
 
 
 @app.route('/stt', methods=['POST'])
@@ -252,27 +634,82 @@ def stt_route():
     if not file:
         return jsonify({"error": "No audio file"}), 400
 
-    audio_data = file.read()
-    resp = http_requests.post(
-        f"{DEEPGRAM_BASE_URL}/listen?smart_format=true&model=nova-3",
-        headers={
-            "Authorization": f"Token {DEEPGRAM_API_KEY}",
-            "Content-Type": file.content_type or "audio/webm",
-        },
-        data=audio_data,
-    )
-    result = resp.json()
-    transcript = result["results"]["channels"][0]["alternatives"][0]["transcript"]
+    # Normalized and read from the upload stream in chunks instead of file.read()
+    try:
+        transcript = transcribe_upload(file.stream, file.content_type or "audio/webm", language=None)
+    except http_requests.RequestException as e:
+        print(f"[stt] Deepgram request failed: {e}")
+        return jsonify({"error": "Transcription failed"}), 502
     return jsonify({"transcript": transcript})
 
 
+@sock.route('/stt-stream')
+def stt_stream_route(ws):
+    """
+    Live transcription over a WebSocket.
+
+    The client sends an optional {"type": "start", "content_type", "language"}
+    message, then binary audio chunks (MediaRecorder timeslices), then
+    {"type": "stop"}. The server answers with {"type": "transcript",
+    "transcript", "is_final"} as results arrive and a final {"type": "done",
+    "transcript"}.
+    """
+    send_lock = threading.Lock()
+
+    def send(event):
+        # Transcripts arrive on the backend's reader thread
+        with send_lock:
+            ws.send(json.dumps(event))
+
+    def on_transcript(transcript, is_final):
+        send({"type": "transcript", "transcript": transcript, "is_final": is_final})
+
+    session = None
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if isinstance(message, (bytes, bytearray)):
+                if session is None:
+                    session = open_stt_stream(on_transcript, content_type="audio/webm")
+                session.send(bytes(message))
+                continue
+
+            data = json.loads(message)
+            if data.get("type") == "start" and session is None:
+                session = open_stt_stream(
+                    on_transcript,
+                    content_type=data.get("content_type"),
+                    language=data.get("language"),
+                )
+            elif data.get("type") == "stop":
+                transcript = session.finish() if session else ""
+                send({"type": "done", "transcript": transcript})
+                break
+    except Exception as e:
+        print(f"[stt-stream] {type(e).__name__}: {e}")
+        try:
+            send({"type": "error", "error": "Transcription failed"})
+        except Exception as e:
+            # The client is already gone
+            print(f"[stt-stream] Could not report the error: {type(e).__name__}: {e}")
+    finally:
+        if session:
+            session.close()
+
+
 @app.route('/fill-form', methods=['POST'])
 def fill_form_route():
     data = request.get_json()
     form_data = data.get("form_data", {})
 
-    form_def = load_form_definition(FORM_DEF_PATH)
-    result = fill_form_with_data(form_def, form_data)
+    try:
+        form = get_form(data.get("form_id"))
+    except KeyError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    result = fill_form_with_data(form.definition, form_data)
 
     return jsonify(result)
 
@@ -0,0 +1,356 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from services.context_parser import parse_context
+from services.job_queue import JobQueue
+from services.result_merging import parse_json_result
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Items started per second across all workers, 0 for no limit
+BATCH_RATE_PER_SECOND = float(os.getenv("BATCH_RATE_PER_SECOND", "0"))
+# Upper bounds for the values a /batch request may ask for
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_RATE_PER_SECOND = float(os.getenv("BATCH_MAX_RATE_PER_SECOND", "20"))
+# Batches run as background jobs; a job's timeout only marks it, work continues
+BATCH_JOB_TIMEOUT_SECONDS = float(os.getenv("BATCH_JOB_TIMEOUT_SECONDS", str(24 * 3600)))
+# Batches run at once; they have their own workers so they never hold up /parse-context jobs
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", "1"))
+BATCH_MAX_QUEUED = int(os.getenv("BATCH_MAX_QUEUED", "4"))
+# The /batch endpoint only reads below this data directory, kept out of the code tree
+BATCH_ROOT = os.getenv("BATCH_ROOT", os.path.join(os.path.expanduser("~"), "hdf-batch"))
+# ...and only writes .jsonl results below this subdirectory of it
+BATCH_RESULTS_DIR = "results"
+
+EXTENSION_TYPES = {
+	".png": "image", ".jpg": "image", ".jpeg": "image", ".webp": "image", ".gif": "image", ".bmp": "image",
+	".pdf": "pdf",
+	".csv": "spreadsheet", ".xlsx": "spreadsheet", ".xls": "spreadsheet",
+	".json": "json",
+	".txt": "text", ".md": "text",
+	".m4a": "audio", ".mp3": "audio", ".wav": "audio", ".webm": "audio", ".ogg": "audio",
+}
+
+
+def context_type_for(path: str) -> Optional[str]:
+	return EXTENSION_TYPES.get(os.path.splitext(path)[1].lower())
+
+
+def make_item(path: str, item_id: str = None, context_type: str = None, options: dict = None) -> dict:
+	return {
+		"id": item_id or path,
+		"path": path,
+		"type": context_type or context_type_for(path),
+		"options": options or {},
+	}
+
+
+def discover_items(source: str, confined: bool = False) -> list[dict]:
+	"""
+	List the items of a batch.
+
+	`source` is either a directory, scanned recursively for supported files,
+	or a manifest: a .jsonl file of {"path", "type"?, "id"?, "options"?}
+	objects, a .csv file with path and optional type/id columns, or a text
+	file with one path per line. Relative paths are resolved against the
+	manifest's directory.
+
+	Raises:
+		ValueError: if `confined` and an item (manifest entry or symlink)
+			points outside BATCH_ROOT
+	"""
+	if os.path.isdir(source):
+		items = []
+		for root, dirs, files in os.walk(source):
+			dirs.sort()
+			for name in sorted(files):
+				path = os.path.join(root, name)
+				if context_type_for(path):
+					item_id = os.path.relpath(path, source)
+					items.append(make_item(resolve_batch_path(path) if confined else path, item_id=item_id))
+		return items
+
+	base_dir = os.path.dirname(os.path.abspath(source))
+	if source.endswith(".jsonl"):
+		with open(source) as f:
+			entries = [json.loads(line) for line in f if line.strip()]
+	elif source.endswith(".csv"):
+		with open(source, newline="") as f:
+			entries = list(csv.DictReader(f))
+	else:
+		with open(source) as f:
+			entries = [{"path": line.strip()} for line in f if line.strip() and not line.startswith("#")]
+
+	items = []
+	for entry in entries:
+		path = os.path.join(base_dir, entry["path"])
+		if confined:
+			path = resolve_batch_path(path)
+		item = make_item(path, entry.get("id") or entry["path"], entry.get("type") or None, entry.get("options"))
+		if not item["type"]:
+			raise ValueError(f"Cannot infer the context type of {entry['path']}, set 'type' in the manifest")
+		items.append(item)
+	return items
+
+
+def is_batch_output(output_path: str) -> bool:
+	"""True when `output_path` is missing, empty or starts with a record written by run_batch."""
+	if not os.path.exists(output_path):
+		return True
+	with open(output_path, encoding="utf-8", errors="replace") as f:
+		first_line = f.readline()
+	if not first_line.strip():
+		return True
+	try:
+		record = json.loads(first_line)
+	except json.JSONDecodeError:
+		return False
+	return isinstance(record, dict) and {"id", "status", "type"} <= record.keys()
+
+
+def load_checkpoint(output_path: str) -> set:
+	"""Ids already extracted successfully in a previous run of the same output file."""
+	done = set()
+	if not os.path.exists(output_path):
+		return done
+	with open(output_path) as f:
+		for line in f:
+			try:
+				record = json.loads(line)
+			except json.JSONDecodeError:
+				# A line cut short by a crash
+				continue
+			if record.get("status") == "ok":
+				done.add(record["id"])
+	return done
+
+
+class RateLimiter:
+	"""Spaces out acquire() calls to at most `rate` per second, shared by all threads."""
+
+	def __init__(self, rate: float):
+		self.interval = 1.0 / rate if rate > 0 else 0.0
+		self.next_slot = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self) -> None:
+		if not self.interval:
+			return
+		with self._lock:
+			now = time.monotonic()
+			slot = max(self.next_slot, now)
+			self.next_slot = slot + self.interval
+		if slot > now:
+			time.sleep(slot - now)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BatchStats:
+	def __init__(self, total: int, skipped: int):
+		self.total = total
+		self.skipped = skipped
+		self.succeeded = 0
+		self.failed = 0
+		self.latencies = {}
+		self.started = time.perf_counter()
+		self._lock = threading.Lock()
+
+	def record(self, context_type: str, ok: bool, elapsed_ms: float) -> None:
+		with self._lock:
+			if ok:
+				self.succeeded += 1
+			else:
+				self.failed += 1
+			self.latencies.setdefault(context_type, []).append(elapsed_ms)
+
+	def summary(self) -> dict:
+		with self._lock:
+			elapsed = time.perf_counter() - self.started
+			processed = self.succeeded + self.failed
+			return {
+				"total": self.total,
+				"skipped": self.skipped,
+				"succeeded": self.succeeded,
+				"failed": self.failed,
+				"elapsed_s": round(elapsed, 2),
+				"items_per_minute": round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+				"latency_ms": {
+					context_type: {
+						"count": len(values),
+						"mean": round(sum(values) / len(values)),
+						"p50": round(percentile(values, 0.5)),
+						"p95": round(percentile(values, 0.95)),
+					}
+					for context_type, values in sorted(self.latencies.items())
+				},
+			}
+
+
+def process_item(item: dict, result_schema: str) -> dict:
+	start = time.perf_counter()
+	record = {"id": item["id"], "path": item["path"], "type": item["type"]}
+	try:
+		path_or_text = item["path"]
+		if item["type"] == "text":
+			with open(path_or_text, encoding="utf-8") as f:
+				path_or_text = f.read()
+		prediction = parse_context(path_or_text, item["type"], result_schema, item["options"])
+		record.update(
+			status="ok",
+			form_data=parse_json_result(prediction.json_result),
+			reasoning=prediction.reasoning,
+			cached=prediction.get("cached", False),
+		)
+	except Exception as e:
+		record.update(status="error", error=f"{type(e).__name__}: {e}")
+	record["elapsed_ms"] = round((time.perf_counter() - start) * 1000)
+	return record
+
+
+def run_batch(items: list[dict], result_schema: str, output_path: str,
+			  concurrency: int = BATCH_CONCURRENCY, rate: float = BATCH_RATE_PER_SECOND,
+			  resume: bool = True, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+	"""
+	Extract every item and append one JSON line per result to `output_path`.
+
+	Each line is flushed as soon as its item finishes, so the output file is
+	also the checkpoint: with `resume`, items already recorded as "ok" are
+	skipped and failed ones are retried.
+
+	Returns:
+		The BatchStats summary: counts, throughput and latency per context type
+	"""
+	if not is_batch_output(output_path):
+		raise ValueError(f"Refusing to overwrite a file that is not a batch results file: {output_path}")
+	done = load_checkpoint(output_path) if resume else set()
+	pending = [item for item in items if item["id"] not in done]
+	stats = BatchStats(total=len(items), skipped=len(items) - len(pending))
+	limiter = RateLimiter(rate)
+	write_lock = threading.Lock()
+	print(f"[batch] {len(pending)} items to process, {stats.skipped} already done, concurrency={concurrency}, rate={rate or 'unlimited'}/s")
+
+	os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+	with open(output_path, "a" if resume else "w", encoding="utf-8") as output, \
+			ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+
+		def finish(record):
+			stats.record(record["type"], record["status"] == "ok", record["elapsed_ms"])
+			with write_lock:
+				output.write(json.dumps(record, ensure_ascii=False) + "\n")
+				output.flush()
+				os.fsync(output.fileno())
+			print(f"[batch] {record['status']:5} {record['type']:11} {record['elapsed_ms']:>7} ms  {record['id']}")
+			if on_progress:
+				on_progress(stats.summary())
+
+		# Keep at most `concurrency` items in flight so the rate limit holds
+		in_flight = set()
+		for item in pending:
+			if len(in_flight) >= concurrency:
+				finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+				for future in finished:
+					finish(future.result())
+			limiter.acquire()
+			in_flight.add(pool.submit(process_item, item, result_schema))
+		for future in wait(in_flight).done:
+			finish(future.result())
+
+	summary = stats.summary()
+	print(f"[batch] Done: {summary['succeeded']} ok, {summary['failed']} failed, {summary['skipped']} skipped "
+		  f"in {summary['elapsed_s']} s ({summary['items_per_minute']} items/min)")
+	for context_type, latency in summary["latency_ms"].items():
+		print(f"[batch]   {context_type:11} n={latency['count']:<4} mean={latency['mean']} ms  p50={latency['p50']} ms  p95={latency['p95']} ms")
+	return summary
+
+
+def resolve_batch_path(path: str) -> str:
+	"""Resolve a path sent to the /batch endpoint, refusing anything outside BATCH_ROOT."""
+	root = os.path.realpath(BATCH_ROOT)
+	resolved = os.path.realpath(os.path.join(root, path))
+	if resolved != root and not resolved.startswith(root + os.sep):
+		raise ValueError(f"Path is outside the batch root: {path}")
+	return resolved
+
+
+def batch_limits(concurrency, rate) -> tuple[int, float]:
+	"""
+	Parse the concurrency and rate of a /batch request, clamped to the
+	configured maximums.
+
+	Raises:
+		ValueError: if either is not a number
+	"""
+	concurrency = int(BATCH_CONCURRENCY if concurrency is None else concurrency)
+	rate = float(BATCH_RATE_PER_SECOND if rate is None else rate)
+	if rate != rate:
+		raise ValueError("rate must be a number")
+	concurrency = min(max(concurrency, 1), BATCH_MAX_CONCURRENCY)
+	# 0 means unlimited, which is only allowed up to the maximum
+	rate = min(rate, BATCH_MAX_RATE_PER_SECOND) if rate > 0 else BATCH_MAX_RATE_PER_SECOND
+	return concurrency, rate
+
+
+def default_output_path(source: str) -> str:
+	return os.path.splitext(os.path.abspath(source).rstrip(os.sep))[0] + ".results.jsonl"
+
+
+def resolve_batch_output(output: Optional[str], source: str) -> str:
+	"""
+	Resolve the results file of a /batch request: a .jsonl path inside
+	BATCH_RESULTS_DIR, named after the source when `output` is empty.
+
+	Raises:
+		ValueError: if the path is elsewhere, not .jsonl, or an existing file
+			that run_batch did not write
+	"""
+	results_dir = os.path.join(os.path.realpath(BATCH_ROOT), BATCH_RESULTS_DIR)
+	if not output:
+		output = os.path.basename(os.path.splitext(source.rstrip(os.sep))[0]) + ".results.jsonl"
+	resolved = os.path.realpath(os.path.join(results_dir, output))
+	if not resolved.startswith(results_dir + os.sep):
+		raise ValueError(f"Output must be inside the {BATCH_RESULTS_DIR}/ directory of the batch root: {output}")
+	if not resolved.endswith(".jsonl"):
+		raise ValueError(f"Output must be a .jsonl file: {output}")
+	if not is_batch_output(resolved):
+		raise ValueError(f"Output exists and is not a batch results file: {output}")
+	return resolved
+
+
+batch_queue = JobQueue(workers=BATCH_JOB_WORKERS, max_queued=BATCH_MAX_QUEUED, timeout=BATCH_JOB_TIMEOUT_SECONDS)
+
+
+def main(argv=None):
+	from services.form_registry import DEFAULT_FORM_ID, get_form
+
+	parser = argparse.ArgumentParser(description="Extract form data from a folder or manifest of intake documents.")
+	parser.add_argument("source", help="Directory to scan, or a .jsonl / .csv / .txt manifest")
+	parser.add_argument("-o", "--output", help="JSONL results file, also used as the resume checkpoint")
+	parser.add_argument("--form-id", default=DEFAULT_FORM_ID)
+	parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY)
+	parser.add_argument("-r", "--rate", type=float, default=BATCH_RATE_PER_SECOND, help="Max items started per second")
+	parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping finished items")
+	args = parser.parse_args(argv)
+
+	items = discover_items(args.source)
+	run_batch(
+		items,
+		get_form(args.form_id).schema_str,
+		args.output or default_output_path(args.source),
+		concurrency=args.concurrency,
+		rate=args.rate,
+		resume=not args.no_resume,
+	)
+
+
+if __name__ == "__main__":
+	main()
+
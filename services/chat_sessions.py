@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from utils.paths import PROJECT_ROOT
+
+# "memory" keeps sessions in this process; "sqlite" shares them between workers
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory")
+CHAT_SESSION_DB_PATH = os.getenv(
+	"CHAT_SESSION_DB_PATH",
+	os.path.join(PROJECT_ROOT, ".cache", "chat_sessions.sqlite3")
+)
+# Sessions idle for longer than this are dropped
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", str(2 * 3600)))
+# Least recently used sessions are dropped beyond this many
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "1000"))
+
+
+def prompt_id(content: str) -> str:
+	return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SessionStore(ABC):
+	"""
+	Chat session state by session id: {"messages": [...], ...}.
+
+	System prompts embed the whole form schema and are the same for every
+	session of a form and role, so they are interned: one copy is kept per
+	distinct prompt, however many sessions use it. Sessions expire after
+	`ttl_seconds` without a request, and the least recently used ones are
+	dropped beyond `max_sessions`.
+	"""
+
+	def __init__(self, ttl_seconds: int = CHAT_SESSION_TTL_SECONDS, max_sessions: int = CHAT_SESSION_MAX_SESSIONS):
+		self.ttl_seconds = ttl_seconds
+		self.max_sessions = max_sessions
+		self._prompts = {}
+		self._lock = threading.Lock()
+		self._counters = {"created": 0, "expired": 0, "evicted": 0}
+
+	def intern_prompt(self, content: str) -> str:
+		return self._prompts.setdefault(content, content)
+
+	def create(self, state: dict) -> str:
+		session_id = str(uuid.uuid4())
+		self.save(session_id, state)
+		with self._lock:
+			self._counters["created"] += 1
+		return session_id
+
+	@abstractmethod
+	def get(self, session_id: str):
+		"""The session state, or None when it is unknown or expired. Refreshes the TTL."""
+
+	@abstractmethod
+	def save(self, session_id: str, state: dict) -> None:
+		...
+
+	@abstractmethod
+	def update(self, session_id: str, change) -> bool:
+		"""
+		Atomically apply `change(fields)` to a session, where `fields` is its
+		state without the messages. `change` returns the fields to set, or
+		None to leave the session as it is. False when the session is unknown.
+		"""
+
+	@abstractmethod
+	def delete(self, session_id: str) -> None:
+		...
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {**self._counters, "prompts": len(self._prompts)}
+
+
+class MemorySessionStore(SessionStore):
+	"""Sessions in a process-local LRU; the fastest option for a single worker."""
+
+	def __init__(self, **kwargs):
+		super().__init__(**kwargs)
+		self._sessions = OrderedDict()
+
+	def _expire(self, now: float) -> None:
+		# Oldest access first, so expired sessions are all at the front
+		while self._sessions:
+			session_id, (accessed_at, _) = next(iter(self._sessions.items()))
+			if now - accessed_at < self.ttl_seconds:
+				break
+			self._sessions.popitem(last=False)
+			self._counters["expired"] += 1
+
+	def get(self, session_id: str):
+		now = time.time()
+		with self._lock:
+			self._expire(now)
+			entry = self._sessions.get(session_id)
+			if entry is None:
+				return None
+			state = entry[1]
+			self._sessions[session_id] = (now, state)
+			self._sessions.move_to_end(session_id)
+		return {**state, "messages": list(state["messages"])}
+
+	def save(self, session_id: str, state: dict) -> None:
+		messages = [
+			{**message, "content": self.intern_prompt(message["content"])} if message["role"] == "system" else message
+			for message in state["messages"]
+		]
+		now = time.time()
+		with self._lock:
+			self._sessions[session_id] = (now, {**state, "messages": messages})
+			self._sessions.move_to_end(session_id)
+			self._expire(now)
+			while len(self._sessions) > self.max_sessions:
+				self._sessions.popitem(last=False)
+				self._counters["evicted"] += 1
+
+	def update(self, session_id: str, change) -> bool:
+		with self._lock:
+			entry = self._sessions.get(session_id)
+			if entry is None:
+				return False
+			accessed_at, state = entry
+			fields = change({key: value for key, value in state.items() if key != "messages"})
+			if fields:
+				self._sessions[session_id] = (accessed_at, {**state, **fields, "messages": state["messages"]})
+			return True
+
+	def delete(self, session_id: str) -> None:
+		with self._lock:
+			self._sessions.pop(session_id, None)
+
+	def stats(self) -> dict:
+		with self._lock:
+			sessions = len(self._sessions)
+		return {"backend": "memory", **super().stats(), "sessions": sessions}
+
+
+class SQLiteSessionStore(SessionStore):
+	"""
+	Sessions in a SQLite file, shared by every worker process on the host.
+
+	System prompts are stored once in their own table and referenced by hash.
+	"""
+
+	def __init__(self, db_path: str = CHAT_SESSION_DB_PATH, **kwargs):
+		super().__init__(**kwargs)
+		self.db_path = db_path
+		if os.path.dirname(db_path):
+			os.makedirs(os.path.dirname(db_path), exist_ok=True)
+		self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+		# WAL lets readers in other workers proceed while one of them writes
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("""
+			CREATE TABLE IF NOT EXISTS chat_prompts (
+				id TEXT PRIMARY KEY,
+				content TEXT NOT NULL
+			)
+		""")
+		self._db.execute("""
+			CREATE TABLE IF NOT EXISTS chat_sessions (
+				id TEXT PRIMARY KEY,
+				state TEXT NOT NULL,
+				accessed_at REAL NOT NULL
+			)
+		""")
+		self._db.execute(
+			"CREATE INDEX IF NOT EXISTS chat_sessions_accessed ON chat_sessions (accessed_at)"
+		)
+		self._db.commit()
+		self._known_prompts = {}
+
+	def _store_prompt(self, content: str) -> str:
+		content = self.intern_prompt(content)
+		key = prompt_id(content)
+		if key not in self._known_prompts:
+			self._db.execute("INSERT OR IGNORE INTO chat_prompts (id, content) VALUES (?, ?)", (key, content))
+			self._known_prompts[key] = content
+		return key
+
+	def _load_prompt(self, key: str) -> str:
+		content = self._known_prompts.get(key)
+		if content is None:
+			content = self._db.execute("SELECT content FROM chat_prompts WHERE id = ?", (key,)).fetchone()[0]
+			content = self._known_prompts[key] = self.intern_prompt(content)
+		return content
+
+	def get(self, session_id: str):
+		now = time.time()
+		with self._lock:
+			row = self._db.execute(
+				"SELECT state FROM chat_sessions WHERE id = ? AND accessed_at > ?",
+				(session_id, now - self.ttl_seconds)
+			).fetchone()
+			if row is None:
+				return None
+			self._db.execute("UPDATE chat_sessions SET accessed_at = ? WHERE id = ?", (now, session_id))
+			self._db.commit()
+			state = json.loads(row[0])
+			state["messages"] = [
+				{"role": "system", "content": self._load_prompt(message["prompt_id"])} if "prompt_id" in message else message
+				for message in state["messages"]
+			]
+		return state
+
+	def save(self, session_id: str, state: dict) -> None:
+		now = time.time()
+		with self._lock:
+			messages = [
+				{"role": "system", "prompt_id": self._store_prompt(message["content"])} if message["role"] == "system" else message
+				for message in state["messages"]
+			]
+			encoded = json.dumps({**state, "messages": messages}, ensure_ascii=False, default=str)
+			self._db.execute(
+				"INSERT OR REPLACE INTO chat_sessions (id, state, accessed_at) VALUES (?, ?, ?)",
+				(session_id, encoded, now)
+			)
+			self._evict(now)
+			self._db.commit()
+
+	def _evict(self, now: float) -> None:
+		expired = self._db.execute(
+			"DELETE FROM chat_sessions WHERE accessed_at <= ?", (now - self.ttl_seconds,)
+		).rowcount
+		self._counters["expired"] += max(expired, 0)
+		evicted = self._db.execute(
+			"DELETE FROM chat_sessions WHERE id IN "
+			"(SELECT id FROM chat_sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+			(self.max_sessions,)
+		).rowcount
+		self._counters["evicted"] += max(evicted, 0)
+
+	def update(self, session_id: str, change) -> bool:
+		with self._lock:
+			# Taken before reading, so no other worker can write in between
+			self._db.execute("BEGIN IMMEDIATE")
+			try:
+				row = self._db.execute("SELECT state FROM chat_sessions WHERE id = ?", (session_id,)).fetchone()
+				if row is not None:
+					state = json.loads(row[0])
+					fields = change({key: value for key, value in state.items() if key != "messages"})
+					if fields:
+						encoded = json.dumps({**state, **fields, "messages": state["messages"]}, ensure_ascii=False, default=str)
+						self._db.execute("UPDATE chat_sessions SET state = ? WHERE id = ?", (encoded, session_id))
+				self._db.commit()
+			except Exception:
+				self._db.rollback()
+				raise
+		return row is not None
+
+	def delete(self, session_id: str) -> None:
+		with self._lock:
+			self._db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+			self._db.commit()
+
+	def stats(self) -> dict:
+		with self._lock:
+			sessions, size = self._db.execute(
+				"SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM chat_sessions"
+			).fetchone()
+		return {"backend": "sqlite", **super().stats(), "sessions": sessions, "bytes": size}
+
+
+SESSION_BACKENDS = {
+	"memory": MemorySessionStore,
+	"sqlite": SQLiteSessionStore,
+}
+
+
+def create_session_store(backend: str = CHAT_SESSION_BACKEND, **kwargs) -> SessionStore:
+	if backend not in SESSION_BACKENDS:
+		raise ValueError(f"Unknown chat session backend: {backend}")
+	return SESSION_BACKENDS[backend](**kwargs)
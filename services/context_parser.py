@@ -1,15 +1,97 @@
+import json
 import os
 
-from services.image_to_json import ImageExtractorGenerator
-from services.pdf_to_json import PDFExtractorGenerator
-from services.spreadsheet_to_json import SpreadsheetExtractorGenerator
-from services.speech_to_text import transcribe_audio
-from services.text_to_json import TextExtractorGenerator
-from utils.audio import s3_urls_from_audios
-from utils.images import s3_urls_from_images
+import dspy
+
+from services.extraction_cache import extraction_cache, hash_file, hash_text, make_cache_key
+from services.extractor_pool import DEFAULT_MODELS, get_extractor
+from services.map_reduce_extraction import MapReduceExtractor, split_json, split_text
+from services.streaming_extraction import extraction_events, stream_parts, stream_program
+from services.speech_to_text import DEFAULT_STT_MODEL, transcribe_file
+from utils.images import image_url_from_path
 from utils.paths import PROJECT_ROOT
 
-def parse_context(path_or_text, context_type, result_schema):
+CONTEXT_TYPES = ("image", "text", "audio", "pdf", "spreadsheet", "json")
+
+# Every model a context type can go through, so changing any of them misses
+# the cache: PDF pages with a text layer use the text model, the others the
+# image model, and audio is transcribed before the text model reads it
+CACHE_MODEL_TYPES = {
+	"text": ("text",),
+	"image": ("image",),
+	"pdf": ("image", "text"),
+	"spreadsheet": ("text",),
+	"audio": ("text",),
+	"json": ("text",),
+}
+
+def context_models(context_type):
+	models = [DEFAULT_MODELS[model_type] for model_type in CACHE_MODEL_TYPES.get(context_type, ())]
+	if context_type == "audio":
+		models.append(DEFAULT_STT_MODEL)
+	return "+".join(models)
+
+def context_cache_key(path_or_text, context_type, result_schema, options):
+	content_hash = hash_text(path_or_text) if context_type == "text" else hash_file(path_or_text)
+	return make_cache_key(content_hash, result_schema, context_models(context_type), context_type, options)
+
+def store_result(cache_key, result):
+	extra = {"pages": result.pages} if result.get("pages") else {}
+	extraction_cache.set(cache_key, result.json_result, result.reasoning, **extra)
+
+def parse_context(path_or_text, context_type, result_schema, options=None):
+	"""
+	Extract form data from any supported context.
+
+	Args:
+		options: Parser-specific settings, e.g. {"pages": "1-3", "dpi": 200} for
+			PDFs or {"sheet": "Labs"} for workbooks
+	"""
+	options = options or {}
+	if context_type not in CONTEXT_TYPES:
+		raise ValueError(f"Unsupported context type: {context_type}")
+	if extraction_cache is None:
+		return dispatch_context(path_or_text, context_type, result_schema, options)
+
+	cache_key = context_cache_key(path_or_text, context_type, result_schema, options)
+	cached = extraction_cache.get(cache_key)
+	if cached is not None:
+		print(f"[context-parser] Cache hit for {context_type} ({cache_key[:12]})")
+		return dspy.Prediction(cached=True, **cached)
+
+	result = dispatch_context(path_or_text, context_type, result_schema, options)
+	store_result(cache_key, result)
+	return result
+
+def stream_context(path_or_text, context_type, result_schema, options=None):
+	"""
+	Streaming variant of parse_context.
+
+	Yields the events described in extraction_events: reasoning text and form
+	fields as soon as they are available, then {"result": prediction}.
+	"""
+	options = options or {}
+	if context_type not in CONTEXT_TYPES:
+		raise ValueError(f"Unsupported context type: {context_type}")
+
+	cache_key = None
+	if extraction_cache is not None:
+		cache_key = context_cache_key(path_or_text, context_type, result_schema, options)
+		cached = extraction_cache.get(cache_key)
+		if cached is not None:
+			print(f"[context-parser] Cache hit for {context_type} ({cache_key[:12]})")
+			result = dspy.Prediction(cached=True, **cached)
+			yield from extraction_events(
+				[("json_result", result.json_result), ("prediction", result)], result_schema
+			)
+			return
+
+	for event in extraction_events(dispatch_stream(path_or_text, context_type, result_schema, options), result_schema):
+		if "result" in event and cache_key is not None:
+			store_result(cache_key, event["result"])
+		yield event
+
+def dispatch_context(path_or_text, context_type, result_schema, options):
 	if context_type == "image":
 		return parse_image(path_or_text, result_schema)
 	elif context_type == "text":
@@ -17,17 +99,50 @@ def parse_context(path_or_text, context_type, result_schema):
 	elif context_type == "audio":
 		return parse_audio(path_or_text, result_schema)
 	elif context_type == "pdf":
-		return parse_pdf(path_or_text, result_schema)
+		return parse_pdf(path_or_text, result_schema, pages=options.get("pages"), dpi=options.get("dpi"))
 	elif context_type == "spreadsheet":
-		return parse_spreadsheet(path_or_text, result_schema)
+		return parse_spreadsheet(path_or_text, result_schema, sheet=options.get("sheet"))
 	elif context_type == "json":
 		return parse_json_file(path_or_text, result_schema)
 	else:
 		raise ValueError(f"Unsupported context type: {context_type}")
 
+def dispatch_stream(path_or_text, context_type, result_schema, options):
+	"""Like dispatch_context, but yields the raw stream_program / stream_parts events."""
+	if context_type == "image":
+		return stream_program(
+			get_extractor("image"), image_url=image_url_from_path(path_or_text), json_schema=result_schema
+		)
+	elif context_type == "text":
+		return stream_chunks(split_text(path_or_text), result_schema)
+	elif context_type == "audio":
+		return stream_chunks(split_text(transcribe_file(path_or_text)), result_schema)
+	elif context_type == "pdf":
+		return stream_parts(lambda on_part: get_extractor("pdf")(
+			pdf_path=path_or_text, json_schema=result_schema,
+			pages=options.get("pages"), dpi=options.get("dpi"), on_part=on_part
+		))
+	elif context_type == "spreadsheet":
+		return stream_parts(lambda on_part: get_extractor("spreadsheet")(
+			file_path=path_or_text, json_schema=result_schema, sheet=options.get("sheet"), on_part=on_part
+		))
+	elif context_type == "json":
+		return stream_chunks(json_file_chunks(path_or_text), result_schema)
+	else:
+		raise ValueError(f"Unsupported context type: {context_type}")
+
+def stream_chunks(chunks, result_schema):
+	# A single chunk streams tokens, several are reported part by part
+	if len(chunks) == 1:
+		return stream_program(get_extractor("text"), text=chunks[0], json_schema=result_schema)
+	extraction_program = MapReduceExtractor(get_extractor("text"))
+	return stream_parts(lambda on_part: extraction_program(
+		chunks=chunks, json_schema=result_schema, on_part=on_part
+	))
+
 def parse_image(image_path, result_schema):
-	image_url = s3_urls_from_images([image_path])[0]
-	extraction_program = ImageExtractorGenerator()
+	image_url = image_url_from_path(image_path)
+	extraction_program = get_extractor("image")
 
 	result = extraction_program(
 		image_url=image_url,
@@ -37,45 +152,62 @@ def parse_image(image_path, result_schema):
 	return result
 
 def parse_text(text, result_schema):
-	extraction_program = TextExtractorGenerator()	
+	# Short texts stay a single call, long ones are split on paragraphs
+	extraction_program = MapReduceExtractor(get_extractor("text"))
 	result = extraction_program(
-		text=text,
+		chunks=split_text(text),
 		json_schema=result_schema
 	)
 
 	return result
 
 def parse_audio(audio_path, result_schema):
-	audio_url = s3_urls_from_audios([audio_path])[0]
-	text = transcribe_audio(audio_url)
+	# Streamed to Deepgram straight from disk, no object store round trip
+	text = transcribe_file(audio_path)
 
 	return parse_text(text, result_schema)
 
-def parse_pdf(pdf_path, result_schema):
-	extraction_program = PDFExtractorGenerator()
+def parse_pdf(pdf_path, result_schema, pages=None, dpi=None):
+	extraction_program = get_extractor("pdf")
 
 	result = extraction_program(
 		pdf_path=pdf_path,
-		json_schema=result_schema
+		json_schema=result_schema,
+		pages=pages,
+		dpi=dpi
 	)
 
 	return result
 
-def parse_spreadsheet(file_path, result_schema):
-	extraction_program = SpreadsheetExtractorGenerator()
+def parse_spreadsheet(file_path, result_schema, sheet=None):
+	extraction_program = get_extractor("spreadsheet")
 
 	result = extraction_program(
 		file_path=file_path,
-		json_schema=result_schema
+		json_schema=result_schema,
+		sheet=sheet
 	)
 
 	return result
 
-def parse_json_file(file_path, result_schema):
-	# Read JSON file as text and pass to text parser
+def json_file_chunks(file_path):
 	with open(file_path, 'r') as f:
 		json_text = f.read()
-	return parse_text(json_text, result_schema)
+
+	# Split on JSON subtrees, or on paragraphs if the file isn't valid JSON
+	try:
+		return split_json(json.loads(json_text))
+	except json.JSONDecodeError:
+		return split_text(json_text)
+
+def parse_json_file(file_path, result_schema):
+	chunks = json_file_chunks(file_path)
+
+	extraction_program = MapReduceExtractor(get_extractor("text"))
+	return extraction_program(
+		chunks=chunks,
+		json_schema=result_schema
+	)
 
 if __name__ == "__main__":
 	schema_path = os.path.join(
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.paths import PROJECT_ROOT
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1") == "1"
+EXTRACTION_CACHE_PATH = os.getenv(
+	"EXTRACTION_CACHE_PATH",
+	os.path.join(PROJECT_ROOT, ".cache", "extraction_cache.sqlite3")
+)
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "256"))
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_text(text: str) -> str:
+	return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str) -> str:
+	"""Hash a file in chunks so large uploads are never fully loaded."""
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, schema: str, model_name: str, context_type: str, options: dict = None) -> str:
+	"""Content-addressed key: same input, schema, model, type and options give the same key."""
+	parts = [
+		content_hash,
+		hash_text(schema or ""),
+		model_name or "",
+		context_type,
+		json.dumps(options or {}, sort_keys=True, default=str),
+	]
+	return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+	"""
+	Two-tier cache of extraction results.
+
+	A bounded in-memory LRU sits in front of a SQLite store. Disk entries
+	expire after `ttl_seconds` and the least recently used ones are evicted
+	once the stored payloads exceed `max_bytes`.
+	"""
+
+	def __init__(self, db_path: str = EXTRACTION_CACHE_PATH,
+				 memory_entries: int = EXTRACTION_CACHE_MEMORY_ENTRIES,
+				 ttl_seconds: int = EXTRACTION_CACHE_TTL_SECONDS,
+				 max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+		self.db_path = db_path
+		self.memory_entries = memory_entries
+		self.ttl_seconds = ttl_seconds
+		self.max_bytes = max_bytes
+		self._memory = OrderedDict()
+		self._lock = threading.Lock()
+		self._counters = {
+			"memory_hits": 0,
+			"disk_hits": 0,
+			"misses": 0,
+			"writes": 0,
+			"evictions": 0,
+		}
+
+		if os.path.dirname(db_path):
+			os.makedirs(os.path.dirname(db_path), exist_ok=True)
+		self._db = sqlite3.connect(db_path, check_same_thread=False)
+		self._db.execute("""
+			CREATE TABLE IF NOT EXISTS extraction_cache (
+				key TEXT PRIMARY KEY,
+				value TEXT NOT NULL,
+				size INTEGER NOT NULL,
+				created_at REAL NOT NULL,
+				accessed_at REAL NOT NULL
+			)
+		""")
+		self._db.execute(
+			"CREATE INDEX IF NOT EXISTS extraction_cache_accessed ON extraction_cache (accessed_at)"
+		)
+		self._db.commit()
+
+	def get(self, key: str):
+		"""Return {"json_result", "reasoning", ...extra} for a key, or None on a miss."""
+		now = time.time()
+		with self._lock:
+			entry = self._memory.get(key)
+			if entry is not None and now - entry[0] < self.ttl_seconds:
+				self._memory.move_to_end(key)
+				self._counters["memory_hits"] += 1
+				return dict(entry[1])
+
+			row = self._db.execute(
+				"SELECT value, created_at FROM extraction_cache WHERE key = ?", (key,)
+			).fetchone()
+			if row is None or now - row[1] >= self.ttl_seconds:
+				self._counters["misses"] += 1
+				return None
+
+			self._db.execute(
+				"UPDATE extraction_cache SET accessed_at = ? WHERE key = ?", (now, key)
+			)
+			self._db.commit()
+			value = json.loads(row[0])
+			self._remember(key, row[1], value)
+			self._counters["disk_hits"] += 1
+			return dict(value)
+
+	def set(self, key: str, json_result, reasoning, **extra) -> None:
+		value = {"json_result": json_result, "reasoning": reasoning, **extra}
+		encoded = json.dumps(value, ensure_ascii=False, default=str)
+		now = time.time()
+		with self._lock:
+			self._remember(key, now, value)
+			self._db.execute(
+				"INSERT OR REPLACE INTO extraction_cache (key, value, size, created_at, accessed_at) "
+				"VALUES (?, ?, ?, ?, ?)",
+				(key, encoded, len(encoded.encode("utf-8")), now, now)
+			)
+			self._counters["writes"] += 1
+			self._evict(now)
+			self._db.commit()
+
+	def _remember(self, key: str, created_at: float, value: dict) -> None:
+		self._memory[key] = (created_at, value)
+		self._memory.move_to_end(key)
+		while len(self._memory) > self.memory_entries:
+			self._memory.popitem(last=False)
+
+	def _evict(self, now: float) -> None:
+		expired = self._db.execute(
+			"DELETE FROM extraction_cache WHERE created_at <= ?", (now - self.ttl_seconds,)
+		).rowcount
+		self._counters["evictions"] += max(expired, 0)
+
+		total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+
+		rows = self._db.execute(
+			"SELECT key, size FROM extraction_cache ORDER BY accessed_at ASC"
+		).fetchall()
+		for key, size in rows:
+			if total <= self.max_bytes:
+				break
+			self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+			self._memory.pop(key, None)
+			total -= size
+			self._counters["evictions"] += 1
+
+	def stats(self) -> dict:
+		with self._lock:
+			entries, size = self._db.execute(
+				"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache"
+			).fetchone()
+			counters = dict(self._counters)
+
+		lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+		hits = counters["memory_hits"] + counters["disk_hits"]
+		return {
+			**counters,
+			"hit_rate": hits / lookups if lookups else 0.0,
+			"memory_entries": len(self._memory),
+			"disk_entries": entries,
+			"disk_bytes": size,
+		}
+
+	def clear(self) -> None:
+		with self._lock:
+			self._memory.clear()
+			self._db.execute("DELETE FROM extraction_cache")
+			self._db.commit()
+
+
+extraction_cache = ExtractionCache() if EXTRACTION_CACHE_ENABLED else None
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+from services.image_to_json import DEFAULT_IMAGE_MODEL, ImageExtractorGenerator
+from services.pdf_to_json import PDFExtractorGenerator
+from services.spreadsheet_to_json import SpreadsheetExtractorGenerator
+from services.text_to_json import DEFAULT_TEXT_MODEL, TextExtractorGenerator
+
+TEXT_EXTRACTOR_MODEL = os.getenv("TEXT_EXTRACTOR_MODEL", DEFAULT_TEXT_MODEL)
+IMAGE_EXTRACTOR_MODEL = os.getenv("IMAGE_EXTRACTOR_MODEL", DEFAULT_IMAGE_MODEL)
+EXTRACTOR_PRECONNECT = os.getenv("EXTRACTOR_PRECONNECT", "1") == "1"
+EXTRACTOR_PRECONNECT_URL = os.getenv("EXTRACTOR_PRECONNECT_URL", "https://openrouter.ai/api/v1/models")
+
+# Context types sharing a program: pdf pages go through the image model,
+# spreadsheets through the text model
+DEFAULT_MODELS = {
+	"text": TEXT_EXTRACTOR_MODEL,
+	"image": IMAGE_EXTRACTOR_MODEL,
+	"pdf": IMAGE_EXTRACTOR_MODEL,
+	"spreadsheet": TEXT_EXTRACTOR_MODEL,
+}
+
+
+def preconnect(url: str = EXTRACTOR_PRECONNECT_URL) -> float:
+	"""
+	Open a keep-alive connection to the LLM provider before the first request.
+
+	Goes through litellm's shared httpx client (the one dspy.LM calls use) so
+	the DNS lookup and TLS handshake are paid at startup instead of on the
+	first extraction. Returns the elapsed time in ms, or -1 on failure.
+	"""
+	start = time.perf_counter()
+	try:
+		from litellm.llms.custom_httpx.http_handler import _get_httpx_client
+		_get_httpx_client().client.head(url, timeout=5.0)
+	except Exception as e:
+		print(f"[extractor-pool] Pre-connect to {url} failed: {type(e).__name__}: {e}")
+		return -1
+	elapsed_ms = (time.perf_counter() - start) * 1000
+	print(f"[extractor-pool] Pre-connected to {url} in {elapsed_ms:.0f} ms")
+	return elapsed_ms
+
+
+class ExtractorPool:
+	"""
+	Process-wide cache of extraction programs, one per (context type, model).
+
+	Programs are stateless between calls (the LM and adapter are bound via
+	dspy.context per call), so a single instance is shared by every request
+	thread.
+	"""
+
+	def __init__(self):
+		self._programs = {}
+		self._lock = threading.RLock()
+
+	def get(self, context_type: str, model_name: str = None):
+		if context_type not in DEFAULT_MODELS:
+			raise ValueError(f"Unsupported context type: {context_type}")
+		model_name = model_name or DEFAULT_MODELS[context_type]
+		key = (context_type, model_name)
+
+		program = self._programs.get(key)
+		if program is not None:
+			return program
+
+		with self._lock:
+			program = self._programs.get(key)
+			if program is None:
+				program = self._build(context_type, model_name)
+				self._programs[key] = program
+			return program
+
+	def _build(self, context_type: str, model_name: str):
+		if context_type == "text":
+			return TextExtractorGenerator(model_name)
+		if context_type == "image":
+			return ImageExtractorGenerator(model_name)
+		if context_type == "pdf":
+			return PDFExtractorGenerator(
+				image_extractor=self.get("image", model_name),
+				text_extractor=self.get("text")
+			)
+		return SpreadsheetExtractorGenerator(text_extractor=self.get("text", model_name))
+
+	def warm(self, context_types=None, connect: bool = EXTRACTOR_PRECONNECT) -> None:
+		"""Build the default program for each context type and optionally pre-connect."""
+		start = time.perf_counter()
+		for context_type in context_types or DEFAULT_MODELS:
+			self.get(context_type)
+		elapsed_ms = (time.perf_counter() - start) * 1000
+		print(f"[extractor-pool] Warmed {len(self._programs)} programs in {elapsed_ms:.0f} ms")
+
+		if connect:
+			preconnect()
+
+
+extractor_pool = ExtractorPool()
+
+
+def get_extractor(context_type: str, model_name: str = None):
+	"""Shortcut for the process-wide pool."""
+	return extractor_pool.get(context_type, model_name)
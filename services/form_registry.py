@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+
+from services.form_schema_generator import (
+    generate_empty_form_data,
+    generate_json_schema,
+    load_form_definition,
+)
+from utils.paths import PROJECT_ROOT
+
+FORMS_DIR = os.path.join(PROJECT_ROOT, "forms_schema")
+DEFAULT_FORM_ID = os.getenv("DEFAULT_FORM_ID", "questionaire")
+
+# Files generated next to a form definition, never definitions themselves
+DERIVED_SUFFIXES = ("_schema", "_template", "_sample_data")
+
+
+class FormEntry:
+    """Everything derived from one form definition file, built once per mtime."""
+
+    def __init__(self, form_id: str, path: str, mtime: float, definition: dict):
+        self.form_id = form_id
+        self.path = path
+        self.mtime = mtime
+        self.definition = definition
+        self.schema = generate_json_schema(definition)
+        self.schema_str = json.dumps(self.schema, indent=2, ensure_ascii=False)
+        self.field_schema = self.schema.get("properties", {})
+        self.template = generate_empty_form_data(definition)
+
+
+class FormRegistry:
+    """
+    In-memory registry of form definitions keyed by form id.
+
+    Entries are loaded lazily and rebuilt only when the definition file's
+    mtime changes, so requests never re-read or re-parse unchanged forms.
+    """
+
+    def __init__(self, forms_dir: str = FORMS_DIR):
+        self.forms_dir = forms_dir
+        self._paths = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, form_id: str, path: str) -> None:
+        """Register (or re-point) a form id to a definition file."""
+        with self._lock:
+            self._paths[form_id] = path
+            self._entries.pop(form_id, None)
+
+    def discover(self) -> list[str]:
+        """Register every form definition found in the forms directory."""
+        if not os.path.isdir(self.forms_dir):
+            return []
+
+        found = []
+        for name in sorted(os.listdir(self.forms_dir)):
+            form_id, ext = os.path.splitext(name)
+            if ext != ".json" or form_id.endswith(DERIVED_SUFFIXES):
+                continue
+            path = os.path.join(self.forms_dir, name)
+            try:
+                definition = load_form_definition(path)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if not isinstance(definition, dict) or "form_fields" not in definition:
+                continue
+            with self._lock:
+                self._paths.setdefault(form_id, path)
+            found.append(form_id)
+        return found
+
+    def form_ids(self) -> list[str]:
+        with self._lock:
+            return sorted(self._paths)
+
+    def get(self, form_id: str = None) -> FormEntry:
+        """
+        Return the entry for a form id, rebuilding it if the file changed.
+
+        Raises:
+            KeyError: if the form id is not registered
+        """
+        form_id = form_id or DEFAULT_FORM_ID
+        with self._lock:
+            path = self._paths.get(form_id)
+            if path is None:
+                raise KeyError(f"Unknown form id: {form_id}")
+
+            mtime = os.path.getmtime(path)
+            entry = self._entries.get(form_id)
+            if entry is None or entry.mtime != mtime:
+                entry = FormEntry(form_id, path, mtime, load_form_definition(path))
+                self._entries[form_id] = entry
+            return entry
+
+
+form_registry = FormRegistry()
+form_registry.discover()
+
+
+def get_form(form_id: str = None) -> FormEntry:
+    """Shortcut for the process-wide registry."""
+    return form_registry.get(form_id)
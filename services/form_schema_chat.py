@@ -1,6 +1,31 @@
+import hashlib
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from services.chat_sessions import CHAT_SESSION_MAX_SESSIONS, CHAT_SESSION_TTL_SECONDS
+from services.result_merging import conform_to_schema
 from utils.clients import get_openai_client, DEFAULT_MODEL
 
+# History (everything but the system prompt) allowed per request before
+# older turns are folded into the running summary
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# Most recent exchanges that are always sent verbatim
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", "3"))
+CHAT_COMPACTION_MODEL = os.getenv("CHAT_COMPACTION_MODEL", DEFAULT_MODEL)
+CHAT_COMPACTION_WORKERS = int(os.getenv("CHAT_COMPACTION_WORKERS", "2"))
+# Model updating the session's form data after each turn, alongside the reply
+CHAT_EXTRACTION_MODEL = os.getenv("CHAT_EXTRACTION_MODEL", DEFAULT_MODEL)
+CHAT_EXTRACTION_WORKERS = int(os.getenv("CHAT_EXTRACTION_WORKERS", "4"))
+
+_extraction_executor = ThreadPoolExecutor(max_workers=CHAT_EXTRACTION_WORKERS, thread_name_prefix="chat-extraction")
+_compaction_executor = ThreadPoolExecutor(max_workers=CHAT_COMPACTION_WORKERS, thread_name_prefix="chat-compaction")
+# Background compactions by session id, oldest first: (started at, messages covered, fingerprint, future)
+_compactions = OrderedDict()
+_compactions_lock = threading.Lock()
+
 
 PATIENT_SYSTEM_PROMPT = """You are a friendly medical intake assistant having a conversation with a PATIENT to collect their information.
 
@@ -50,6 +75,42 @@ Start your response directly with the summary content — no preamble.
 Do NOT include a STATUS block in this response."""
 
 
+COMPACTION_PROMPT = """You keep the running record of a medical intake conversation.
+
+Current record (JSON):
+{summary}
+
+Older part of the conversation, not seen by the record yet:
+{transcript}
+
+Return the updated record as a single JSON object:
+- Keep every value from the current record unless the conversation corrects it.
+- Add every piece of information the patient or doctor gave, keyed by the schema field name it belongs to.
+- Put anything relevant that fits no field in a "notes" list.
+Return only the JSON object."""
+
+FORM_DATA_PROMPT = """You keep the form data of a medical intake conversation up to date.
+
+JSON schema of the form:
+{schema}
+
+Current form data:
+{form_data}
+
+Latest exchange:
+{transcript}
+
+Return the complete, updated form data as a single JSON object following the schema:
+- Keep every current value unless the latest exchange corrects or completes it.
+- Only fill fields with information that was actually given; leave unknown fields out.
+- For fields with predefined options, use only the listed options.
+Return only the JSON object."""
+
+SUMMARY_CONTEXT_PROMPT = """Earlier messages of this conversation were condensed. Information collected in them:
+{summary}
+Treat it as already gathered: do not ask for it again unless it needs clarifying."""
+
+
 def create_chat_session(schema_str, role="patient"):
     schema = json.loads(schema_str)
     template = PATIENT_SYSTEM_PROMPT if role == "patient" else DOCTOR_SYSTEM_PROMPT
@@ -57,13 +118,149 @@ def create_chat_session(schema_str, role="patient"):
     return [{"role": "system", "content": system_message}]
 
 
-def chat_message_stream(messages, user_message):
+def estimate_tokens(messages):
+    # ~4 characters per token for English and French, plus per-message overhead
+    return sum(len(m["content"]) // 4 + 4 for m in messages)
+
+
+def split_turns(messages):
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def summarize_turns(messages, summary=None):
+    """Fold `messages` into the running record of collected fields."""
+    client = get_openai_client()
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+    prompt = COMPACTION_PROMPT.replace("{summary}", json.dumps(summary or {}, ensure_ascii=False, indent=2))
+    prompt = prompt.replace("{transcript}", transcript)
+
+    response = client.chat.completions.create(
+        model=CHAT_COMPACTION_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+def compact_history(messages, summary=None, budget=CHAT_HISTORY_TOKEN_BUDGET, keep_turns=CHAT_KEEP_TURNS):
+    """
+    Keep the prompt size flat over a long interview.
+
+    Once the history after the system prompt exceeds `budget` tokens, every
+    turn but the last `keep_turns` is folded into `summary`, a JSON record
+    of the information collected so far.
+
+    Returns:
+        (messages, summary), unchanged when under budget or if summarizing fails
+    """
+    system = [m for m in messages[:1] if m["role"] == "system"]
+    history = messages[len(system):]
+    if estimate_tokens(history) <= budget:
+        return messages, summary
+
+    turns = split_turns(history)
+    if len(turns) <= keep_turns:
+        return messages, summary
+    older = [m for turn in turns[:-keep_turns] for m in turn]
+    recent = [m for turn in turns[-keep_turns:] for m in turn]
+
+    try:
+        summary = summarize_turns(older, summary)
+    except Exception as e:
+        print(f"[chat] History compaction failed: {type(e).__name__}: {e}")
+        return messages, summary
+    print(f"[chat] Compacted {len(older)} messages: {estimate_tokens(history)} -> {estimate_tokens(recent)} history tokens")
+    return system + recent, summary
+
+
+def history_fingerprint(messages, summary=None):
+    """Identifies a history and summary, to tell whether a compaction still applies to them."""
+    encoded = json.dumps([messages, summary], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _evict_compactions(now):
+    # Sessions that expired or were never continued must not keep their results
+    while _compactions:
+        session_id, (started_at, *_) = next(iter(_compactions.items()))
+        if now - started_at < CHAT_SESSION_TTL_SECONDS and len(_compactions) <= CHAT_SESSION_MAX_SESSIONS:
+            break
+        _compactions.popitem(last=False)
+
+
+def start_compaction(session_id, messages, summary=None, budget=CHAT_HISTORY_TOKEN_BUDGET, keep_turns=CHAT_KEEP_TURNS):
+    """
+    Compact a saved history in the background, off the reply path. The result
+    is kept in this process until the session's next turn applies it with
+    apply_compaction. No-op while the history is under budget or a compaction
+    of the session is already pending.
+    """
+    system = 1 if messages and messages[0]["role"] == "system" else 0
+    if estimate_tokens(messages[system:]) <= budget:
+        return None
+    now = time.time()
+    with _compactions_lock:
+        _evict_compactions(now)
+        if session_id in _compactions:
+            return None
+        future = _compaction_executor.submit(compact_history, messages, summary, budget, keep_turns)
+        _compactions[session_id] = (now, len(messages), history_fingerprint(messages, summary), future)
+    return future
+
+
+def apply_compaction(session_id, messages, summary=None):
+    """
+    (messages, summary) with the session's finished background compaction
+    applied: the messages it covered are replaced by its result, and those
+    added since are kept after them.
+
+    Unchanged while it is still running, and when the history it covered
+    is no longer the start of `messages` with `summary`, e.g. because
+    another worker compacted the session in the meantime.
+    """
+    with _compactions_lock:
+        _evict_compactions(time.time())
+        entry = _compactions.get(session_id)
+        if entry is None or not entry[-1].done():
+            return messages, summary
+        del _compactions[session_id]
+    _, covered, fingerprint, future = entry
+    if len(messages) < covered or history_fingerprint(messages[:covered], summary) != fingerprint:
+        print(f"[chat] Discarding a stale history compaction of session {session_id}")
+        return messages, summary
+    try:
+        compacted, compacted_summary = future.result()
+    except Exception as e:
+        print(f"[chat] History compaction failed: {type(e).__name__}: {e}")
+        return messages, summary
+    return compacted + messages[covered:], compacted_summary
+
+
+def build_prompt(messages, summary=None):
+    """Messages to send: the stored history with the running summary after the system prompt."""
+    if not summary:
+        return messages
+    context = {
+        "role": "system",
+        "content": SUMMARY_CONTEXT_PROMPT.replace("{summary}", json.dumps(summary, ensure_ascii=False, indent=2)),
+    }
+    split = 1 if messages and messages[0]["role"] == "system" else 0
+    return messages[:split] + [context] + messages[split:]
+
+
+def chat_message_stream(messages, user_message, summary=None):
     client = get_openai_client()
     messages.append({"role": "user", "content": user_message})
 
     stream = client.chat.completions.create(
         model=DEFAULT_MODEL,
-        messages=messages,
+        messages=build_prompt(messages, summary),
         stream=True,
     )
 
@@ -75,30 +272,164 @@ def finalize_stream(messages, full_reply):
     return messages
 
 
+STATUS_START = "<!--STATUS::"
+STATUS_END = "-->"
+
+
+def decode_status(raw):
+    """Parse the JSON inside a STATUS block, or None if it is malformed."""
+    raw = raw.strip()
+    # Strip double braces if the LLM wrapped with {{ }}
+    if raw.startswith("{{") and raw.endswith("}}"):
+        raw = raw[1:-1]
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+
 def parse_status_from_reply(full_reply):
     import re
     match = re.search(r'<!--STATUS::(.*?)-->', full_reply, re.DOTALL)
     if match:
-        raw = match.group(1).strip()
-        # Strip double braces if the LLM wrapped with {{ }}
-        if raw.startswith("{{") and raw.endswith("}}"):
-            raw = raw[1:-1]
-        try:
-            status = json.loads(raw)
+        status = decode_status(match.group(1))
+        if status is not None:
             visible_text = full_reply[:match.start()].rstrip()
             return visible_text, status
-        except json.JSONDecodeError:
-            pass
     return full_reply, None
 
 
-def request_summary_stream(messages):
+class StatusStreamParser:
+    """
+    Separates the STATUS block from a reply while it streams.
+
+    feed() returns (visible text, status): text that can be shown right
+    away, and the parsed status once its block has closed. Text that might
+    be the start of the marker, and whitespace that might precede it, is
+    held back until the next token settles it, so the block never reaches
+    the client.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.block = None
+        self.status = None
+
+    def _held_back(self, text):
+        """Length of the tail of `text` that may still turn into the marker."""
+        for size in range(min(len(STATUS_START) - 1, len(text)), 0, -1):
+            if STATUS_START.startswith(text[-size:]):
+                start = len(text) - size
+                break
+        else:
+            start = len(text)
+        return len(text) - len(text[:start].rstrip())
+
+    def feed(self, token):
+        if self.block is not None:
+            self.block += token
+            return self._close_block()
+
+        self.pending += token
+        marker = self.pending.find(STATUS_START)
+        if marker != -1:
+            self.block = self.pending[marker + len(STATUS_START):]
+            # Whitespace before the block is never shown
+            visible = self.pending[:marker].rstrip()
+            self.pending = ""
+            text, status = self._close_block()
+            return visible + text, status
+
+        held = self._held_back(self.pending)
+        visible = self.pending[:len(self.pending) - held]
+        self.pending = self.pending[len(visible):]
+        return visible, None
+
+    def _close_block(self):
+        end = self.block.find(STATUS_END)
+        if end == -1:
+            return "", None
+        raw, rest = self.block[:end], self.block[end + len(STATUS_END):]
+        self.block = None
+        self.status = decode_status(raw)
+        if self.status is None:
+            print(f"[chat] Dropped malformed status block: {raw[:200]}")
+        # Anything after the block is ordinary text again
+        visible, _ = self.feed(rest) if rest.strip() else ("", None)
+        return visible, self.status
+
+    def flush(self):
+        """Text still held back when the stream ends; an unclosed block is dropped."""
+        if self.block is not None:
+            print(f"[chat] Dropped unterminated status block: {self.block[:200]}")
+            self.block = None
+        visible, self.pending = self.pending.rstrip(), ""
+        return visible, None
+
+
+def update_form_data(schema_str, form_data, exchange):
+    """
+    Merge what was said in `exchange` (questions and answers not merged yet)
+    into `form_data`. The model's answer is conformed to the schema: unknown
+    fields, values outside a field's options and values of the wrong type
+    are dropped.
+    """
+    client = get_openai_client()
+    transcript = "\n".join(
+        f"{m['role'].upper()}: {parse_status_from_reply(m['content'])[0]}" for m in exchange
+    )
+    prompt = FORM_DATA_PROMPT.replace("{schema}", schema_str)
+    prompt = prompt.replace("{form_data}", json.dumps(form_data or {}, ensure_ascii=False, indent=2))
+    prompt = prompt.replace("{transcript}", transcript)
+
+    response = client.chat.completions.create(
+        model=CHAT_EXTRACTION_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+    )
+    updated = json.loads(response.choices[0].message.content)
+    if not isinstance(updated, dict):
+        raise ValueError(f"Expected a JSON object, got {type(updated).__name__}")
+    # A field the model left out keeps its value rather than being lost
+    return {**(form_data or {}), **conform_to_schema(updated, schema_str)}
+
+
+def latest_exchange(messages, user_message):
+    """The question being answered (the last assistant message) and the answer."""
+    exchange = [m for m in messages[-1:] if m["role"] == "assistant"]
+    exchange.append({"role": "user", "content": user_message})
+    return exchange
+
+
+def still_unmerged(pending, merged):
+    """
+    What is left of a session's `pending` messages once an update of the
+    `merged` ones is stored, or None when that update is outdated: nothing
+    it merged is pending any more, so a later update already covered it.
+    """
+    # Turns append to the pending list and stored updates cut its front, so
+    # the merged messages still pending are a prefix of it
+    for count in range(min(len(pending), len(merged)), 0, -1):
+        if pending[:count] == merged[-count:]:
+            return pending[count:]
+    return None
+
+
+def start_form_data_update(schema_str, form_data, unmerged):
+    """
+    Merge the `unmerged` messages into the form data in the background, so
+    it runs while the reply streams. Returns a Future of the new form data.
+    """
+    return _extraction_executor.submit(update_form_data, schema_str, form_data, unmerged)
+
+
+def request_summary_stream(messages, summary=None):
     client = get_openai_client()
     messages.append({"role": "user", "content": SUMMARY_PROMPT})
 
     stream = client.chat.completions.create(
         model=DEFAULT_MODEL,
-        messages=messages,
+        messages=build_prompt(messages, summary),
         stream=True,
     )
 
@@ -12,19 +12,26 @@ class ImageExtractor(dspy.Signature):
 		desc="JSON parsable content with detailed analysis of the image that doesn't start with ```json or ```",
 	)
 
+DEFAULT_IMAGE_MODEL = "openrouter/google/gemini-2.5-pro:nitro"
+
 class ImageExtractorGenerator(dspy.Module):
-	def __init__(self, model_name: str = "openrouter/google/gemini-2.5-pro:nitro"):
+	def __init__(self, model_name: str = DEFAULT_IMAGE_MODEL):
+		self.model_name = model_name
 		self.lm = dspy.LM(
 			model_name,
 			api_key=OPENROUTER_API_KEY,
 		)
-	
+		# Built once and reused: predictors hold no per-call state
+		self.adapter = dspy.ChatAdapter()
+		self.describe = dspy.ChainOfThought(ImageExtractor)
+
 	def forward(self, image_url: str, json_schema: Optional[Dict[str, Any]] = None) -> str:
-		with dspy.context(lm=self.lm, adapter=dspy.ChatAdapter()):
-			img = dspy.Image.from_url(image_url)
+		with dspy.context(lm=self.lm, adapter=self.adapter):
+			# Data URLs are sent inline and presigned URLs are fetched by the
+			# provider; neither is downloaded again here
+			img = dspy.Image(image_url)
 
-			describe = dspy.ChainOfThought(ImageExtractor)
-			result = describe(
+			result = self.describe(
 				image=img,
 				json_schema=json_schema
 			)
@@ -1,5 +1,4 @@
-import requests
-from utils.clients import GOOGLE_VISION_API_KEY, GOOGLE_VISION_BASE_URL
+from utils.clients import GOOGLE_VISION_API_KEY, GOOGLE_VISION_BASE_URL, get_http_session
 
 def transcribe_image(image_url: str) -> str:
 	url = f"{GOOGLE_VISION_BASE_URL}/images:annotate?key={GOOGLE_VISION_API_KEY}"
@@ -13,9 +12,9 @@ def transcribe_image(image_url: str) -> str:
 		]
 	}
 
-	response = requests.post(url, json=payload)
+	response = get_http_session().post(url, json=payload)
+	response.raise_for_status()
 	result = response.json()
-	import pdb; pdb.set_trace()
 	return result["responses"][0]["textAnnotations"][0]["description"]
 
 
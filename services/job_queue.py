@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "32"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "180"))
+# Finished jobs are kept this long so clients can still poll the result
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled", "timed_out")
+
+_current = threading.local()
+
+
+def current_job():
+	"""The Job being run by the calling worker thread, or None."""
+	return getattr(_current, "job", None)
+
+
+class QueueFullError(Exception):
+	pass
+
+
+class Job:
+	def __init__(self, job_id: str, kind: str, timeout: float, cleanup=None):
+		self.id = job_id
+		self.kind = kind
+		self.status = "queued"
+		self.result = None
+		self.error = None
+		self.progress = None
+		self.timeout = timeout
+		self.created_at = time.time()
+		self.started_at = None
+		self.finished_at = None
+		self.version = 0
+		self.future = None
+		self._cleanup = cleanup
+		self._changed = threading.Condition()
+
+	@property
+	def done(self) -> bool:
+		return self.status in TERMINAL_STATUSES
+
+	def update(self, **fields) -> bool:
+		"""Apply a state change unless the job already reached a terminal status."""
+		with self._changed:
+			if self.done:
+				return False
+			for key, value in fields.items():
+				setattr(self, key, value)
+			if self.done:
+				self.finished_at = time.time()
+			self.version += 1
+			self._changed.notify_all()
+			return True
+
+	def wait_for_change(self, version: int, timeout: float) -> int:
+		"""Block until the job changes past `version` or the timeout expires."""
+		with self._changed:
+			self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+			return self.version
+
+	def run_cleanup(self) -> None:
+		cleanup, self._cleanup = self._cleanup, None
+		if cleanup:
+			try:
+				cleanup()
+			except Exception as e:
+				print(f"[jobs] Cleanup for {self.id} failed: {type(e).__name__}: {e}")
+
+	def to_dict(self) -> dict:
+		data = {
+			"job_id": self.id,
+			"kind": self.kind,
+			"status": self.status,
+			"created_at": self.created_at,
+			"started_at": self.started_at,
+			"finished_at": self.finished_at,
+		}
+		if self.progress is not None:
+			data["progress"] = self.progress
+		if self.status == "succeeded":
+			data["result"] = self.result
+		if self.error:
+			data["error"] = self.error
+		return data
+
+
+class JobQueue:
+	"""
+	Bounded background executor for long-running requests.
+
+	At most `workers` jobs run at once and at most `max_queued` wait behind
+	them. A running job can't be interrupted from outside its thread, so a
+	cancelled or timed-out job is marked terminal right away and whatever it
+	returns later is discarded.
+	"""
+
+	def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED,
+				 timeout: float = JOB_TIMEOUT_SECONDS, retention: float = JOB_RETENTION_SECONDS):
+		self.max_queued = max_queued
+		self.timeout = timeout
+		self.retention = retention
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+		self._jobs = {}
+		self._lock = threading.Lock()
+
+	def submit(self, kind: str, fn, *args, timeout: float = None, cleanup=None, **kwargs) -> Job:
+		"""
+		Queue fn(*args, **kwargs) and return its Job immediately.
+
+		Args:
+			cleanup: Called once when the job can no longer touch its inputs
+
+		Raises:
+			QueueFullError: if `max_queued` jobs are already waiting
+		"""
+		self._reap()
+		with self._lock:
+			queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+			if queued >= self.max_queued:
+				raise QueueFullError(f"{queued} jobs already queued")
+			job = Job(str(uuid.uuid4()), kind, timeout or self.timeout, cleanup)
+			self._jobs[job.id] = job
+		job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+		return job
+
+	def _run(self, job: Job, fn, args, kwargs) -> None:
+		try:
+			if not job.update(status="running", started_at=time.time()):
+				return
+
+			timer = threading.Timer(job.timeout, self._expire, args=(job,))
+			timer.daemon = True
+			timer.start()
+			_current.job = job
+			try:
+				result = fn(*args, **kwargs)
+				job.update(status="succeeded", result=result)
+			except Exception as e:
+				traceback.print_exc()
+				job.update(status="failed", error=f"{type(e).__name__}: {e}")
+			finally:
+				_current.job = None
+				timer.cancel()
+		finally:
+			job.run_cleanup()
+
+	def _expire(self, job: Job) -> None:
+		if job.update(status="timed_out", error=f"Job exceeded {job.timeout:.0f}s"):
+			print(f"[jobs] {job.id} timed out")
+
+	def get(self, job_id: str):
+		with self._lock:
+			return self._jobs.get(job_id)
+
+	def cancel(self, job_id: str) -> bool:
+		job = self.get(job_id)
+		if job is None or not job.update(status="cancelled"):
+			return False
+		# Never started: the worker won't run it, so release its inputs here
+		if job.future is not None and job.future.cancel():
+			job.run_cleanup()
+		return True
+
+	def _reap(self) -> None:
+		cutoff = time.time() - self.retention
+		with self._lock:
+			for job_id in [i for i, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+				del self._jobs[job_id]
+
+	def stats(self) -> dict:
+		with self._lock:
+			counts = {}
+			for job in self._jobs.values():
+				counts[job.status] = counts.get(job.status, 0) + 1
+		return {"max_queued": self.max_queued, "jobs": counts}
+
+
+job_queue = JobQueue()
@@ -0,0 +1,144 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import dspy
+
+from services.result_merging import merge_json_results, parse_json_result, result_confidence, schema_properties
+from utils.tokens import CHARS_PER_TOKEN, count_tokens
+
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_TOKENS", "6000"))
+MAP_REDUCE_MAX_WORKERS = int(os.getenv("MAP_REDUCE_MAX_WORKERS", "4"))
+
+# Tried in order when a block of text is too large for one chunk
+TEXT_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+def pack(pieces: list[str], max_tokens: int, separator: str) -> list[str]:
+	"""Greedily group consecutive pieces into chunks of at most `max_tokens`."""
+	chunks, current, current_tokens = [], [], 0
+	for piece in pieces:
+		tokens = count_tokens(piece)
+		if current and current_tokens + tokens > max_tokens:
+			chunks.append(separator.join(current))
+			current, current_tokens = [], 0
+		current.append(piece)
+		current_tokens += tokens
+	if current:
+		chunks.append(separator.join(current))
+	return chunks
+
+
+def split_text(text: str, max_tokens: int = MAP_REDUCE_CHUNK_TOKENS) -> list[str]:
+	"""Split on paragraphs first, then lines, sentences and words."""
+	if count_tokens(text) <= max_tokens:
+		return [text]
+
+	for separator in TEXT_SEPARATORS:
+		parts = [part for part in text.split(separator) if part.strip()]
+		if len(parts) > 1:
+			pieces = []
+			for part in parts:
+				pieces.extend(split_text(part, max_tokens))
+			return pack(pieces, max_tokens, separator)
+
+	step = max_tokens * CHARS_PER_TOKEN
+	return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def split_json(value, max_tokens: int = MAP_REDUCE_CHUNK_TOKENS, path: str = "$") -> list[str]:
+	"""
+	Split a JSON document into subtrees that fit the budget.
+
+	Each piece is written as "<path>: <json>" so the model keeps the
+	location of a subtree once it is separated from its parents.
+	"""
+	text = json.dumps(value, ensure_ascii=False)
+	if count_tokens(text) <= max_tokens:
+		return [text if path == "$" else f"{path}: {text}"]
+	if not isinstance(value, (dict, list)) or not value:
+		return [f"{path}: {piece}" for piece in split_text(text, max_tokens)]
+
+	items = value.items() if isinstance(value, dict) else enumerate(value)
+	pieces = []
+	for key, child in items:
+		child_path = f"{path}.{key}" if isinstance(value, dict) else f"{path}[{key}]"
+		pieces.extend(split_json(child, max_tokens, child_path))
+	return pack(pieces, max_tokens, "\n")
+
+
+def split_table(text: str, header_lines: int = 1, max_tokens: int = MAP_REDUCE_CHUNK_TOKENS) -> list[str]:
+	"""Split a CSV or markdown table into row blocks that each repeat the header."""
+	if count_tokens(text) <= max_tokens:
+		return [text]
+
+	lines = text.splitlines(keepends=True)
+	header = "".join(lines[:header_lines])
+	budget = max(max_tokens - count_tokens(header), 1)
+	return [header + block for block in pack(lines[header_lines:], budget, "")]
+
+
+class MapReduceExtractor:
+	"""
+	Runs a text extractor over chunks concurrently and merges the partial
+	json_results against the schema, so latency tracks the chunk size
+	rather than the document size.
+	"""
+
+	def __init__(self, text_extractor, max_workers: int = MAP_REDUCE_MAX_WORKERS):
+		self.text_extractor = text_extractor
+		self.max_workers = max_workers
+
+	def extract_chunk(self, index: int, text: str, json_schema) -> dict:
+		start = time.perf_counter()
+		try:
+			result = self.text_extractor(text=text, json_schema=json_schema)
+			error = None
+		except Exception as e:
+			result, error = None, f"{type(e).__name__}: {e}"
+		elapsed_ms = (time.perf_counter() - start) * 1000
+		print(f"[map-reduce] Chunk {index + 1} extracted in {elapsed_ms:.0f} ms" + (f" ({error})" if error else ""))
+		return {"index": index, "result": result, "error": error, "elapsed_ms": round(elapsed_ms)}
+
+	def __call__(self, chunks: list[str], json_schema=None, describe: Optional[Callable[[int, int, str], str]] = None,
+				 on_part: Optional[Callable[[int, int, dspy.Prediction], None]] = None):
+		"""
+		Args:
+			chunks: Input pieces, in document order
+			describe: Optional (index, total, chunk) -> prompt text, to add context around each chunk
+			on_part: Optional (index, total, prediction) callback, run as each chunk of a
+				multi-chunk input succeeds (from a worker thread)
+		"""
+		if len(chunks) == 1:
+			text = describe(0, 1, chunks[0]) if describe else chunks[0]
+			return self.text_extractor(text=text, json_schema=json_schema)
+
+		texts = [describe(i, len(chunks), chunk) if describe else chunk for i, chunk in enumerate(chunks)]
+		with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(texts)))) as pool:
+			def run_chunk(item):
+				run = self.extract_chunk(item[0], item[1], json_schema)
+				if on_part and run["result"] is not None:
+					on_part(run["index"], len(texts), run["result"])
+				return run
+
+			runs = list(pool.map(run_chunk, enumerate(texts)))
+
+		succeeded = [run for run in runs if run["result"] is not None]
+		if not succeeded:
+			raise RuntimeError(f"Extraction failed on every chunk: {runs[0]['error']}")
+
+		properties = schema_properties(json_schema)
+		partials = [parse_json_result(run["result"].json_result) for run in succeeded]
+		confidences = [result_confidence(partial, properties) for partial in partials]
+		merged = merge_json_results(partials, json_schema, confidences)
+
+		reasoning = "\n\n".join(
+			f"Part {run['index'] + 1}/{len(chunks)}: {run['result'].reasoning}" for run in succeeded
+		)
+		print(f"[map-reduce] Merged {len(succeeded)}/{len(chunks)} chunks")
+		return dspy.Prediction(
+			json_result=json.dumps(merged, ensure_ascii=False),
+			reasoning=reasoning,
+		)
@@ -1,54 +1,191 @@
+import json
 import os
-import tempfile
-from typing import Optional, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any
 
+import dspy
 import fitz  # PyMuPDF
 
 from services.image_to_json import ImageExtractorGenerator
-from utils.images import s3_urls_from_images
-
-
-def convert_pdf_to_images(pdf_path: str) -> list[str]:
-	"""Convert each page of a PDF to an image file. Returns list of image paths."""
-	doc = fitz.open(pdf_path)
-	image_paths = []
-	
-	for page_num in range(len(doc)):
-		page = doc[page_num]
-		# Render page to image with good resolution (2x zoom)
-		mat = fitz.Matrix(2, 2)
-		pix = page.get_pixmap(matrix=mat)
-		
-		# Save to temp file
-		tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f"_page{page_num + 1}.png")
-		pix.save(tmp.name)
-		image_paths.append(tmp.name)
-	
-	doc.close()
-	return image_paths
+from services.text_to_json import TextExtractorGenerator
+from services.result_merging import merge_json_results, parse_json_result, result_confidence, schema_properties
+from utils.images import image_url_from_bytes, prepare_image_bytes
+from utils.pdf_rendering import PDF_RENDER_DPI, PDF_RENDER_FORMAT, render_mime_type, submit_render
+
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "4"))
+PDF_TEXT_LAYER = os.getenv("PDF_TEXT_LAYER", "1") == "1"
+# Pages with fewer extractable characters are treated as scans
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "80"))
+
+
+def page_ranges(selection: str) -> list[tuple[Optional[int], Optional[int]]]:
+	"""
+	Split a 1-based page selection like "1-3,5" into (first, last) pairs,
+	None standing for an open end. Raises ValueError on malformed input.
+	"""
+	ranges = []
+	for part in str(selection).split(","):
+		part = part.strip()
+		if not part:
+			continue
+		start, dash, end = part.partition("-")
+		try:
+			first = int(start) if start.strip() else None
+			last = int(end) if end.strip() else None
+		except ValueError:
+			raise ValueError(f"Invalid page selection '{selection}': expected pages like 1-3,5")
+		if not dash:
+			last = first
+		if any(p is not None and p < 1 for p in (first, last)) or (first and last and last < first):
+			raise ValueError(f"Invalid page range '{part}' in page selection '{selection}'")
+		ranges.append((first, last))
+	return ranges
+
+
+def parse_page_selection(selection: Optional[str], page_count: int) -> list[int]:
+	"""
+	Parse a 1-based page selection like "1-3,5" into sorted 0-based indexes.
+	An empty selection means every page; a range may run past the last page.
+
+	Raises:
+		ValueError: if the selection is malformed, names a page past the end
+			or the PDF has no pages
+	"""
+	if page_count < 1:
+		raise ValueError("The PDF has no pages")
+	if not selection:
+		return list(range(page_count))
+
+	pages = set()
+	for first, last in page_ranges(selection):
+		first = first or 1
+		if first > page_count:
+			raise ValueError(f"Page selection '{selection}' names page {first} of a {page_count}-page PDF")
+		pages.update(p - 1 for p in range(first, min(last or page_count, page_count) + 1))
+	return sorted(pages)
+
+
+def check_page_selection(pdf_path: str, selection: Optional[str]) -> None:
+	"""Raise ValueError unless `selection` picks pages of the PDF at `pdf_path`."""
+	try:
+		doc = fitz.open(pdf_path)
+	except fitz.FileDataError as e:
+		raise ValueError("The file is not a readable PDF") from e
+	with doc:
+		parse_page_selection(selection, doc.page_count)
+
+
+def extract_text_layers(pdf_path: str, page_indexes: list[int], min_chars: int = PDF_TEXT_MIN_CHARS) -> dict[int, str]:
+	"""Return {page index: text} for the pages whose text layer is usable."""
+	texts = {}
+	with fitz.open(pdf_path) as doc:
+		for page_num in page_indexes:
+			text = doc[page_num].get_text("text").strip()
+			if len(text) >= min_chars:
+				texts[page_num] = text
+	return texts
 
 
 class PDFExtractorGenerator:
-	def __init__(self):
-		self.image_extractor = ImageExtractorGenerator()
+	def __init__(self,
+				 image_extractor: Optional[ImageExtractorGenerator] = None,
+				 text_extractor: Optional[TextExtractorGenerator] = None,
+				 max_workers: int = PDF_MAX_WORKERS,
+				 dpi: int = PDF_RENDER_DPI,
+				 render_format: str = PDF_RENDER_FORMAT):
+		self.image_extractor = image_extractor or ImageExtractorGenerator()
+		self.text_extractor = text_extractor or TextExtractorGenerator()
+		self.max_workers = max_workers
+		self.dpi = dpi
+		self.render_format = render_format
+
+	def page_image_url(self, pdf_path: str, page_index: int, dpi: int) -> str:
+		"""Render a scanned page in the process pool and encode it for the vision model."""
+		start = time.perf_counter()
+		data = submit_render(pdf_path, page_index, dpi, self.render_format).result()
+		print(f"[pdf] Page {page_index + 1} rendered at {dpi} dpi in {(time.perf_counter() - start) * 1000:.0f} ms ({len(data)} bytes)")
+		data, mime_type = prepare_image_bytes(data, render_mime_type(self.render_format))
+		return image_url_from_bytes(data, mime_type)
 
-	def __call__(self, pdf_path: str, json_schema: Optional[Dict[str, Any]] = None):
-		# Convert PDF pages to images
-		image_paths = convert_pdf_to_images(pdf_path)
-		
+	def extract_page(self, pdf_path: str, page_index: int, route: str, text: Optional[str], json_schema, dpi: int) -> dict:
+		"""Run one page through the text extractor (born-digital) or the vision extractor (scan)."""
+		page_number = page_index + 1
+		start = time.perf_counter()
 		try:
-			# Upload first page image to S3 and get URL
-			# For now, process first page only (can be extended to merge results from all pages)
-			image_url = s3_urls_from_images(image_paths)[0]
-			
-			# Use existing image extractor
-			result = self.image_extractor(
-				image_url=image_url,
-				json_schema=json_schema
+			if route == "text":
+				result = self.text_extractor(
+					text=f"The following is the text of page {page_number} of a PDF document:\n\n{text}",
+					json_schema=json_schema
+				)
+			else:
+				# Rendered only now, so pages that are never sent are never rasterized
+				result = self.image_extractor(
+					image_url=self.page_image_url(pdf_path, page_index, dpi),
+					json_schema=json_schema
+				)
+			error = None
+		except Exception as e:
+			result, error = None, f"{type(e).__name__}: {e}"
+		elapsed_ms = (time.perf_counter() - start) * 1000
+		print(f"[pdf] Page {page_number} ({route}) extracted in {elapsed_ms:.0f} ms" + (f" ({error})" if error else ""))
+		return {"page": page_number, "route": route, "result": result, "error": error, "elapsed_ms": round(elapsed_ms)}
+
+	def __call__(self, pdf_path: str, json_schema: Optional[Dict[str, Any]] = None, pages: Optional[str] = None, dpi: Optional[int] = None,
+				 on_part: Optional[Callable[[int, int, dspy.Prediction], None]] = None):
+		"""
+		Args:
+			on_part: Optional (index, total, prediction) callback, run as each page succeeds
+		"""
+		with fitz.open(pdf_path) as doc:
+			page_indexes = parse_page_selection(pages, len(doc))
+
+		page_texts = extract_text_layers(pdf_path, page_indexes) if PDF_TEXT_LAYER else {}
+		tasks = [
+			(i, "text" if i in page_texts else "vision", page_texts.get(i))
+			for i in page_indexes
+		]
+
+		# Pages are independent model calls, so run them side by side
+		with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tasks)))) as pool:
+			def run_page(item):
+				index, task = item
+				run = self.extract_page(pdf_path, *task, json_schema, dpi or self.dpi)
+				if on_part and run["result"] is not None:
+					on_part(index, len(tasks), run["result"])
+				return run
+
+			page_runs = list(pool.map(run_page, enumerate(tasks)))
+
+		succeeded = [run for run in page_runs if run["result"] is not None]
+		if not page_runs:
+			raise ValueError(f"No page of {pdf_path} selected")
+		if not succeeded:
+			raise RuntimeError(f"Extraction failed on every page: {page_runs[0]['error']}")
+
+		properties = schema_properties(json_schema)
+		partials = [parse_json_result(run["result"].json_result) for run in succeeded]
+		confidences = [result_confidence(partial, properties) for partial in partials]
+
+		page_report = []
+		for run in page_runs:
+			entry = {"page": run["page"], "route": run["route"], "elapsed_ms": run["elapsed_ms"]}
+			if run["error"]:
+				entry["error"] = run["error"]
+			else:
+				entry["confidence"] = round(confidences[succeeded.index(run)], 3)
+			page_report.append(entry)
+
+		if len(succeeded) == 1:
+			merged = partials[0]
+			reasoning = succeeded[0]["result"].reasoning
+		else:
+			merged = merge_json_results(partials, json_schema, confidences)
+			reasoning = "\n\n".join(
+				f"Page {run['page']}: {run['result'].reasoning}" for run in succeeded
 			)
-			return result
-		finally:
-			# Clean up temp image files
-			for path in image_paths:
-				if os.path.exists(path):
-					os.unlink(path)
+		return dspy.Prediction(
+			json_result=json.dumps(merged, ensure_ascii=False),
+			reasoning=reasoning,
+			pages=page_report,
+		)
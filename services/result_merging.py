@@ -0,0 +1,161 @@
+import ast
+import json
+
+
+def parse_json_result(json_result) -> dict:
+	"""Turn a model's json_result (dict, JSON string or Python literal) into a dict."""
+	if isinstance(json_result, dict):
+		return json_result
+	if not json_result:
+		return {}
+
+	text = json_result.strip()
+	if text.startswith("```"):
+		text = text.strip("`")
+		if text.startswith("json"):
+			text = text[4:]
+	try:
+		value = json.loads(text)
+	except json.JSONDecodeError:
+		try:
+			value = ast.literal_eval(text)
+		except (ValueError, SyntaxError):
+			return {}
+	return value if isinstance(value, dict) else {}
+
+
+def schema_properties(json_schema) -> dict:
+	if isinstance(json_schema, str):
+		json_schema = json.loads(json_schema) if json_schema else {}
+	return (json_schema or {}).get("properties", {})
+
+
+def is_empty(value) -> bool:
+	return value is None or value == "" or value == [] or value == {}
+
+
+def conform_value(value, prop: dict):
+	"""Coerce a value to its schema property; None when it can't be made to fit."""
+	kind = prop.get("type")
+	if kind == "array":
+		items = []
+		for item in value if isinstance(value, list) else [value]:
+			item = conform_value(item, prop.get("items", {}))
+			if not is_empty(item) and item not in items:
+				items.append(item)
+		return items
+
+	if "enum" in prop:
+		for option in prop["enum"]:
+			if value == option or (isinstance(value, str) and value.strip().lower() == str(option).lower()):
+				return option
+		return None
+
+	if kind == "string":
+		if isinstance(value, list) and all(isinstance(item, (str, int, float)) for item in value):
+			return ", ".join(str(item) for item in value)
+		if isinstance(value, (dict, list)):
+			return None
+		return str(value).strip()
+
+	if kind in ("number", "integer"):
+		if isinstance(value, bool):
+			return None
+		try:
+			number = float(str(value).strip())
+		except ValueError:
+			return None
+		return int(number) if kind == "integer" and number.is_integer() else (None if kind == "integer" else number)
+
+	if kind == "boolean":
+		if isinstance(value, bool):
+			return value
+		return {"true": True, "yes": True, "false": False, "no": False}.get(str(value).strip().lower())
+
+	return value
+
+
+def conform_to_schema(data: dict, json_schema) -> dict:
+	"""
+	Keep only the schema's fields, each coerced to its declared type; enum
+	values must be one of the listed options. Values that can't be coerced
+	and empty values are dropped.
+	"""
+	properties = schema_properties(json_schema)
+	conformed = {}
+	for key, value in data.items():
+		if key not in properties:
+			continue
+		value = conform_value(value, properties[key])
+		if not is_empty(value):
+			conformed[key] = value
+	return conformed
+
+
+def result_confidence(data: dict, properties: dict) -> float:
+	"""Share of schema fields a partial result filled in."""
+	keys = list(properties) or list(data)
+	if not keys:
+		return 0.0
+	return sum(1 for key in keys if not is_empty(data.get(key))) / len(keys)
+
+
+def merge_json_results(results: list[dict], json_schema=None, confidences: list[float] = None) -> dict:
+	"""
+	Deterministically merge partial extraction results against a schema.
+
+	- free-text strings are concatenated in input order, skipping values
+	  equal to an earlier one up to case and whitespace
+	- arrays are unioned, keeping first-seen order
+	- enum strings and every other type go to the most confident result
+	  that has a value, the earliest one winning ties
+
+	Args:
+		results: Partial json_result dicts, in document order
+		json_schema: JSON schema (dict or string) the results satisfy
+		confidences: Optional score per result, defaults to result_confidence
+
+	Returns:
+		A single dict with every key seen in the schema or the results
+	"""
+	properties = schema_properties(json_schema)
+	if confidences is None:
+		confidences = [result_confidence(r, properties) for r in results]
+
+	keys = list(properties)
+	for result in results:
+		keys.extend(key for key in result if key not in keys)
+
+	merged = {}
+	for key in keys:
+		prop = properties.get(key, {})
+		values = [(i, r[key]) for i, r in enumerate(results) if not is_empty(r.get(key))]
+
+		if prop.get("type") == "array" or (not prop and values and all(isinstance(v, list) for _, v in values)):
+			union = []
+			for _, value in values:
+				for item in value if isinstance(value, list) else [value]:
+					if item not in union:
+						union.append(item)
+			merged[key] = union
+
+		elif (prop.get("type") == "string" or not prop) and "enum" not in prop \
+				and all(isinstance(v, str) for _, v in values):
+			parts, seen = [], set()
+			for _, value in values:
+				value = value.strip()
+				# Whole-value comparison: "2" must survive next to "12 mg"
+				normalized = " ".join(value.split()).casefold()
+				if normalized and normalized not in seen:
+					seen.add(normalized)
+					parts.append(value)
+			merged[key] = "\n".join(parts)
+
+		elif values:
+			best = max(values, key=lambda item: (confidences[item[0]], -item[0]))
+			merged[key] = best[1]
+
+		else:
+			merged[key] = [] if prop.get("type") == "array" else ""
+
+	return merged
@@ -1,10 +1,57 @@
-import requests
+import mimetypes
+import os
 import json
 import sys
-from utils.clients import DEEPGRAM_API_KEY, DEEPGRAM_BASE_URL
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Optional, Union
+from utils.audio_preprocessing import OUTPUT_MIME_TYPE, normalized_audio
+from utils.audio_segmentation import audio_duration, iter_speech_segments
+from utils.clients import DEEPGRAM_API_KEY, DEEPGRAM_BASE_URL, get_http_session
 
-def transcribe_audio(audio_url: str, language: str = "en", model: str = "nova-3") -> str:
-	url = f"{DEEPGRAM_BASE_URL}/listen?smart_format=true&language={language}&model={model}"
+# Size of each piece of the request body sent to Deepgram
+STT_CHUNK_SIZE = int(os.getenv("STT_CHUNK_SIZE", str(64 * 1024)))
+STT_TIMEOUT_SECONDS = float(os.getenv("STT_TIMEOUT_SECONDS", "120"))
+# Recordings at least this long are split at pauses and transcribed in parallel
+STT_LONG_AUDIO_SECONDS = float(os.getenv("STT_LONG_AUDIO_SECONDS", "180"))
+STT_MAX_WORKERS = int(os.getenv("STT_MAX_WORKERS", "4"))
+
+DEFAULT_STT_MODEL = "nova-3"
+
+# mimetypes doesn't know every container browsers and phones record in
+AUDIO_CONTENT_TYPES = {
+	".m4a": "audio/mp4",
+	".webm": "audio/webm",
+	".ogg": "audio/ogg",
+	".opus": "audio/ogg",
+}
+
+
+def listen_url(language: Optional[str] = "en", model: str = DEFAULT_STT_MODEL) -> str:
+	url = f"{DEEPGRAM_BASE_URL}/listen?smart_format=true&model={model}"
+	if language:
+		url += f"&language={language}"
+	return url
+
+
+def transcript_from_response(result: dict) -> str:
+	return result["results"]["channels"][0]["alternatives"][0]["transcript"]
+
+
+def audio_content_type(path: str) -> str:
+	extension = os.path.splitext(path)[1].lower()
+	return AUDIO_CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def iter_chunks(fileobj: BinaryIO, chunk_size: int = STT_CHUNK_SIZE):
+	"""Read a file object piece by piece so only one chunk is in memory at a time."""
+	for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+		yield chunk
+
+
+def transcribe_audio(audio_url: str, language: str = "en", model: str = DEFAULT_STT_MODEL) -> str:
+	url = listen_url(language, model)
 
 	payload = json.dumps({
 		"url": audio_url
@@ -15,11 +62,96 @@ def transcribe_audio(audio_url: str, language: str = "en", model: str = "nova-3"
 		'Content-Type': 'application/json'
 	}
 
-	response = requests.request("POST", url, headers=headers, data=payload)
+	response = get_http_session().post(url, headers=headers, data=payload)
 	result = response.json()
-	return result["results"]["channels"][0]["alternatives"][0]["transcript"]
+	return transcript_from_response(result)
+
+
+def transcribe_stream(chunks: Union[bytes, Iterable[bytes]], content_type: str,
+					  language: Optional[str] = "en", model: str = DEFAULT_STT_MODEL) -> str:
+	"""
+	Send audio to Deepgram as the request body.
+
+	A generator of chunks is sent with chunked transfer encoding, so the
+	recording is never held in memory as a whole; small clips that are
+	already in memory can be passed as bytes.
+	"""
+	response = get_http_session().post(
+		listen_url(language, model),
+		headers={
+			"Authorization": f"Token {DEEPGRAM_API_KEY}",
+			"Content-Type": content_type,
+		},
+		data=chunks,
+		timeout=STT_TIMEOUT_SECONDS,
+	)
+	response.raise_for_status()
+	return transcript_from_response(response.json())
+
+
+def transcribe_segments(source, language: Optional[str] = "en", model: str = DEFAULT_STT_MODEL,
+						max_workers: int = STT_MAX_WORKERS) -> dict:
+	"""
+	Transcribe a long recording as speech segments, several at a time.
+
+	Segments are cut at pauses (see VoiceActivitySegmenter) and sent as soon
+	as they are decoded, so uploads overlap decoding. At most 2 x max_workers
+	encoded segments are held at once.
+
+	Returns:
+		{"transcript": stitched text, "segments": [{"start", "end", "transcript"}]}
+		with offsets in seconds from the start of the recording
+	"""
+	start_time = time.perf_counter()
+	slots = threading.BoundedSemaphore(max_workers * 2)
+	pending = []
+	with ThreadPoolExecutor(max_workers=max_workers) as pool:
+		for start, duration, data in iter_speech_segments(source):
+			slots.acquire()
+			future = pool.submit(transcribe_stream, data, OUTPUT_MIME_TYPE, language, model)
+			future.add_done_callback(lambda _: slots.release())
+			pending.append((start, duration, future))
+
+		segments = [
+			{"start": round(start, 2), "end": round(start + duration, 2), "transcript": future.result()}
+			for start, duration, future in pending
+		]
+
+	transcript = " ".join(segment["transcript"] for segment in segments if segment["transcript"])
+	print(f"[stt] {len(segments)} segments transcribed in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+	return {"transcript": transcript, "segments": segments}
+
+
+def is_long_recording(fileobj: BinaryIO) -> bool:
+	try:
+		return audio_duration(fileobj) >= STT_LONG_AUDIO_SECONDS
+	except Exception:
+		return False
+	finally:
+		fileobj.seek(0)
+
+
+def transcribe_upload(fileobj: BinaryIO, content_type: str,
+					  language: Optional[str] = "en", model: str = DEFAULT_STT_MODEL) -> str:
+	"""
+	Normalize a recording (mono 16 kHz Opus, silence trimmed) and stream it
+	to Deepgram; long recordings go through transcribe_segments.
+	"""
+	if is_long_recording(fileobj):
+		return transcribe_segments(fileobj, language, model)["transcript"]
+
+	with normalized_audio(fileobj, content_type) as (audio, audio_type):
+		return transcribe_stream(iter_chunks(audio), audio_type, language, model)
+
+
+def transcribe_file(path: str, content_type: Optional[str] = None,
+					language: Optional[str] = "en", model: str = DEFAULT_STT_MODEL) -> str:
+	"""Stream a local recording straight to Deepgram."""
+	with open(path, "rb") as f:
+		return transcribe_upload(f, content_type or audio_content_type(path), language, model)
 
 
 if __name__ == "__main__":
-	transcript = transcribe_audio(sys.argv[1])
+	source = sys.argv[1]
+	transcript = transcribe_file(source) if os.path.exists(source) else transcribe_audio(source)
 	print(transcript)
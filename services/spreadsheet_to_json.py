@@ -1,53 +1,339 @@
+import csv
+import io
 import json
+import os
 from typing import Optional, Dict, Any
 
+import openpyxl
 import pandas as pd
 
+from services.map_reduce_extraction import MapReduceExtractor, split_table, split_text
 from services.text_to_json import TextExtractorGenerator
+from utils.tokens import count_tokens
 
+# "auto" picks the serialization with the fewest tokens
+SPREADSHEET_FORMAT = os.getenv("SPREADSHEET_FORMAT", "auto")
+SPREADSHEET_CHUNK_ROWS = int(os.getenv("SPREADSHEET_CHUNK_ROWS", "2000"))
+SPREADSHEET_MAX_ROWS = int(os.getenv("SPREADSHEET_MAX_ROWS", "20000"))
+SPREADSHEET_MAX_BYTES = int(os.getenv("SPREADSHEET_MAX_BYTES", str(1024 * 1024)))
 
-def convert_spreadsheet_to_json_string(file_path: str) -> str:
-	"""Convert CSV or Excel file to a JSON string representation."""
+# Formats that can be written one row block at a time
+STREAMING_FORMATS = ("csv", "markdown")
+# Header lines repeated at the top of every row block
+HEADER_LINES = {"csv": 1, "markdown": 2}
+
+FORMAT_LABELS = {
+	"csv": "CSV",
+	"markdown": "a markdown table",
+	"columns": "column-oriented JSON",
+	"records": "JSON",
+}
+
+
+def read_spreadsheet(file_path: str) -> pd.DataFrame:
 	# Determine file type and read accordingly
 	if file_path.endswith('.csv'):
-		df = pd.read_csv(file_path)
+		return pd.read_csv(file_path)
 	elif file_path.endswith(('.xlsx', '.xls')):
-		df = pd.read_excel(file_path)
+		return pd.read_excel(file_path)
+	else:
+		raise ValueError(f"Unsupported spreadsheet format: {file_path}")
+
+
+def resolve_sheet(sheet_names: list[str], sheet=None) -> str:
+	"""
+	Name of the sheet selected by `sheet`: a sheet name first, so a sheet
+	called "2024" can be picked, then a 0-based index. None is the first sheet.
+
+	Raises:
+		ValueError: if no sheet matches
+	"""
+	if sheet is None:
+		return sheet_names[0]
+	if str(sheet) in sheet_names:
+		return str(sheet)
+	if isinstance(sheet, int) or str(sheet).strip().isdigit():
+		index = int(sheet)
+		if index < len(sheet_names):
+			return sheet_names[index]
+	raise ValueError(f"Unknown sheet '{sheet}', the workbook has: {', '.join(sheet_names)}")
+
+
+def workbook_sheet_names(file_path: str) -> list[str]:
+	if file_path.endswith('.xlsx'):
+		workbook = openpyxl.load_workbook(file_path, read_only=True)
+		try:
+			return workbook.sheetnames
+		finally:
+			workbook.close()
+	with pd.ExcelFile(file_path) as workbook:
+		return workbook.sheet_names
+
+
+def iter_excel_chunks(file_path: str, sheet=None, chunk_rows: int = SPREADSHEET_CHUNK_ROWS):
+	"""Read an .xlsx sheet row by row in openpyxl read-only mode, yielding DataFrames."""
+	workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+	try:
+		worksheet = workbook[resolve_sheet(workbook.sheetnames, sheet)]
+
+		rows = worksheet.iter_rows(values_only=True)
+		header = next(rows, None)
+		if header is None:
+			return
+		columns = [
+			f"Unnamed: {i}" if name is None else str(name)
+			for i, name in enumerate(header)
+		]
+
+		block = []
+		for row in rows:
+			block.append(list(row[:len(columns)]) + [None] * (len(columns) - len(row)))
+			if len(block) >= chunk_rows:
+				yield pd.DataFrame(block, columns=columns)
+				block = []
+		if block:
+			yield pd.DataFrame(block, columns=columns)
+	finally:
+		workbook.close()
+
+
+def iter_spreadsheet_chunks(file_path: str, sheet=None,
+							chunk_rows: int = SPREADSHEET_CHUNK_ROWS,
+							max_rows: int = SPREADSHEET_MAX_ROWS):
+	"""Yield the spreadsheet as DataFrames of at most `chunk_rows`, stopping after `max_rows`."""
+	if file_path.endswith('.csv'):
+		chunks = pd.read_csv(file_path, chunksize=chunk_rows)
+	elif file_path.endswith('.xlsx'):
+		chunks = iter_excel_chunks(file_path, sheet, chunk_rows)
+	elif file_path.endswith('.xls'):
+		# Legacy .xls has no streaming reader, it is small by nature
+		with pd.ExcelFile(file_path) as workbook:
+			df = pd.read_excel(workbook, sheet_name=resolve_sheet(workbook.sheet_names, sheet))
+		chunks = (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
 	else:
 		raise ValueError(f"Unsupported spreadsheet format: {file_path}")
-	
-	# Convert to JSON-serializable format
-	# Use records orientation for readable row-by-row data
-	records = df.to_dict(orient='records')
-	
-	# Create a structured representation
+
+	remaining = max_rows
+	for chunk in chunks:
+		if remaining <= 0:
+			break
+		chunk = chunk.iloc[:remaining]
+		remaining -= len(chunk)
+		yield chunk
+
+
+def normalize_value(value):
+	"""Make a cell JSON-friendly: None for blanks, ints for whole floats, ISO dates."""
+	if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+		return None
+	if isinstance(value, str):
+		value = value.strip()
+		return value or None
+	if isinstance(value, float) and value.is_integer():
+		return int(value)
+	if isinstance(value, pd.Timestamp):
+		return value.date().isoformat() if value == value.normalize() else value.isoformat()
+	if hasattr(value, "item"):
+		return normalize_value(value.item())
+	return value
+
+
+def clean_dataframe(df: pd.DataFrame, columns: Optional[list] = None) -> pd.DataFrame:
+	"""
+	Normalize every cell and drop empty rows, plus empty columns unless
+	`columns` fixes the columns to keep (so streamed chunks stay aligned).
+	"""
+	# Built column by column as object dtype so pandas doesn't re-infer floats
+	df = pd.DataFrame({
+		column: pd.Series([normalize_value(v) for v in df[column]], index=df.index, dtype=object)
+		for column in df.columns
+	})
+	df.columns = [str(column).strip() for column in df.columns]
+	if columns is None:
+		df = df.dropna(axis=1, how="all")
+	else:
+		df = df[[column for column in columns if column in df.columns]]
+	df = df.dropna(axis=0, how="all")
+	return df.reset_index(drop=True)
+
+
+def cell_text(value) -> str:
+	return "" if value is None else str(value)
+
+
+def to_csv_text(df: pd.DataFrame, header: bool = True) -> str:
+	buffer = io.StringIO()
+	writer = csv.writer(buffer, lineterminator="\n")
+	if header:
+		writer.writerow(df.columns)
+	for row in df.itertuples(index=False):
+		writer.writerow([cell_text(value) for value in row])
+	return buffer.getvalue()
+
+
+def markdown_cell(value) -> str:
+	return cell_text(value).replace("|", "\\|").replace("\n", " ")
+
+
+def to_markdown_table(df: pd.DataFrame, header: bool = True) -> str:
+	lines = []
+	if header:
+		lines.append("| " + " | ".join(markdown_cell(c) for c in df.columns) + " |")
+		lines.append("|" + "---|" * len(df.columns))
+	for row in df.itertuples(index=False):
+		lines.append("| " + " | ".join(markdown_cell(value) for value in row) + " |")
+	return "".join(line + "\n" for line in lines)
+
+
+def to_columnar_json(df: pd.DataFrame) -> str:
+	columns = {column: df[column].tolist() for column in df.columns}
+	return json.dumps({"row_count": len(df), "columns": columns}, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def to_records_json(df: pd.DataFrame) -> str:
 	result = {
 		"columns": list(df.columns),
 		"row_count": len(df),
-		"data": records
+		"data": df.to_dict(orient='records')
 	}
-	
-	return json.dumps(result, indent=2, default=str)
+	return json.dumps(result, indent=2, ensure_ascii=False, default=str)
+
+
+SERIALIZERS = {
+	"csv": to_csv_text,
+	"markdown": to_markdown_table,
+	"columns": to_columnar_json,
+	"records": to_records_json,
+}
+
+
+def serialize_dataframe(df: pd.DataFrame, fmt: str = SPREADSHEET_FORMAT, formats: Optional[list] = None) -> tuple[str, str, dict]:
+	"""
+	Serialize a cleaned DataFrame for the text extractor.
+
+	Returns:
+		(format name, text, token count per format tried)
+	"""
+	if fmt != "auto":
+		formats = [fmt]
+	formats = formats or list(SERIALIZERS)
+	candidates = {name: SERIALIZERS[name](df) for name in formats}
+	token_counts = {name: count_tokens(text) for name, text in candidates.items()}
+	best = min(formats, key=lambda name: (token_counts[name], formats.index(name)))
+	return best, candidates[best], token_counts
+
+
+def convert_spreadsheet_to_json_string(file_path: str) -> str:
+	"""Convert CSV or Excel file to a JSON string representation."""
+	return to_records_json(clean_dataframe(read_spreadsheet(file_path)))
+
+
+def truncate_to_bytes(text: str, max_bytes: int) -> str:
+	"""Cut text at the last full line within `max_bytes` UTF-8 bytes."""
+	kept = text.encode("utf-8")[:max(max_bytes, 0)].decode("utf-8", "ignore")
+	return kept[:kept.rfind("\n") + 1]
+
+
+def stream_spreadsheet_text(file_path: str, fmt: str = SPREADSHEET_FORMAT, sheet=None,
+							chunk_rows: int = SPREADSHEET_CHUNK_ROWS,
+							max_rows: int = SPREADSHEET_MAX_ROWS,
+							max_bytes: int = SPREADSHEET_MAX_BYTES):
+	"""
+	Serialize a spreadsheet block by block with flat memory use.
+
+	A first streaming pass finds the non-empty columns, the row count and a
+	sample block used to pick the format. The second pass yields the text
+	incrementally, stopping once `max_bytes` have been produced.
+
+	Returns:
+		(format name, iterator of text pieces)
+	"""
+	all_columns, non_empty, row_count, sample = [], set(), 0, None
+	for chunk in iter_spreadsheet_chunks(file_path, sheet, chunk_rows, max_rows):
+		cleaned = clean_dataframe(chunk)
+		all_columns += [str(c).strip() for c in chunk.columns if str(c).strip() not in all_columns]
+		non_empty.update(cleaned.columns)
+		row_count += len(cleaned)
+		if sample is None and not cleaned.empty:
+			sample = chunk
+	keep_columns = [column for column in all_columns if column in non_empty]
+
+	if sample is None:
+		return (fmt if fmt != "auto" else "csv"), iter(())
+
+	sample = clean_dataframe(sample, keep_columns)
+
+	# Whole-table formats are only an option when everything fits in one block
+	single_block = row_count == len(sample)
+	if fmt != "auto" and fmt not in STREAMING_FORMATS and not single_block:
+		fmt = "csv"
+	formats = list(SERIALIZERS) if single_block else list(STREAMING_FORMATS)
+	best, text, token_counts = serialize_dataframe(sample, fmt, formats)
+	report = ", ".join(f"{name}={count}" for name, count in token_counts.items())
+	print(f"[spreadsheet] {row_count} rows x {len(keep_columns)} columns, sample tokens: {report} -> {best}")
+
+	if single_block:
+		if len(text.encode("utf-8")) > max_bytes:
+			return best, iter([truncate_to_bytes(text, max_bytes), f"\n[Truncated after {max_bytes} bytes]\n"])
+		return best, iter([text])
+
+	def pieces():
+		produced = 0
+		header = True
+		for chunk in iter_spreadsheet_chunks(file_path, sheet, chunk_rows, max_rows):
+			cleaned = clean_dataframe(chunk, keep_columns)
+			if cleaned.empty:
+				continue
+			if best == "csv":
+				piece = to_csv_text(cleaned, header=header)
+			else:
+				piece = to_markdown_table(cleaned, header=header)
+			header = False
+
+			if produced + len(piece.encode("utf-8")) > max_bytes:
+				yield truncate_to_bytes(piece, max_bytes - produced)
+				yield f"\n[Truncated after {max_bytes} bytes]\n"
+				return
+			produced += len(piece.encode("utf-8"))
+			yield piece
+
+	return best, pieces()
+
+
+def convert_spreadsheet_to_text(file_path: str, fmt: str = SPREADSHEET_FORMAT, sheet=None) -> tuple[str, str]:
+	"""Convert CSV or Excel file to its most compact text form. Returns (format, text)."""
+	best, pieces = stream_spreadsheet_text(file_path, fmt, sheet)
+	return best, "".join(pieces)
 
 
 class SpreadsheetExtractorGenerator:
-	def __init__(self):
-		self.text_extractor = TextExtractorGenerator()
+	def __init__(self, text_extractor: Optional[TextExtractorGenerator] = None):
+		self.text_extractor = text_extractor or TextExtractorGenerator()
+		self.map_reduce = MapReduceExtractor(self.text_extractor)
+
+	def __call__(self, file_path: str, json_schema: Optional[Dict[str, Any]] = None, sheet=None, on_part=None):
+		fmt, table_text = convert_spreadsheet_to_text(file_path, sheet=sheet)
+
+		# Large tables are split into row blocks that each keep the header
+		if fmt in HEADER_LINES:
+			chunks = split_table(table_text, HEADER_LINES[fmt])
+		else:
+			chunks = split_text(table_text)
 
-	def __call__(self, file_path: str, json_schema: Optional[Dict[str, Any]] = None):
-		# Convert spreadsheet to JSON string
-		json_string = convert_spreadsheet_to_json_string(file_path)
-		
 		# Prepend context to help the model understand the data
-		text_with_context = f"""The following is data from a spreadsheet file converted to JSON format:
+		def describe(index, total, chunk):
+			part = f" (rows block {index + 1} of {total})" if total > 1 else ""
+			return f"""The following is data from a spreadsheet file converted to {FORMAT_LABELS[fmt]}{part}:
 
-{json_string}
+{chunk}
 
 Please extract the relevant information according to the schema."""
-		
-		# Use existing text extractor
-		result = self.text_extractor(
-			text=text_with_context,
-			json_schema=json_schema
+
+		# Use existing text extractor, one call per block
+		result = self.map_reduce(
+			chunks=chunks,
+			json_schema=json_schema,
+			describe=describe,
+			on_part=on_part
 		)
 		return result
@@ -0,0 +1,93 @@
+import queue
+import threading
+
+import dspy
+from dspy.streaming import StreamListener, StreamResponse
+
+from services.result_merging import merge_json_results, parse_json_result, result_confidence, schema_properties
+from utils.partial_json import PartialJSONParser
+
+# ChainOfThought output fields forwarded while the model writes them
+STREAMED_FIELDS = ("reasoning", "json_result")
+
+
+def stream_program(program, **kwargs):
+	"""
+	Call a single-predictor extractor with token streaming.
+
+	Yields ("reasoning", text) and ("json_result", text) chunks as they are
+	generated, then ("prediction", prediction). Responses served from the LM
+	cache arrive as the prediction alone.
+	"""
+	listeners = [StreamListener(signature_field_name=name) for name in STREAMED_FIELDS]
+	streaming = dspy.streamify(program, stream_listeners=listeners, async_streaming=False)
+	for item in streaming(**kwargs):
+		if isinstance(item, StreamResponse):
+			if item.chunk:
+				yield item.signature_field_name, item.chunk
+		elif isinstance(item, dspy.Prediction):
+			yield "prediction", item
+
+
+def stream_parts(run):
+	"""
+	Call a multi-part extractor (map-reduce chunks, PDF pages) in a thread.
+
+	`run(on_part)` must call on_part(index, total, prediction) as parts finish.
+	Yields ("part", (index, total, prediction)) for each of them, then
+	("prediction", prediction) once the merged result is ready.
+	"""
+	events = queue.Queue()
+	outcome = {}
+
+	def target():
+		try:
+			outcome["prediction"] = run(lambda *part: events.put(("part", part)))
+		except Exception as e:
+			outcome["error"] = e
+		finally:
+			events.put(None)
+
+	threading.Thread(target=target, daemon=True).start()
+	while (event := events.get()) is not None:
+		yield event
+	if "error" in outcome:
+		raise outcome["error"]
+	yield "prediction", outcome["prediction"]
+
+
+def extraction_events(source, json_schema=None):
+	"""
+	Turn stream_program / stream_parts output into client events:
+
+		{"reasoning": text}          reasoning as it is generated
+		{"field": key, "value": v}   a form field, as soon as its value parses
+		{"part": n, "total": total}  a chunk or page finished
+		{"result": prediction}       the final prediction, always last
+	"""
+	parser = PartialJSONParser()
+	properties = schema_properties(json_schema)
+	partials, confidences, sent = [], [], {}
+
+	for kind, value in source:
+		if kind == "reasoning":
+			yield {"reasoning": value}
+		elif kind == "json_result":
+			for key, field_value in parser.feed(value):
+				sent[key] = field_value
+				yield {"field": key, "value": field_value}
+		elif kind == "part":
+			index, total, prediction = value
+			partial = parse_json_result(prediction.json_result)
+			partials.append(partial)
+			confidences.append(result_confidence(partial, properties))
+			yield {"part": len(partials), "total": total}
+			yield {"reasoning": f"Part {index + 1}/{total}: {prediction.reasoning}\n\n"}
+			# Send whatever the merge of the parts so far changed
+			merged = merge_json_results(partials, json_schema, confidences)
+			for key, field_value in merged.items():
+				if sent.get(key) != field_value:
+					sent[key] = field_value
+					yield {"field": key, "value": field_value}
+		elif kind == "prediction":
+			yield {"result": value}
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+import websocket
+
+from utils.clients import DEEPGRAM_API_KEY, DEEPGRAM_BASE_URL
+
+# "deepgram" relays to the Deepgram live API, "fake" answers locally (tests, offline dev)
+STT_STREAM_BACKEND = os.getenv("STT_STREAM_BACKEND", "deepgram")
+STT_STREAM_MODEL = os.getenv("STT_STREAM_MODEL", "nova-3")
+# Silence (ms) after which Deepgram finalizes the current utterance
+STT_STREAM_ENDPOINTING_MS = int(os.getenv("STT_STREAM_ENDPOINTING_MS", "300"))
+# How long finish() waits for the last results after the audio ends
+STT_STREAM_FINISH_TIMEOUT = float(os.getenv("STT_STREAM_FINISH_TIMEOUT", "10"))
+STT_FAKE_TRANSCRIPT = os.getenv("STT_FAKE_TRANSCRIPT", "this is a test transcript")
+
+TranscriptCallback = Callable[[str, bool], None]
+
+
+class StreamingSession(ABC):
+	"""
+	One live transcription: audio goes in with send(), and the running
+	transcript (final segments plus the current interim one) is reported to
+	`on_transcript(transcript, is_final)` as results arrive.
+	"""
+
+	def __init__(self, on_transcript: Optional[TranscriptCallback] = None):
+		self.on_transcript = on_transcript
+		self.finals = []
+		self._lock = threading.Lock()
+
+	@property
+	def transcript(self) -> str:
+		with self._lock:
+			return " ".join(self.finals)
+
+	def handle_result(self, text: str, is_final: bool) -> None:
+		text = text.strip()
+		with self._lock:
+			if is_final and text:
+				self.finals.append(text)
+			current = " ".join(self.finals if is_final else self.finals + [text]).strip()
+		if self.on_transcript and (text or is_final):
+			self.on_transcript(current, is_final)
+
+	@abstractmethod
+	def send(self, chunk: bytes) -> None:
+		...
+
+	@abstractmethod
+	def finish(self) -> str:
+		"""Signal the end of the audio, wait for the last results and return the transcript."""
+
+	def close(self) -> None:
+		pass
+
+
+class DeepgramStreamingSession(StreamingSession):
+	"""Relays audio to Deepgram's live /listen WebSocket; results are read on a background thread."""
+
+	def __init__(self, on_transcript: Optional[TranscriptCallback] = None,
+				 content_type: Optional[str] = None, language: Optional[str] = None):
+		super().__init__(on_transcript)
+		# Containerized audio (webm, ogg, mp4) is detected by Deepgram, so
+		# content_type needs no encoding parameters
+		url = DEEPGRAM_BASE_URL.replace("https://", "wss://", 1) + (
+			f"/listen?model={STT_STREAM_MODEL}&smart_format=true&interim_results=true"
+			f"&endpointing={STT_STREAM_ENDPOINTING_MS}"
+		)
+		if language:
+			url += f"&language={language}"
+		self.ws = websocket.create_connection(url, header=[f"Authorization: Token {DEEPGRAM_API_KEY}"])
+		self._finished = threading.Event()
+		self._reader = threading.Thread(target=self._read, daemon=True)
+		self._reader.start()
+
+	def handle_message(self, raw: str) -> None:
+		message = json.loads(raw)
+		if message.get("type") != "Results":
+			return
+		alternatives = message.get("channel", {}).get("alternatives") or [{}]
+		self.handle_result(alternatives[0].get("transcript", ""), bool(message.get("is_final")))
+
+	def _read(self) -> None:
+		try:
+			while True:
+				raw = self.ws.recv()
+				if not raw:
+					break
+				self.handle_message(raw)
+		except (websocket.WebSocketException, OSError):
+			pass
+		finally:
+			self._finished.set()
+
+	def send(self, chunk: bytes) -> None:
+		self.ws.send_binary(chunk)
+
+	def finish(self) -> str:
+		# Deepgram flushes its final results and closes the socket
+		self.ws.send(json.dumps({"type": "CloseStream"}))
+		if not self._finished.wait(STT_STREAM_FINISH_TIMEOUT):
+			print("[stt-stream] Timed out waiting for final results")
+		return self.transcript
+
+	def close(self) -> None:
+		self.ws.close()
+
+
+class FakeStreamingSession(StreamingSession):
+	"""Reveals a fixed transcript one word per chunk, then finalizes it on finish()."""
+
+	def __init__(self, on_transcript: Optional[TranscriptCallback] = None,
+				 content_type: Optional[str] = None, language: Optional[str] = None,
+				 transcript: str = STT_FAKE_TRANSCRIPT):
+		super().__init__(on_transcript)
+		self.words = transcript.split()
+		self.chunks = 0
+		self.bytes_received = 0
+
+	def send(self, chunk: bytes) -> None:
+		self.chunks += 1
+		self.bytes_received += len(chunk)
+		self.handle_result(" ".join(self.words[:self.chunks]), is_final=False)
+
+	def finish(self) -> str:
+		self.handle_result(" ".join(self.words), is_final=True)
+		return self.transcript
+
+
+STT_BACKENDS = {
+	"deepgram": DeepgramStreamingSession,
+	"fake": FakeStreamingSession,
+}
+
+
+def open_stt_stream(on_transcript: Optional[TranscriptCallback] = None, content_type: Optional[str] = None,
+					language: Optional[str] = None, backend: Optional[str] = None) -> StreamingSession:
+	backend = backend or STT_STREAM_BACKEND
+	if backend not in STT_BACKENDS:
+		raise ValueError(f"Unknown streaming STT backend: {backend}")
+	return STT_BACKENDS[backend](on_transcript, content_type=content_type, language=language)
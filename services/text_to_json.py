@@ -12,17 +12,22 @@ class TextExtractor(dspy.Signature):
 		desc="JSON parsable content with data extracted from the text that doesn't start with ```json or ```",
 	)
 
+DEFAULT_TEXT_MODEL = "openrouter/openai/gpt-oss-120b:nitro"
+
 class TextExtractorGenerator(dspy.Module):
-	def __init__(self, model_name: str = "openrouter/openai/gpt-oss-120b:nitro"):
+	def __init__(self, model_name: str = DEFAULT_TEXT_MODEL):
+		self.model_name = model_name
 		self.lm = dspy.LM(
 			model_name,
 			api_key=OPENROUTER_API_KEY,
 		)
+		# Built once and reused: predictors hold no per-call state
+		self.adapter = dspy.ChatAdapter()
+		self.extract = dspy.ChainOfThought(TextExtractor)
 
 	def forward(self, text: str, json_schema: Optional[Dict[str, Any]] = None) -> str:
-		with dspy.context(lm=self.lm, adapter=dspy.ChatAdapter()):
-			extract = dspy.ChainOfThought(TextExtractor)
-			result = extract(
+		with dspy.context(lm=self.lm, adapter=self.adapter):
+			result = self.extract(
 				text=text,
 				json_schema=json_schema
 			)
@@ -0,0 +1,44 @@
+import os
+import re
+from utils.clients import DEEPGRAM_API_KEY, DEEPGRAM_BASE_URL, HTTP_CONNECT_TIMEOUT, get_http_session
+
+# Deepgram Aura models are named <model>-<voice>, e.g. aura-2-thalia-en
+TTS_MODEL = os.getenv("TTS_MODEL", "aura-2")
+TTS_VOICE = os.getenv("TTS_VOICE", "thalia-en")
+# Comma-separated voices clients may ask for; the default voice is always allowed
+TTS_VOICES = {TTS_VOICE} | {v.strip() for v in os.getenv("TTS_VOICES", "").split(",") if v.strip()}
+TTS_TIMEOUT_SECONDS = float(os.getenv("TTS_TIMEOUT_SECONDS", "30"))
+TTS_CHUNK_SIZE = 4096
+
+TTS_MIME_TYPE = "audio/mpeg"
+
+
+def normalize_tts_text(text: str) -> str:
+	"""Drop markdown emphasis and collapse whitespace; the spoken result is the same."""
+	text = text.replace("*", "").replace("_", "").replace("`", "")
+	return re.sub(r"\s+", " ", text).strip()
+
+
+def synthesize_stream(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL):
+	"""
+	Start a Deepgram synthesis and return an iterator over the MP3 bytes.
+
+	Raises:
+		ValueError: if `voice` is not one of TTS_VOICES
+		requests.HTTPError: if Deepgram rejects the request (before any audio is sent)
+	"""
+	if voice not in TTS_VOICES:
+		raise ValueError(f"Unknown voice: {voice}")
+	response = get_http_session().post(
+		f"{DEEPGRAM_BASE_URL}/speak",
+		params={"model": f"{model}-{voice}"},
+		headers={
+			"Authorization": f"Token {DEEPGRAM_API_KEY}",
+			"Content-Type": "application/json",
+		},
+		json={"text": text},
+		stream=True,
+		timeout=(HTTP_CONNECT_TIMEOUT, TTS_TIMEOUT_SECONDS),
+	)
+	response.raise_for_status()
+	return response.iter_content(chunk_size=TTS_CHUNK_SIZE)
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils.paths import PROJECT_ROOT
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") == "1"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def make_tts_key(text: str, voice: str, model: str) -> str:
+	"""Content-addressed key; `text` should already be normalized."""
+	return hashlib.sha256("\x1f".join([text, voice, model]).encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+	"""
+	On-disk cache of synthesized MP3s, one file per key.
+
+	An in-memory index (key -> size, in LRU order) is rebuilt from the
+	directory at startup, using file mtimes as last access times. The least
+	recently used files are deleted once the total exceeds `max_bytes`.
+	"""
+
+	def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self._index = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+		os.makedirs(directory, exist_ok=True)
+		entries = []
+		for root, _, files in os.walk(directory):
+			for name in files:
+				path = os.path.join(root, name)
+				if name.endswith(".part"):
+					# Left behind by an interrupted write
+					os.unlink(path)
+				elif name.endswith(".mp3"):
+					stat = os.stat(path)
+					entries.append((stat.st_mtime, name[:-4], stat.st_size))
+		for _, key, size in sorted(entries):
+			self._index[key] = size
+			self._bytes += size
+
+	def path(self, key: str) -> str:
+		return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+	def contains(self, key: str) -> bool:
+		"""Membership check that doesn't count as a lookup or refresh the entry."""
+		with self._lock:
+			return key in self._index
+
+	def get(self, key: str):
+		"""Path of the cached MP3, or None on a miss."""
+		with self._lock:
+			if key not in self._index:
+				self._counters["misses"] += 1
+				return None
+			self._index.move_to_end(key)
+			self._counters["hits"] += 1
+		path = self.path(key)
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			with self._lock:
+				self._bytes -= self._index.pop(key, 0)
+			return None
+		return path
+
+	def store_stream(self, key: str, chunks):
+		"""
+		Pass audio chunks through while writing them to the cache.
+
+		The entry only appears once the stream has been fully consumed, so a
+		client that disconnects mid-way never leaves a truncated file.
+		"""
+		os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path(key)), suffix=".part")
+		complete = False
+		try:
+			with os.fdopen(fd, "wb") as f:
+				for chunk in chunks:
+					f.write(chunk)
+					yield chunk
+			complete = True
+		finally:
+			if complete:
+				self._commit(key, tmp_path)
+			elif os.path.exists(tmp_path):
+				os.unlink(tmp_path)
+
+	def _commit(self, key: str, tmp_path: str) -> None:
+		size = os.path.getsize(tmp_path)
+		if size == 0:
+			os.unlink(tmp_path)
+			return
+		os.replace(tmp_path, self.path(key))
+		with self._lock:
+			self._bytes += size - self._index.get(key, 0)
+			self._index[key] = size
+			self._index.move_to_end(key)
+			self._counters["writes"] += 1
+			self._evict()
+
+	def _evict(self) -> None:
+		while self._bytes > self.max_bytes and len(self._index) > 1:
+			key, size = self._index.popitem(last=False)
+			self._bytes -= size
+			self._counters["evictions"] += 1
+			try:
+				os.unlink(self.path(key))
+			except FileNotFoundError:
+				pass
+
+	def stats(self) -> dict:
+		with self._lock:
+			counters = dict(self._counters)
+			entries, size = len(self._index), self._bytes
+		lookups = counters["hits"] + counters["misses"]
+		return {
+			**counters,
+			"hit_rate": counters["hits"] / lookups if lookups else 0.0,
+			"entries": entries,
+			"bytes": size,
+			"max_bytes": self.max_bytes,
+		}
+
+	def clear(self) -> None:
+		with self._lock:
+			for key in list(self._index):
+				try:
+					os.unlink(self.path(key))
+				except FileNotFoundError:
+					pass
+			self._index.clear()
+			self._bytes = 0
+
+
+tts_cache = TTSCache() if TTS_CACHE_ENABLED else None
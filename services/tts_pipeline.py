@@ -0,0 +1,132 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from services.text_to_speech import TTS_MODEL, TTS_TIMEOUT_SECONDS, TTS_VOICE, normalize_tts_text, synthesize_stream
+from services.tts_cache import make_tts_key, tts_cache
+
+# Sentences synthesized at the same time while a reply is streaming
+TTS_PIPELINE_WORKERS = int(os.getenv("TTS_PIPELINE_WORKERS", "3"))
+# Shorter fragments ("1.", "Dr.") are joined to the following sentence
+TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", "20"))
+
+SENTENCE_END = re.compile(r"[.!?…][\"')\]*_]*\s+|\n+")
+# Everything from the status block on is never spoken
+STATUS_MARKER = "<!--"
+
+_executor = ThreadPoolExecutor(max_workers=TTS_PIPELINE_WORKERS, thread_name_prefix="tts-pipeline")
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+class SentenceSplitter:
+	"""Cuts streamed text into sentences as soon as each one is complete."""
+
+	def __init__(self, min_chars: int = TTS_MIN_SENTENCE_CHARS):
+		self.min_chars = min_chars
+		self.buffer = ""
+		self.sentence = ""
+		self.closed = False
+
+	def feed(self, text: str) -> list[str]:
+		if self.closed:
+			return []
+		self.buffer += text
+		marker = self.buffer.find(STATUS_MARKER)
+		if marker != -1:
+			self.buffer = self.buffer[:marker]
+			self.closed = True
+
+		sentences = []
+		while True:
+			match = SENTENCE_END.search(self.buffer)
+			if not match:
+				break
+			self.sentence += self.buffer[:match.end()]
+			self.buffer = self.buffer[match.end():]
+			if len(self.sentence.strip()) >= self.min_chars:
+				sentences.append(self.sentence.strip())
+				self.sentence = ""
+		return sentences
+
+	def flush(self) -> list[str]:
+		rest = (self.sentence + self.buffer).strip()
+		self.sentence = self.buffer = ""
+		self.closed = True
+		return [rest] if rest else []
+
+
+def _synthesize_to_cache(text: str, key: str, voice: str, model: str) -> None:
+	try:
+		for _ in tts_cache.store_stream(key, synthesize_stream(text, voice=voice, model=model)):
+			pass
+	except Exception as e:
+		print(f"[tts-pipeline] Synthesis failed for {key[:12]}: {type(e).__name__}: {e}")
+
+
+def prefetch(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL):
+	"""
+	Synthesize normalized `text` into the TTS cache in the background.
+
+	No-op when the cache is disabled, the audio is already cached or it is
+	being synthesized.
+	"""
+	if tts_cache is None:
+		return None
+	key = make_tts_key(text, voice, model)
+	with _pending_lock:
+		if key in _pending or tts_cache.contains(key):
+			return _pending.get(key)
+		future = _executor.submit(_synthesize_to_cache, text, key, voice, model)
+		_pending[key] = future
+
+	def forget(_):
+		with _pending_lock:
+			_pending.pop(key, None)
+
+	future.add_done_callback(forget)
+	return future
+
+
+def wait_for_prefetch(key: str, timeout: float = TTS_TIMEOUT_SECONDS) -> None:
+	"""Block until an in-flight prefetch of `key` has landed in the cache."""
+	with _pending_lock:
+		future = _pending.get(key)
+	if future is not None:
+		future.result(timeout=timeout)
+
+
+class SpeechPipeline:
+	"""
+	Turns a streamed chat reply into sentence-sized audio segments.
+
+	Each sentence starts synthesizing as soon as it is complete, and the
+	segment points at the /tts URL that serves it, so the client can play
+	segments in order while later ones are still being produced.
+	"""
+
+	def __init__(self, voice: str = TTS_VOICE, model: str = TTS_MODEL):
+		self.voice = voice
+		self.model = model
+		self.splitter = SentenceSplitter()
+		self.index = 0
+
+	def _segment(self, sentence: str):
+		text = normalize_tts_text(sentence)
+		if not text:
+			return None
+		prefetch(text, self.voice, self.model)
+		segment = {"index": self.index, "url": "/tts?" + urlencode({"text": text, "voice": self.voice})}
+		self.index += 1
+		return segment
+
+	def _segments(self, sentences: list[str]) -> list[dict]:
+		return [segment for segment in map(self._segment, sentences) if segment]
+
+	def feed(self, token: str) -> list[dict]:
+		return self._segments(self.splitter.feed(token))
+
+	def flush(self) -> list[dict]:
+		return self._segments(self.splitter.flush())
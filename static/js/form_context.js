@@ -33,6 +33,8 @@ document.addEventListener("DOMContentLoaded", function () {
     var mediaRecorder = null;
     var audioChunks = [];
     var recordedBlob = null;
+    var voiceLive = null;
+    var voiceTranscript = null;
     var timerInterval = null;
     var recordStartTime = null;
 
@@ -64,6 +66,9 @@ document.addEventListener("DOMContentLoaded", function () {
     var chatMicRecorder = null;
     var chatMicChunks = [];
     var chatMicRecording = false;
+    var chatMicLive = null;
+    // MediaRecorder timeslice streamed to /stt-stream while recording
+    var STT_TIMESLICE_MS = 250;
 
     var activeMode = "chat";
 
@@ -171,8 +176,24 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     }
 
-    function readSSE(url, options, onToken, onDone) {
+    function readSSE(url, options, onToken, onDone, onEvent) {
+        var finished = false;
+
+        function finish(data) {
+            if (finished) return;
+            finished = true;
+            onDone(data);
+        }
+
         fetch(url, options).then(function (res) {
+            var contentType = res.headers.get("content-type") || "";
+            if (!res.ok || contentType.indexOf("text/event-stream") === -1) {
+                // Rejected requests answer with a JSON error (or an HTML error page)
+                return res.json().catch(function () { return {}; }).then(function (body) {
+                    finish({ error: body.error || ("Request failed (" + res.status + ")") });
+                });
+            }
+
             var reader = res.body.getReader();
             var decoder = new TextDecoder();
             var buffer = "";
@@ -182,30 +203,32 @@ document.addEventListener("DOMContentLoaded", function () {
                     if (line.startsWith("data: ")) {
                         var data = JSON.parse(line.slice(6));
                         if (data.token) onToken(data.token);
-                        if (data.done) onDone(data);
+                        if (data.done) finish(data);
+                        else if (onEvent) onEvent(data);
                     }
                 });
             }
 
             function read() {
-                reader.read().then(function (result) {
+                return reader.read().then(function (result) {
                     if (result.done) {
                         // Process any remaining data in buffer when stream ends
                         if (buffer.trim()) {
                             processLines(buffer.split("\n"));
                         }
+                        finish({ error: "The response ended early" });
                         return;
                     }
                     buffer += decoder.decode(result.value, { stream: true });
                     var lines = buffer.split("\n");
                     buffer = lines.pop();
                     processLines(lines);
-                    read();
+                    return read();
                 });
             }
-            read();
+            return read();
         }).catch(function () {
-            onDone({ error: true });
+            finish({ error: true });
         });
     }
 
@@ -227,11 +250,6 @@ document.addEventListener("DOMContentLoaded", function () {
         chatProgress.hidden = false;
     }
 
-    function trimStatusFromBubble(bubble) {
-        if (!bubble) return;
-        bubble.textContent = bubble.textContent.replace(/\s*<!--STATUS::[\s\S]*?-->\s*$/, "").trimEnd();
-    }
-
     function showRolePicker() {
         chatRolePicker.hidden = false;
         chatContainer.hidden = true;
@@ -251,10 +269,11 @@ document.addEventListener("DOMContentLoaded", function () {
         chatInput.disabled = true;
 
         var bubble = null;
+        var spoken = false;
         readSSE("/chat-start", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ role: role })
+            body: JSON.stringify({ role: role, speak: ttsEnabled })
         },
             function (token) {
                 if (!bubble) {
@@ -272,13 +291,18 @@ document.addEventListener("DOMContentLoaded", function () {
                     return;
                 }
                 chatSessionId = data.session_id;
-                if (data.field_status) updateFieldProgress(data.field_status);
-                trimStatusFromBubble(bubble);
                 finalizeBubbleText(bubble);
-                speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
+                if (!spoken) speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
                 chatInput.disabled = false;
                 chatInput.focus();
                 updateInputButtons();
+            },
+            function (data) {
+                if (data.field_status) updateFieldProgress(data.field_status);
+                if (data.speech && bubble) {
+                    spoken = true;
+                    queueSpeech(data.speech, bubble);
+                }
             }
         );
     }
@@ -301,10 +325,11 @@ document.addEventListener("DOMContentLoaded", function () {
         setChatLoading(true);
 
         var bubble = null;
+        var spoken = false;
         readSSE("/chat-message", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ session_id: chatSessionId, message: text })
+            body: JSON.stringify({ session_id: chatSessionId, message: text, speak: ttsEnabled })
         },
             function (token) {
                 if (!bubble) {
@@ -319,13 +344,18 @@ document.addEventListener("DOMContentLoaded", function () {
                 if (data.error) {
                     appendChatBubble("Something went wrong. Please try again.", "assistant");
                 }
-                if (data.field_status) updateFieldProgress(data.field_status);
-                trimStatusFromBubble(bubble);
                 finalizeBubbleText(bubble);
-                speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
+                if (!spoken) speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
                 chatInput.disabled = false;
                 chatInput.focus();
                 updateInputButtons();
+            },
+            function (data) {
+                if (data.field_status) updateFieldProgress(data.field_status);
+                if (data.speech && bubble) {
+                    spoken = true;
+                    queueSpeech(data.speech, bubble);
+                }
             }
         );
     }
@@ -354,6 +384,9 @@ document.addEventListener("DOMContentLoaded", function () {
     // --- TTS ---
 
     function stopTTS() {
+        speechQueue = [];
+        if (speechBubble) speechBubble.classList.remove("chat-speaking");
+        speechBubble = null;
         if (ttsAudio) {
             ttsAudio.pause();
             ttsAudio.currentTime = 0;
@@ -361,15 +394,60 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     }
 
-    function speakText(text, bubble) {
-        if (!ttsEnabled || !text) return;
-        stopTTS();
+    // Sentence audio announced by the chat stream, played back to back.
+    // Each clip starts loading as soon as it is queued, so later sentences
+    // download while earlier ones play.
+    var speechQueue = [];
+    var speechBubble = null;
+
+    function queueSpeech(segment, bubble) {
+        if (!ttsEnabled) return;
+        if (bubble !== speechBubble) {
+            stopTTS();
+            speechBubble = bubble;
+        }
+        var audio = new Audio(segment.url);
+        audio.preload = "auto";
+        speechQueue.push(audio);
+        if (!ttsAudio) playNextSpeech();
+    }
+
+    function playNextSpeech() {
+        ttsAudio = speechQueue.shift() || null;
+        if (!ttsAudio) {
+            if (speechBubble) speechBubble.classList.remove("chat-speaking");
+            return;
+        }
+        if (speechBubble) speechBubble.classList.add("chat-speaking");
+        var audio = ttsAudio;
+        function next() {
+            if (ttsAudio === audio) playNextSpeech();
+        }
+        audio.addEventListener("ended", next);
+        audio.addEventListener("error", next);
+        var playing = audio.play();
+        if (playing) playing.catch(next);
+    }
 
-        fetch("/tts", {
+    // Audio is cached by text, so short replies go through GET where the
+    // browser cache can answer repeats without a round trip
+    var TTS_MAX_GET_LENGTH = 1500;
+
+    function fetchTTS(text) {
+        var query = "/tts?text=" + encodeURIComponent(text);
+        if (query.length <= TTS_MAX_GET_LENGTH) return fetch(query);
+        return fetch("/tts", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ text: text })
-        })
+        });
+    }
+
+    function speakText(text, bubble) {
+        if (!ttsEnabled || !text) return;
+        stopTTS();
+
+        fetchTTS(text)
             .then(function (res) { return res.blob(); })
             .then(function (blob) {
                 var url = URL.createObjectURL(blob);
@@ -402,6 +480,72 @@ document.addEventListener("DOMContentLoaded", function () {
         if (bubble) speakText(bubble.getAttribute("data-text"), bubble);
     });
 
+    // --- Live STT (WebSocket) ---
+
+    function openLiveTranscription(mimeType, onTranscript) {
+        // Chunks sent before the socket opens are queued; if the socket
+        // fails, live.failed tells the caller to fall back to /stt
+        var live = { ws: null, queue: [], transcript: "", failed: false, done: false, onDone: null };
+        var proto = location.protocol === "https:" ? "wss://" : "ws://";
+        try {
+            live.ws = new WebSocket(proto + location.host + "/stt-stream");
+        } catch (e) {
+            live.failed = true;
+            live.done = true;
+            return live;
+        }
+        live.ws.addEventListener("open", function () {
+            live.ws.send(JSON.stringify({ type: "start", content_type: mimeType || "audio/webm" }));
+            live.queue.forEach(function (item) { live.ws.send(item); });
+            live.queue = [];
+        });
+        live.ws.addEventListener("message", function (e) {
+            var data = JSON.parse(e.data);
+            if (data.type === "transcript") {
+                live.transcript = data.transcript;
+                onTranscript(data.transcript);
+            } else if (data.type === "done") {
+                live.transcript = data.transcript;
+                finishLiveTranscription(live);
+            } else if (data.type === "error") {
+                live.failed = true;
+                finishLiveTranscription(live);
+            }
+        });
+        live.ws.addEventListener("close", function () {
+            if (!live.done) live.failed = true;
+            finishLiveTranscription(live);
+        });
+        return live;
+    }
+
+    function sendLiveChunk(live, data) {
+        if (!live || live.done) return;
+        if (live.ws.readyState === WebSocket.OPEN) {
+            live.ws.send(data);
+        } else {
+            live.queue.push(data);
+        }
+    }
+
+    function stopLiveTranscription(live, onDone) {
+        live.onDone = onDone;
+        if (live.done) {
+            onDone(live);
+            return;
+        }
+        sendLiveChunk(live, JSON.stringify({ type: "stop" }));
+    }
+
+    function finishLiveTranscription(live) {
+        if (live.done && !live.onDone) return;
+        live.done = true;
+        var onDone = live.onDone;
+        live.onDone = null;
+        if (onDone) onDone(live);
+        if (live.ws && live.ws.readyState === WebSocket.OPEN) live.ws.close();
+    }
+
     // --- STT (chat mic) ---
 
     function startChatMic() {
@@ -416,8 +560,14 @@ document.addEventListener("DOMContentLoaded", function () {
         navigator.mediaDevices.getUserMedia({ audio: true })
             .then(function (stream) {
                 chatMicRecorder = new MediaRecorder(stream);
+                chatMicLive = openLiveTranscription(chatMicRecorder.mimeType, function (transcript) {
+                    chatInput.value = transcript;
+                });
                 chatMicRecorder.addEventListener("dataavailable", function (e) {
-                    if (e.data.size > 0) chatMicChunks.push(e.data);
+                    if (e.data.size > 0) {
+                        chatMicChunks.push(e.data);
+                        sendLiveChunk(chatMicLive, e.data);
+                    }
                 });
                 chatMicRecorder.addEventListener("stop", function () {
                     stream.getTracks().forEach(function (t) { t.stop(); });
@@ -425,9 +575,15 @@ document.addEventListener("DOMContentLoaded", function () {
                     chatMicRecording = false;
                     chatMicBtn.classList.remove("recording");
                     chatInput.placeholder = "Transcribing...";
-                    transcribeChatAudio(blob);
+                    stopLiveTranscription(chatMicLive, function (live) {
+                        if (!live.failed && live.transcript) {
+                            useChatTranscript(live.transcript);
+                        } else {
+                            transcribeChatAudio(blob);
+                        }
+                    });
                 });
-                chatMicRecorder.start();
+                chatMicRecorder.start(STT_TIMESLICE_MS);
             })
             .catch(function () {
                 chatMicRecording = false;
@@ -443,6 +599,16 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     }
 
+    function useChatTranscript(transcript) {
+        chatInput.disabled = false;
+        chatInput.placeholder = "Type your response...";
+        if (transcript) {
+            chatInput.value = transcript;
+            updateInputButtons();
+            sendChatMessage();
+        }
+    }
+
     function transcribeChatAudio(blob) {
         var fd = new FormData();
         fd.append("file", blob, "chat_audio.webm");
@@ -450,13 +616,7 @@ document.addEventListener("DOMContentLoaded", function () {
         fetch("/stt", { method: "POST", body: fd })
             .then(function (res) { return res.json(); })
             .then(function (data) {
-                chatInput.disabled = false;
-                chatInput.placeholder = "Type your response...";
-                if (data.transcript) {
-                    chatInput.value = data.transcript;
-                    updateInputButtons();
-                    sendChatMessage();
-                }
+                useChatTranscript(data.transcript);
             })
             .catch(function () {
                 chatInput.disabled = false;
@@ -573,18 +733,29 @@ document.addEventListener("DOMContentLoaded", function () {
     function startRecording() {
         recordedBlob = null;
         audioChunks = [];
+        voiceTranscript = null;
         navigator.mediaDevices.getUserMedia({ audio: true })
             .then(function (stream) {
                 mediaRecorder = new MediaRecorder(stream);
+                voiceLive = openLiveTranscription(mediaRecorder.mimeType, function (transcript) {
+                    voiceStatus.textContent = transcript;
+                });
                 mediaRecorder.addEventListener("dataavailable", function (e) {
-                    if (e.data.size > 0) audioChunks.push(e.data);
+                    if (e.data.size > 0) {
+                        audioChunks.push(e.data);
+                        sendLiveChunk(voiceLive, e.data);
+                    }
                 });
                 mediaRecorder.addEventListener("stop", function () {
                     recordedBlob = new Blob(audioChunks, { type: "audio/webm" });
                     stream.getTracks().forEach(function (t) { t.stop(); });
+                    // The live transcript is sent as text; the blob stays as fallback
+                    stopLiveTranscription(voiceLive, function (live) {
+                        if (!live.failed && live.transcript) voiceTranscript = live.transcript;
+                    });
                     updateSubmitState();
                 });
-                mediaRecorder.start();
+                mediaRecorder.start(STT_TIMESLICE_MS);
                 recordStartTime = Date.now();
                 recordButton.setAttribute("aria-pressed", "true");
                 voiceRecorder.classList.add("recording");
@@ -625,60 +796,89 @@ document.addEventListener("DOMContentLoaded", function () {
     var confirmButton = document.querySelector(".confirm-button");
     var fieldSchema = {};
 
-    function showResults(data) {
-        resultsFields.innerHTML = "";
-        fieldSchema = data.field_schema || {};
+    function renderResultField(key, val) {
+        var schema = fieldSchema[key] || {};
+        var li = document.createElement("li");
+        li.className = "result-field";
+        li.setAttribute("data-field", key);
+
+        var label = document.createElement("div");
+        label.className = "field-label";
+        label.textContent = key;
+        li.appendChild(label);
+
+        if (schema.type === "array" && schema.items && schema.items.enum) {
+            // Render checkboxes for array fields with enum options
+            var options = schema.items.enum;
+            var selected = Array.isArray(val) ? val : [];
+            var checkboxGroup = document.createElement("div");
+            checkboxGroup.className = "field-checkboxes";
+            checkboxGroup.setAttribute("data-key", key);
+
+            options.forEach(function (opt) {
+                var cbLabel = document.createElement("label");
+                cbLabel.className = "field-checkbox-label";
+                var cb = document.createElement("input");
+                cb.type = "checkbox";
+                cb.value = opt;
+                cb.checked = selected.indexOf(opt) !== -1;
+                cbLabel.appendChild(cb);
+                cbLabel.appendChild(document.createTextNode(" " + opt));
+                checkboxGroup.appendChild(cbLabel);
+            });
+            li.appendChild(checkboxGroup);
+        } else {
+            // Render text input for string fields
+            var input = document.createElement("textarea");
+            input.className = "field-input";
+            input.setAttribute("data-key", key);
+            input.value = val || "";
+            input.rows = 2;
+            li.appendChild(input);
+        }
+
+        return li;
+    }
+
+    function setResultField(key, val) {
+        // Replace the field in place when it is updated while streaming
+        var li = renderResultField(key, val);
+        var existing = null;
+        resultsFields.querySelectorAll(".result-field").forEach(function (item) {
+            if (item.getAttribute("data-field") === key) existing = item;
+        });
+        if (existing) {
+            resultsFields.replaceChild(li, existing);
+        } else {
+            resultsFields.appendChild(li);
+        }
+    }
 
-        if (data.reasoning) {
-            reasoningText.innerHTML = renderMarkdown(data.reasoning);
+    function setReasoning(text) {
+        if (text) {
+            reasoningText.innerHTML = renderMarkdown(text);
             resultsReasoning.hidden = false;
         } else {
             resultsReasoning.hidden = true;
         }
+    }
+
+    function beginResults(schema) {
+        resultsFields.innerHTML = "";
+        fieldSchema = schema || {};
+        setReasoning("");
+        resultsCard.hidden = false;
+        resultsCard.scrollIntoView({ behavior: "smooth", block: "start" });
+    }
+
+    function showResults(data) {
+        resultsFields.innerHTML = "";
+        fieldSchema = data.field_schema || {};
+        setReasoning(data.reasoning);
 
         var formData = data.form_data || {};
         Object.keys(formData).forEach(function (key) {
-            var val = formData[key];
-            var schema = fieldSchema[key] || {};
-            var li = document.createElement("li");
-            li.className = "result-field";
-
-            var label = document.createElement("div");
-            label.className = "field-label";
-            label.textContent = key;
-            li.appendChild(label);
-
-            if (schema.type === "array" && schema.items && schema.items.enum) {
-                // Render checkboxes for array fields with enum options
-                var options = schema.items.enum;
-                var selected = Array.isArray(val) ? val : [];
-                var checkboxGroup = document.createElement("div");
-                checkboxGroup.className = "field-checkboxes";
-                checkboxGroup.setAttribute("data-key", key);
-
-                options.forEach(function (opt) {
-                    var cbLabel = document.createElement("label");
-                    cbLabel.className = "field-checkbox-label";
-                    var cb = document.createElement("input");
-                    cb.type = "checkbox";
-                    cb.value = opt;
-                    cb.checked = selected.indexOf(opt) !== -1;
-                    cbLabel.appendChild(cb);
-                    cbLabel.appendChild(document.createTextNode(" " + opt));
-                    checkboxGroup.appendChild(cbLabel);
-                });
-                li.appendChild(checkboxGroup);
-            } else {
-                // Render text input for string fields
-                var input = document.createElement("textarea");
-                input.className = "field-input";
-                input.setAttribute("data-key", key);
-                input.value = val || "";
-                input.rows = 2;
-                li.appendChild(input);
-            }
-
-            resultsFields.appendChild(li);
+            resultsFields.appendChild(renderResultField(key, formData[key]));
         });
 
         resultsCard.hidden = false;
@@ -740,25 +940,79 @@ document.addEventListener("DOMContentLoaded", function () {
 
     // --- Submit ---
 
+    function streamParseContext(fd) {
+        // Reasoning and fields are shown as the server streams them; the
+        // final event replaces them with the complete result
+        var reasoning = "";
+        readSSE("/parse-context-stream", { method: "POST", body: fd },
+            function () {},
+            function (data) {
+                if (data.error || !data.form_data) {
+                    submitButton.textContent = "Error";
+                    setTimeout(function () {
+                        submitButton.textContent = "Submit";
+                        updateSubmitState();
+                    }, 2000);
+                    return;
+                }
+                submitButton.textContent = "Submit";
+                updateSubmitState();
+                showResults(data);
+            },
+            function (data) {
+                if (data.start) {
+                    beginResults(data.field_schema);
+                } else if (data.reasoning) {
+                    reasoning += data.reasoning;
+                    setReasoning(reasoning);
+                } else if (data.field) {
+                    setResultField(data.field, data.value);
+                }
+            }
+        );
+    }
+
     function submitToParseContext(summaryText) {
         var fd = new FormData();
         fd.append("type", "text");
         fd.append("text", summaryText);
+        streamParseContext(fd);
+    }
 
-        fetch("/parse-context", { method: "POST", body: fd })
-            .then(function (res) { return res.json(); })
-            .then(function (data) {
-                submitButton.textContent = "Submit";
-                updateSubmitState();
-                if (data.form_data) showResults(data);
-            })
-            .catch(function () {
-                submitButton.textContent = "Error";
-                setTimeout(function () {
-                    submitButton.textContent = "Submit";
-                    updateSubmitState();
-                }, 2000);
-            });
+    function summarizeChat() {
+        submitButton.textContent = "Summarizing...";
+
+        var bubble = null;
+        readSSE("/chat-summary", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ session_id: chatSessionId })
+        },
+            function (token) {
+                if (!bubble) {
+                    bubble = createStreamBubble("assistant");
+                    bubble.classList.add("chat-summary");
+                }
+                bubble.textContent += token;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            },
+            function (data) {
+                if (data.error) {
+                    submitButton.textContent = "Error";
+                    setTimeout(function () {
+                        submitButton.textContent = "Submit";
+                        submitButton.disabled = false;
+                    }, 2000);
+                    chatInput.disabled = false;
+                    return;
+                }
+                finalizeBubbleText(bubble);
+                speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
+                chatSummaryText = data.summary;
+                submitButton.textContent = "Analyzing...";
+                submitToParseContext(chatSummaryText);
+            }
+        );
     }
 
     submitButton.addEventListener("click", function () {
@@ -768,40 +1022,25 @@ document.addEventListener("DOMContentLoaded", function () {
         hideResults();
 
         if (activeMode === "chat" && chatSessionId) {
-            submitButton.textContent = "Summarizing...";
             chatInput.disabled = true;
-
-            var bubble = null;
-            readSSE("/chat-summary", {
+            // The server updates the form data after every turn, so it is
+            // normally ready; the summary and re-parse are only a fallback
+            fetch("/chat-form-data", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ session_id: chatSessionId })
-            },
-                function (token) {
-                    if (!bubble) {
-                        bubble = createStreamBubble("assistant");
-                        bubble.classList.add("chat-summary");
-                    }
-                    bubble.textContent += token;
-                    chatMessages.scrollTop = chatMessages.scrollHeight;
-                },
-                function (data) {
-                    if (data.error) {
-                        submitButton.textContent = "Error";
-                        setTimeout(function () {
-                            submitButton.textContent = "Submit";
-                            submitButton.disabled = false;
-                        }, 2000);
-                        chatInput.disabled = false;
+            })
+                .then(function (res) { return res.json(); })
+                .then(function (data) {
+                    if (!data.success || Object.keys(data.form_data || {}).length === 0) {
+                        summarizeChat();
                         return;
                     }
-                    finalizeBubbleText(bubble);
-                    speakText(bubble ? bubble.getAttribute("data-text") : "", bubble);
-                    chatSummaryText = data.summary;
-                    submitButton.textContent = "Analyzing...";
-                    submitToParseContext(chatSummaryText);
-                }
-            );
+                    submitButton.textContent = "Submit";
+                    updateSubmitState();
+                    showResults(data);
+                })
+                .catch(summarizeChat);
             return;
         }
 
@@ -825,27 +1064,16 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             fd.append("type", fileType);
             fd.append("file", uploadedFile, uploadedFile.name);
+        } else if (activeMode === "voice" && voiceTranscript) {
+            fd.append("type", "text");
+            fd.append("text", voiceTranscript);
         } else if (activeMode === "voice" && recordedBlob) {
             fd.append("type", "audio");
             fd.append("file", recordedBlob, "recording.webm");
         }
 
         submitButton.textContent = "Analyzing...";
-
-        fetch("/parse-context", { method: "POST", body: fd })
-            .then(function (res) { return res.json(); })
-            .then(function (data) {
-                submitButton.textContent = "Submit";
-                updateSubmitState();
-                if (data.form_data) showResults(data);
-            })
-            .catch(function () {
-                submitButton.textContent = "Error";
-                setTimeout(function () {
-                    submitButton.textContent = "Submit";
-                    updateSubmitState();
-                }, 2000);
-            });
+        streamParseContext(fd);
     });
 
     updateSubmitState();
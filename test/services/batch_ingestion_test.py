@@ -0,0 +1,139 @@
+import json
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from services import batch_ingestion
+from services.batch_ingestion import (
+	RateLimiter,
+	batch_limits,
+	discover_items,
+	load_checkpoint,
+	make_item,
+	resolve_batch_output,
+	run_batch,
+)
+from test.services.helpers import fake_prediction
+
+
+def fake_parse_context(path_or_text, context_type, result_schema, options=None):
+	if "broken" in path_or_text:
+		raise RuntimeError("unreadable")
+	return fake_prediction({"source": context_type})
+
+
+@pytest.fixture
+def batch_root(tmp_path):
+	"""A batch root holding a few documents under docs/, set as BATCH_ROOT."""
+	os.makedirs(tmp_path / "docs" / "scans")
+	for name, content in [
+		("docs/note.txt", "Patient's head is hurting"),
+		("docs/labs.csv", "a,b\n1,2\n"),
+		("docs/scans/page.png", "png"),
+		("docs/ignored.docx", "?"),
+	]:
+		(tmp_path / name).write_text(content)
+	with mock.patch.object(batch_ingestion, "BATCH_ROOT", str(tmp_path)):
+		yield str(tmp_path)
+
+
+def test_discover_directory(batch_root):
+	items = discover_items(os.path.join(batch_root, "docs"))
+	assert [(item["id"], item["type"]) for item in items] == [
+		("labs.csv", "spreadsheet"), ("note.txt", "text"), ("scans/page.png", "image"),
+	]
+
+
+def test_discover_manifest(batch_root):
+	manifest = os.path.join(batch_root, "manifest.jsonl")
+	with open(manifest, "w") as f:
+		f.write(json.dumps({"path": "docs/labs.csv", "options": {"sheet": "0"}}) + "\n")
+		f.write(json.dumps({"path": "docs/ignored.docx", "type": "text", "id": "doc"}) + "\n")
+	items = discover_items(manifest)
+	assert items[0]["path"] == os.path.join(batch_root, "docs/labs.csv")
+	assert items[0]["options"] == {"sheet": "0"}
+	assert (items[1]["id"], items[1]["type"]) == ("doc", "text")
+
+
+def test_confined_manifest_rejects_paths_outside_the_root(batch_root, tmp_path_factory):
+	outside = tmp_path_factory.mktemp("outside") / "secret.txt"
+	outside.write_text("secret")
+	manifest = os.path.join(batch_root, "docs", "manifest.txt")
+
+	with open(manifest, "w") as f:
+		f.write("../docs/note.txt\n")
+	assert discover_items(manifest, confined=True)[0]["path"] == os.path.realpath(os.path.join(batch_root, "docs/note.txt"))
+
+	for path in [str(outside), os.path.relpath(outside, os.path.dirname(manifest))]:
+		with open(manifest, "w") as f:
+			f.write(path + "\n")
+		with pytest.raises(ValueError):
+			discover_items(manifest, confined=True)
+
+	os.symlink(outside, os.path.join(batch_root, "docs", "link.txt"))
+	with pytest.raises(ValueError):
+		discover_items(os.path.join(batch_root, "docs"), confined=True)
+
+
+def test_output_is_a_results_file_under_the_root(batch_root):
+	results = os.path.join(os.path.realpath(batch_root), "results")
+	os.makedirs(results)
+	with open(os.path.join(results, "notes.jsonl"), "w") as f:
+		f.write('{"note": "not a batch"}\n')
+
+	source = os.path.join(batch_root, "docs")
+	assert resolve_batch_output(None, source) == os.path.join(results, "docs.results.jsonl")
+	assert resolve_batch_output("a/run.jsonl", source) == os.path.join(results, "a", "run.jsonl")
+	for output in ["../docs/note.txt", "../app.jsonl", "/etc/passwd.jsonl", "run.txt", "notes.jsonl"]:
+		with pytest.raises(ValueError):
+			resolve_batch_output(output, source)
+
+	note = os.path.join(batch_root, "docs", "note.txt")
+	with pytest.raises(ValueError):
+		run_batch([], "{}", note, resume=False)
+	with open(note) as f:
+		assert f.read() == "Patient's head is hurting"
+
+
+def test_batch_limits_are_parsed_and_clamped():
+	with mock.patch.object(batch_ingestion, "BATCH_MAX_CONCURRENCY", 8), \
+			mock.patch.object(batch_ingestion, "BATCH_MAX_RATE_PER_SECOND", 5.0):
+		assert batch_limits("3", "2.5") == (3, 2.5)
+		assert batch_limits(10000, 0) == (8, 5.0)
+		assert batch_limits(0, 100) == (1, 5.0)
+		for concurrency, rate in [("many", 1), (2, "fast"), (2, "nan"), ([], 1)]:
+			with pytest.raises((ValueError, TypeError)):
+				batch_limits(concurrency, rate)
+
+
+def test_resume_skips_finished_and_retries_failed(batch_root):
+	items = discover_items(os.path.join(batch_root, "docs"))
+	items.append(make_item(os.path.join(batch_root, "broken.pdf")))
+	output = os.path.join(batch_root, "out", "results.jsonl")
+
+	with mock.patch.object(batch_ingestion, "parse_context", side_effect=fake_parse_context) as parse:
+		summary = run_batch(items, "{}", output, concurrency=2)
+		assert (summary["succeeded"], summary["failed"]) == (3, 1)
+		assert set(summary["latency_ms"]) == {"image", "pdf", "spreadsheet", "text"}
+		assert parse.call_count == 4
+
+		summary = run_batch(items, "{}", output, concurrency=2)
+		assert (summary["skipped"], summary["failed"]) == (3, 1)
+		assert parse.call_count == 5
+
+	with open(output) as f:
+		records = [json.loads(line) for line in f]
+	assert len(records) == 5
+	assert len(load_checkpoint(output)) == 3
+	text_record = next(r for r in records if r["type"] == "text")
+	assert text_record["form_data"] == {"source": "text"}
+
+
+def test_rate_limiter_spaces_calls():
+	limiter = RateLimiter(20)
+	start = time.monotonic()
+	for _ in range(5):
+		limiter.acquire()
+	assert time.monotonic() - start >= 0.19
@@ -0,0 +1,77 @@
+import time
+from unittest import mock
+
+import pytest
+
+from services.chat_sessions import MemorySessionStore, SQLiteSessionStore
+from test.services.helpers import chat_history
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+	"""Builds stores of each backend; SQLite stores made by one test share a file, like workers."""
+	if request.param == "memory":
+		return MemorySessionStore
+	return lambda **kwargs: SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), **kwargs)
+
+
+def test_round_trip_and_copy_on_read(make_store):
+	store = make_store()
+	session_id = store.create({"messages": chat_history()})
+	session = store.get(session_id)
+	assert session["messages"] == chat_history()
+
+	session["messages"].append({"role": "user", "content": "Ana"})
+	assert len(store.get(session_id)["messages"]) == 2
+	store.save(session_id, session)
+	assert store.get(session_id)["messages"][-1]["content"] == "Ana"
+	assert store.get("unknown") is None
+
+
+def test_system_prompts_are_interned(make_store):
+	store = make_store()
+	first = store.get(store.create({"messages": chat_history(schema="{\"name\": \"string\"}")}))
+	second = store.get(store.create({"messages": chat_history(schema="{\"name\": \"string\"}")}))
+	assert first["messages"][0]["content"] is second["messages"][0]["content"]
+	assert store.stats()["prompts"] == 1
+
+
+def test_update_changes_fields_but_not_messages(make_store):
+	store = make_store()
+	session_id = store.create({"messages": chat_history(), "form_data": {}})
+	assert store.update(session_id, lambda fields: {"form_data": {"name": "Ana"}, "seen": sorted(fields)})
+	assert store.update(session_id, lambda fields: None)
+	session = store.get(session_id)
+	assert session["form_data"] == {"name": "Ana"}
+	assert session["seen"] == ["form_data"]
+	assert session["messages"] == chat_history()
+	assert not store.update("unknown", lambda fields: {"form_data": {}})
+
+
+def test_idle_sessions_expire(make_store):
+	store = make_store(ttl_seconds=60)
+	session_id = store.create({"messages": chat_history()})
+	with mock.patch("services.chat_sessions.time.time", return_value=time.time() + 61):
+		assert store.get(session_id) is None
+
+
+def test_least_recently_used_sessions_are_evicted(make_store):
+	store = make_store(max_sessions=2)
+	first = store.create({"messages": chat_history()})
+	second = store.create({"messages": chat_history()})
+	time.sleep(0.01)
+	store.get(first)
+	third = store.create({"messages": chat_history()})
+
+	assert store.get(first) is not None
+	assert store.get(second) is None
+	assert store.get(third) is not None
+	assert store.stats()["evicted"] == 1
+
+
+def test_sqlite_sessions_are_shared_between_workers(tmp_path):
+	db_path = str(tmp_path / "sessions.sqlite3")
+	session_id = SQLiteSessionStore(db_path).create({"messages": chat_history(), "form_id": "intake"})
+	other_worker = SQLiteSessionStore(db_path)
+	assert other_worker.get(session_id)["form_id"] == "intake"
+	assert other_worker.get(session_id)["messages"] == chat_history()
@@ -0,0 +1,56 @@
+import time
+from unittest import mock
+
+from services import context_parser
+from services.extraction_cache import ExtractionCache, hash_text, make_cache_key
+
+
+def test_make_cache_key_depends_on_every_part():
+	base = make_cache_key(hash_text("note"), "{}", "model-a", "text")
+	assert base == make_cache_key(hash_text("note"), "{}", "model-a", "text")
+	assert base != make_cache_key(hash_text("other"), "{}", "model-a", "text")
+	assert base != make_cache_key(hash_text("note"), '{"a": 1}', "model-a", "text")
+	assert base != make_cache_key(hash_text("note"), "{}", "model-b", "text")
+	assert base != make_cache_key(hash_text("note"), "{}", "model-a", "json")
+
+
+def test_memory_and_disk_tiers(tmp_path):
+	db_path = str(tmp_path / "cache.sqlite3")
+	cache = ExtractionCache(db_path, memory_entries=1)
+	assert cache.get("a") is None
+
+	cache.set("a", '{"field": "x"}', "because")
+	cache.set("b", '{"field": "y"}', "because")
+	assert cache.get("b")["json_result"] == '{"field": "y"}'
+	# "a" was pushed out of the one-entry LRU but is still on disk
+	assert cache.get("a")["reasoning"] == "because"
+
+	stats = cache.stats()
+	assert stats["memory_hits"] == 1
+	assert stats["disk_hits"] == 1
+	assert stats["misses"] == 1
+
+	# A fresh instance sees the persisted entries
+	assert ExtractionCache(db_path).get("b")["json_result"] == '{"field": "y"}'
+
+
+def test_ttl_and_size_eviction(tmp_path):
+	cache = ExtractionCache(str(tmp_path / "ttl.sqlite3"), ttl_seconds=0.05)
+	cache.set("a", "{}", "")
+	time.sleep(0.1)
+	assert cache.get("a") is None
+
+	cache = ExtractionCache(str(tmp_path / "size.sqlite3"), memory_entries=0, max_bytes=200)
+	for key in ("a", "b", "c"):
+		cache.set(key, "x" * 60, "")
+	assert cache.get("a") is None
+	assert cache.get("c") is not None
+	assert cache.stats()["disk_bytes"] <= 200
+
+
+def test_pdf_cache_key_covers_the_text_model(tmp_path):
+	pdf_path = tmp_path / "scan.pdf"
+	pdf_path.write_bytes(b"%PDF")
+	key = context_parser.context_cache_key(str(pdf_path), "pdf", "{}", {})
+	with mock.patch.dict(context_parser.DEFAULT_MODELS, {"text": "other-text-model"}):
+		assert context_parser.context_cache_key(str(pdf_path), "pdf", "{}", {}) != key
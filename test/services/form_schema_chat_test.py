@@ -0,0 +1,167 @@
+import json
+from unittest import mock
+
+import pytest
+
+from services import form_schema_chat
+from services.form_schema_chat import (
+	StatusStreamParser,
+	apply_compaction,
+	build_prompt,
+	compact_history,
+	latest_exchange,
+	split_turns,
+	start_compaction,
+	start_form_data_update,
+	still_unmerged,
+	update_form_data,
+)
+from test.services.helpers import chat_history, fake_openai_client
+
+STATUS_REPLY = 'Thanks!\nWhat is your **age**?\n<!--STATUS::{"collected":["name"],"missing":["age"]}-->'
+FORM_SCHEMA = json.dumps({"properties": {
+	"name": {"type": "string"},
+	"age": {"type": "integer"},
+	"tests": {"type": "array", "items": {"type": "string", "enum": ["ECG", "X-ray"]}},
+}})
+
+
+def summarizing(summary):
+	return mock.patch.object(form_schema_chat, "summarize_turns", return_value=summary)
+
+
+def test_turns_start_at_user_messages():
+	turns = split_turns(chat_history(2)[1:])
+	assert [len(turn) for turn in turns] == [1, 2, 2]
+	assert turns[1][0]["content"][:8] == "Answer 0"
+
+
+def test_under_budget_history_is_untouched():
+	messages = chat_history(2)
+	with summarizing({}) as summarize:
+		assert compact_history(messages, None, budget=10_000) == (messages, None)
+	summarize.assert_not_called()
+
+
+def test_older_turns_are_folded_into_the_summary():
+	messages = chat_history(6)
+	with summarizing({"name": "Ana"}) as summarize:
+		compacted, summary = compact_history(messages, {"notes": []}, budget=200, keep_turns=2)
+
+	older, previous = summarize.call_args.args
+	assert previous == {"notes": []}
+	assert older[0]["content"] == "Hello, what is your name?"
+	assert older[-1]["content"] == "Question 4?"
+	assert summary == {"name": "Ana"}
+	assert compacted == [messages[0]] + messages[-4:]
+
+
+def test_failed_summary_keeps_the_full_history():
+	messages = chat_history(6)
+	with mock.patch.object(form_schema_chat, "summarize_turns", side_effect=ValueError("bad json")):
+		assert compact_history(messages, None, budget=200, keep_turns=2) == (messages, None)
+
+
+def test_background_compaction_is_applied_on_the_next_turn():
+	messages = chat_history(6)
+	with summarizing({"name": "Ana"}):
+		assert start_compaction("s1", messages, None, budget=10_000) is None
+		start_compaction("s1", messages, None, budget=200, keep_turns=2).result(timeout=5)
+
+	# The next turn arrives with messages the compaction didn't see
+	later = messages + [{"role": "user", "content": "Answer 6"}]
+	assert apply_compaction("s1", later, None) == ([messages[0]] + later[-5:], {"name": "Ana"})
+	# Applied once
+	assert apply_compaction("s1", later, None) == (later, None)
+
+
+def test_stale_compaction_is_discarded():
+	messages = chat_history(6)
+	with summarizing({"name": "Ana"}):
+		start_compaction("s2", messages, None, budget=200, keep_turns=2).result(timeout=5)
+
+	# Another worker compacted the session and it grew back past the covered length
+	elsewhere = [messages[0], {"role": "assistant", "content": "Hello again"}] + chat_history(8)[2:]
+	assert apply_compaction("s2", elsewhere, {"name": "Bo"}) == (elsewhere, {"name": "Bo"})
+
+
+def test_expired_compactions_are_evicted():
+	messages = chat_history(6)
+	with summarizing({"name": "Ana"}):
+		start_compaction("s3", messages, None, budget=200, keep_turns=2).result(timeout=5)
+	with mock.patch.object(form_schema_chat, "CHAT_SESSION_TTL_SECONDS", 0):
+		assert apply_compaction("s3", messages, None) == (messages, None)
+	assert "s3" not in form_schema_chat._compactions
+
+
+def test_summary_is_sent_after_the_system_prompt():
+	messages = chat_history(1)
+	prompt = build_prompt(messages, {"name": "Ana"})
+	assert prompt[0] == messages[0]
+	assert '"name": "Ana"' in prompt[1]["content"]
+	assert prompt[2:] == messages[1:]
+	assert build_prompt(messages, None) is messages
+
+
+def parse_stream(tokens):
+	parser = StatusStreamParser()
+	visible, statuses = [], []
+	for token in tokens:
+		text, status = parser.feed(token)
+		visible.append(text)
+		if status is not None:
+			statuses.append((len(visible) - 1, status))
+	visible.append(parser.flush()[0])
+	return "".join(visible), statuses
+
+
+@pytest.mark.parametrize("size", range(1, 12))
+def test_status_block_is_withheld_at_any_token_boundary(size):
+	tokens = [STATUS_REPLY[i:i + size] for i in range(0, len(STATUS_REPLY), size)]
+	visible, statuses = parse_stream(tokens)
+	assert visible == "Thanks!\nWhat is your **age**?"
+	assert statuses == [(len(tokens) - 1, {"collected": ["name"], "missing": ["age"]})]
+
+
+def test_text_resembling_the_status_marker_is_released():
+	assert parse_stream(["Use <", "!-- here", " and <!", "-"]) == ("Use <!-- here and <!-", [])
+
+
+def test_malformed_or_unterminated_status_blocks_are_dropped():
+	assert parse_stream(["Hi ", "<!--STATUS::{oops}-->"]) == ("Hi", [])
+	assert parse_stream(["Hi ", "<!--STATUS::{\"coll"]) == ("Hi", [])
+
+
+def test_unmerged_exchanges_are_merged_in_the_background():
+	client, create = fake_openai_client(json.dumps({"age": "42", "tests": ["ecg", "MRI"], "mood": "fine"}))
+	messages = chat_history()
+	messages[-1]["content"] += '\n<!--STATUS::{"collected":[],"missing":["age"]}-->'
+	earlier = [{"role": "assistant", "content": "Any tests?"}, {"role": "user", "content": "An ECG"}]
+	unmerged = earlier + latest_exchange(messages, "I am 42")
+
+	with mock.patch.object(form_schema_chat, "get_openai_client", return_value=client):
+		future = start_form_data_update(FORM_SCHEMA, {"name": "Ana"}, unmerged)
+		# Unknown fields and options are dropped, types are coerced, known values kept
+		assert future.result(timeout=5) == {"name": "Ana", "age": 42, "tests": ["ECG"]}
+
+	prompt = create.call_args.kwargs["messages"][0]["content"]
+	assert '"name": "Ana"' in prompt
+	assert "USER: An ECG\nASSISTANT: Hello, what is your name?\nUSER: I am 42" in prompt
+	assert "STATUS" not in prompt
+
+
+def test_outdated_form_data_updates_are_not_stored():
+	a, b, c = ({"role": "user", "content": answer} for answer in "abc")
+	assert still_unmerged([a, b, c], [a, b]) == [c]
+	# A later update already stored a and b
+	assert still_unmerged([c], [a, b]) is None
+	assert still_unmerged([], [a]) is None
+	# This update started after an earlier one that is stored now
+	assert still_unmerged([b, c], [a, b, c]) == []
+
+
+def test_non_object_form_data_answers_are_rejected():
+	client, _ = fake_openai_client("[1, 2]")
+	with mock.patch.object(form_schema_chat, "get_openai_client", return_value=client):
+		with pytest.raises(ValueError):
+			update_form_data("{}", {}, [{"role": "user", "content": "hi"}])
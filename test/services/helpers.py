@@ -0,0 +1,31 @@
+"""Fakes shared by the service tests."""
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import dspy
+
+
+def chat_history(turns: int = 0, schema: str = "{}") -> list[dict]:
+	"""A chat session's messages: system prompt, greeting, then `turns` long answers and questions."""
+	messages = [
+		{"role": "system", "content": "Collect this schema: " + schema},
+		{"role": "assistant", "content": "Hello, what is your name?"},
+	]
+	for i in range(turns):
+		messages.append({"role": "user", "content": f"Answer {i} " + "x" * 200})
+		messages.append({"role": "assistant", "content": f"Question {i + 1}?"})
+	return messages
+
+
+def fake_openai_client(content: str):
+	"""An OpenAI client whose chat completions all answer `content`; returns (client, create mock)."""
+	create = mock.Mock(return_value=SimpleNamespace(
+		choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+	))
+	return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), create
+
+
+def fake_prediction(form_data: dict, reasoning: str = "ok") -> dspy.Prediction:
+	"""What an extraction program returns for `form_data`."""
+	return dspy.Prediction(json_result=json.dumps(form_data), reasoning=reasoning)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from services.job_queue import JobQueue, QueueFullError
+
+
+def test_job_succeeds():
+	queue = JobQueue(workers=1, max_queued=4, timeout=5)
+	job = queue.submit("test", lambda x: x * 2, 21)
+	job.future.result(timeout=5)
+	assert job.status == "succeeded"
+	assert job.to_dict()["result"] == 42
+
+
+def test_failure_is_recorded():
+	queue = JobQueue(workers=1, max_queued=4, timeout=5)
+
+	def boom():
+		raise ValueError("bad input")
+
+	job = queue.submit("test", boom)
+	job.future.result(timeout=5)
+	assert job.status == "failed"
+	assert "bad input" in job.error
+
+
+def test_queue_full_and_cancel_before_start():
+	queue = JobQueue(workers=1, max_queued=1, timeout=5)
+	release = threading.Event()
+	cleaned = []
+	running = queue.submit("test", release.wait)
+	while running.status != "running":
+		time.sleep(0.01)
+
+	waiting = queue.submit("test", lambda: None, cleanup=lambda: cleaned.append(True))
+	with pytest.raises(QueueFullError):
+		queue.submit("test", lambda: None)
+
+	assert queue.cancel(waiting.id)
+	assert waiting.status == "cancelled"
+	assert cleaned == [True]
+	release.set()
+
+
+def test_timeout_discards_late_result():
+	queue = JobQueue(workers=1, max_queued=4, timeout=0.05)
+	job = queue.submit("test", lambda: time.sleep(0.3) or "late")
+	job.future.result(timeout=5)
+	assert job.status == "timed_out"
+	assert job.result is None
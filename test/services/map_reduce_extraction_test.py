@@ -0,0 +1,47 @@
+import json
+
+from services.map_reduce_extraction import MapReduceExtractor, split_json, split_table, split_text
+from test.services.helpers import fake_prediction
+from utils.tokens import count_tokens
+
+
+def test_split_text_prefers_paragraphs():
+	paragraphs = [f"Paragraph {i} " + "word " * 40 for i in range(6)]
+	chunks = split_text("\n\n".join(paragraphs), max_tokens=120)
+
+	assert len(chunks) > 1
+	assert all(count_tokens(chunk) <= 120 for chunk in chunks)
+	assert "\n\n".join(chunks) == "\n\n".join(paragraphs)
+
+
+def test_split_json_keeps_subtree_paths():
+	document = {"patient": {"name": "Jane"}, "labs": [{"test": "glucose", "value": i} for i in range(30)]}
+	chunks = split_json(document, max_tokens=80)
+
+	assert len(chunks) > 1
+	assert any(chunk.startswith("$.patient: ") for chunk in "\n".join(chunks).splitlines())
+	assert any("$.labs[29]: " in chunk for chunk in chunks)
+	assert split_json({"a": 1}) == ['{"a": 1}']
+
+
+def test_split_table_repeats_header():
+	table = "test,value\n" + "".join(f"glucose,{i}\n" for i in range(100))
+	chunks = split_table(table, header_lines=1, max_tokens=60)
+
+	assert len(chunks) > 1
+	assert all(chunk.startswith("test,value\n") for chunk in chunks)
+	assert sum(chunk.count("glucose") for chunk in chunks) == 100
+
+
+def test_map_reduce_merges_partial_results():
+	class FakeExtractor:
+		def __call__(self, text, json_schema):
+			field = "Reason" if "reason" in text else "Documents"
+			value = text if field == "Reason" else ["ECG"]
+			return fake_prediction({field: value}, reasoning=text)
+
+	schema = {"properties": {"Reason": {"type": "string"}, "Documents": {"type": "array"}}}
+	result = MapReduceExtractor(FakeExtractor())(["reason: chest pain", "ECG attached"], schema)
+
+	assert json.loads(result.json_result) == {"Reason": "reason: chest pain", "Documents": ["ECG"]}
+	assert result.reasoning.startswith("Part 1/2: ")
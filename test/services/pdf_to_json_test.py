@@ -0,0 +1,30 @@
+import fitz
+import pytest
+
+from services.pdf_to_json import check_page_selection, parse_page_selection
+
+
+def test_page_selection_is_checked_against_the_page_count():
+	assert parse_page_selection(None, 3) == [0, 1, 2]
+	assert parse_page_selection("1-2, 3", 3) == [0, 1, 2]
+	# Open and overlong ranges stop at the last page
+	assert parse_page_selection("2-", 3) == [1, 2]
+	assert parse_page_selection("2-60", 3) == [1, 2]
+	for selection in ["50-60", "1,5", "x", "3-1"]:
+		with pytest.raises(ValueError):
+			parse_page_selection(selection, 3)
+
+
+def test_check_page_selection_reads_the_pdf(tmp_path):
+	doc = fitz.open()
+	doc.new_page()
+	pdf_path = tmp_path / "one.pdf"
+	doc.save(pdf_path)
+	check_page_selection(str(pdf_path), "1")
+	with pytest.raises(ValueError, match="names page 2"):
+		check_page_selection(str(pdf_path), "2")
+
+	junk_path = tmp_path / "junk.pdf"
+	junk_path.write_bytes(b"%PDF not really")
+	with pytest.raises(ValueError, match="not a readable PDF"):
+		check_page_selection(str(junk_path), None)
@@ -0,0 +1,64 @@
+from services.result_merging import conform_to_schema, merge_json_results, parse_json_result
+
+SCHEMA = {
+	"properties": {
+		"Reason": {"type": "string"},
+		"Severity": {"type": "string", "enum": ["low", "high"]},
+		"Documents": {"type": "array", "items": {"type": "string", "enum": ["ECG", "X-ray"]}},
+	}
+}
+
+
+def test_parse_json_result_variants():
+	assert parse_json_result('{"a": 1}') == {"a": 1}
+	assert parse_json_result("{'a': 1}") == {"a": 1}
+	assert parse_json_result('```json\n{"a": 1}\n```') == {"a": 1}
+	assert parse_json_result("not json") == {}
+
+
+def test_merge_concatenates_unions_and_resolves_by_confidence():
+	pages = [
+		{"Reason": "Chest pain", "Severity": "low", "Documents": ["ECG"]},
+		{"Reason": "Chest pain", "Severity": "high", "Documents": ["X-ray", "ECG"]},
+		{"Reason": "Dyspnea on exertion", "Severity": "", "Documents": []},
+	]
+	merged = merge_json_results(pages, SCHEMA, confidences=[0.2, 0.9, 0.5])
+
+	assert merged["Reason"] == "Chest pain\nDyspnea on exertion"
+	assert merged["Documents"] == ["ECG", "X-ray"]
+	assert merged["Severity"] == "high"
+
+
+def test_merge_is_deterministic_on_ties_and_fills_missing_fields():
+	pages = [{"Severity": "low"}, {"Severity": "high"}]
+	merged = merge_json_results(pages, SCHEMA, confidences=[0.5, 0.5])
+	assert merged == {"Reason": "", "Severity": "low", "Documents": []}
+
+
+def test_merge_keeps_values_contained_in_earlier_ones():
+	pages = [{"Reason": "12 mg"}, {"Reason": "2"}, {"Reason": " 12  MG "}]
+	assert merge_json_results(pages, SCHEMA)["Reason"] == "12 mg\n2"
+
+
+def test_conform_to_schema_filters_and_coerces():
+	schema = {"properties": {
+		**SCHEMA["properties"],
+		"Age": {"type": "integer"},
+		"Smoker": {"type": "boolean"},
+	}}
+	data = {
+		"Reason": ["Chest pain", "fever"],
+		"Severity": "HIGH",
+		"Documents": ["ECG", "scanner", "ECG"],
+		"Age": "42",
+		"Smoker": "no",
+		"Unknown": "dropped",
+	}
+	assert conform_to_schema(data, schema) == {
+		"Reason": "Chest pain, fever",
+		"Severity": "high",
+		"Documents": ["ECG"],
+		"Age": 42,
+		"Smoker": False,
+	}
+	assert conform_to_schema({"Severity": "medium", "Age": "forty", "Reason": {"a": 1}}, schema) == {}
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.spreadsheet_to_json import (
+	clean_dataframe,
+	convert_spreadsheet_to_text,
+	iter_spreadsheet_chunks,
+	resolve_sheet,
+	serialize_dataframe,
+	stream_spreadsheet_text,
+	to_markdown_table,
+)
+from utils.paths import PROJECT_ROOT
+
+
+def test_clean_dataframe_drops_empty_and_normalizes():
+	df = pd.DataFrame({
+		"dose": [10.0, np.nan, np.nan],
+		"empty": [None, " ", np.nan],
+		"date": [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-03 10:00"), None],
+	})
+
+	cleaned = clean_dataframe(df)
+	assert list(cleaned.columns) == ["dose", "date"]
+	assert cleaned["dose"].tolist() == [10, None]
+	assert cleaned["date"].tolist() == ["2024-01-01", "2024-02-03T10:00:00"]
+
+
+def test_auto_format_picks_fewest_tokens():
+	df = clean_dataframe(pd.DataFrame({"drug": ["Aspirin", "Lisinopril"] * 20, "dose": ["81mg", "10mg"] * 20}))
+	fmt, text, token_counts = serialize_dataframe(df, "auto")
+	assert token_counts[fmt] == min(token_counts.values())
+	assert token_counts["records"] > token_counts[fmt]
+	assert "Lisinopril" in text
+
+
+def test_markdown_escapes_pipes():
+	df = clean_dataframe(pd.DataFrame({"note": ["a|b"]}))
+	assert to_markdown_table(df) == "| note |\n|---|\n| a\\|b |\n"
+
+
+def test_prescription_csv_round_trip():
+	path = os.path.join(PROJECT_ROOT, 'test', 'files', 'form_context', 'observation', 'csv_prescription.csv')
+	fmt, text = convert_spreadsheet_to_text(path, "csv")
+	assert fmt == "csv"
+	assert text.splitlines()[0].startswith("Reason of Hospitalization,")
+	assert "Lisinopril 10mg daily, Aspirin 81mg daily" in text
+
+
+def test_streaming_keeps_columns_aligned_and_caps_output(tmp_path):
+	path = tmp_path / "labs.csv"
+	rows = ["test,value,comment"] + [f"glucose,{i}," for i in range(50)] + ["sodium,140,late comment"]
+	path.write_text("\n".join(rows) + "\n")
+
+	fmt, pieces = stream_spreadsheet_text(str(path), "auto", chunk_rows=10)
+	pieces = list(pieces)
+	assert fmt in ("csv", "markdown")
+	assert len(pieces) == 6
+	assert "".join(pieces).count("comment") == 2
+
+	_, capped = stream_spreadsheet_text(str(path), "csv", chunk_rows=10, max_bytes=120)
+	capped = "".join(capped)
+	assert capped.endswith("[Truncated after 120 bytes]\n")
+	assert len(capped.split("\n[Truncated")[0].encode("utf-8")) <= 120
+
+
+def test_excel_read_only_sheet_selection(tmp_path):
+	path = tmp_path / "book.xlsx"
+	with pd.ExcelWriter(path) as writer:
+		pd.DataFrame({"a": [1]}).to_excel(writer, sheet_name="First", index=False)
+		pd.DataFrame({"drug": ["Aspirin"], "dose": ["81mg"]}).to_excel(writer, sheet_name="Meds", index=False)
+
+	chunks = list(iter_spreadsheet_chunks(str(path), sheet="Meds"))
+	assert list(chunks[0].columns) == ["drug", "dose"]
+	assert convert_spreadsheet_to_text(str(path), "csv", sheet="1")[1] == "drug,dose\nAspirin,81mg\n"
+
+
+def test_sheet_names_win_over_indexes():
+	names = ["Summary", "2024", "0"]
+	assert resolve_sheet(names) == "Summary"
+	assert resolve_sheet(names, "2024") == "2024"
+	assert resolve_sheet(names, "0") == "0"
+	assert resolve_sheet(names, "1") == "2024"
+	with pytest.raises(ValueError, match="Unknown sheet"):
+		resolve_sheet(names, "Labs")
+	with pytest.raises(ValueError):
+		resolve_sheet(names, "3")
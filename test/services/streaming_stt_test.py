@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from services.streaming_stt import DeepgramStreamingSession, FakeStreamingSession, StreamingSession, open_stt_stream
+
+
+def deepgram_result(transcript, is_final):
+	return json.dumps({
+		"type": "Results",
+		"is_final": is_final,
+		"channel": {"alternatives": [{"transcript": transcript, "confidence": 0.9}]},
+	})
+
+
+def test_fake_backend_reports_interim_then_final():
+	events = []
+	session = open_stt_stream(lambda text, final: events.append((text, final)), backend="fake")
+	assert isinstance(session, FakeStreamingSession)
+	session.words = ["chest", "pain"]
+	session.send(b"a")
+	session.send(b"b")
+	assert session.finish() == "chest pain"
+	assert events == [("chest", False), ("chest pain", False), ("chest pain", True)]
+	assert session.bytes_received == 2
+
+
+def test_deepgram_results_accumulate_final_segments():
+	events = []
+	# Skip __init__: only message handling is exercised, no socket is opened
+	session = DeepgramStreamingSession.__new__(DeepgramStreamingSession)
+	StreamingSession.__init__(session, lambda text, final: events.append((text, final)))
+
+	session.handle_message(json.dumps({"type": "Metadata"}))
+	session.handle_message(deepgram_result("my head", False))
+	session.handle_message(deepgram_result("my head hurts", True))
+	session.handle_message(deepgram_result("", False))
+	session.handle_message(deepgram_result("since", False))
+	session.handle_message(deepgram_result("since Monday", True))
+
+	assert session.transcript == "my head hurts since Monday"
+	assert events == [
+		("my head", False),
+		("my head hurts", True),
+		("my head hurts since", False),
+		("my head hurts since Monday", True),
+	]
+
+
+def test_unknown_backend():
+	with pytest.raises(ValueError):
+		open_stt_stream(backend="nope")
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from services.text_to_speech import normalize_tts_text
+from services.tts_cache import TTSCache, make_tts_key
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+	return str(tmp_path)
+
+
+def store(cache, key, data):
+	return b"".join(cache.store_stream(key, [data[:3], data[3:]]))
+
+
+def test_key_ignores_markdown_and_whitespace():
+	a = make_tts_key(normalize_tts_text("**Hello**  _there_\n"), "thalia-en", "aura-2")
+	b = make_tts_key(normalize_tts_text("Hello there"), "thalia-en", "aura-2")
+	c = make_tts_key(normalize_tts_text("Hello there"), "orion-en", "aura-2")
+	assert a == b
+	assert a != c
+
+
+def test_stream_is_stored_and_survives_restart(cache_dir):
+	cache = TTSCache(cache_dir, max_bytes=1000)
+	assert cache.get("ab12") is None
+	assert store(cache, "ab12", b"mp3 bytes") == b"mp3 bytes"
+
+	with open(cache.get("ab12"), "rb") as f:
+		assert f.read() == b"mp3 bytes"
+	assert cache.stats()["hit_rate"] == 0.5
+
+	reopened = TTSCache(cache_dir, max_bytes=1000)
+	assert reopened.stats()["entries"] == 1
+	assert reopened.get("ab12") is not None
+
+
+def test_abandoned_stream_is_not_cached(cache_dir):
+	cache = TTSCache(cache_dir, max_bytes=1000)
+	stream = cache.store_stream("cd34", [b"first", b"second"])
+	next(stream)
+	stream.close()
+	assert cache.get("cd34") is None
+	assert [name for _, _, files in os.walk(cache_dir) for name in files] == []
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir):
+	cache = TTSCache(cache_dir, max_bytes=25)
+	store(cache, "aa01", b"x" * 10)
+	store(cache, "bb02", b"x" * 10)
+	cache.get("aa01")
+	store(cache, "cc03", b"x" * 10)
+
+	assert cache.get("aa01") is not None
+	assert cache.get("bb02") is None
+	assert cache.stats()["evictions"] == 1
+	assert cache.stats()["bytes"] == 20
@@ -0,0 +1,43 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from services import tts_pipeline
+from services.tts_pipeline import SentenceSplitter, SpeechPipeline
+
+
+def split_tokens(splitter, tokens):
+	sentences = []
+	for token in tokens:
+		sentences += splitter.feed(token)
+	return sentences + splitter.flush()
+
+
+def test_sentences_are_released_as_they_complete():
+	splitter = SentenceSplitter(min_chars=10)
+	assert splitter.feed("Thank you for com") == []
+	assert splitter.feed("ing in today. What is") == ["Thank you for coming in today."]
+	assert splitter.flush() == ["What is"]
+
+
+def test_short_fragments_join_the_next_sentence():
+	reply = "Hi. Dr. Smith will see you. Which applies?\n- **Yes**\n- **No**\n"
+	sentences = split_tokens(SentenceSplitter(min_chars=12), list(reply))
+	assert sentences == ["Hi. Dr. Smith will see you.", "Which applies?", "- **Yes**\n- **No**"]
+
+
+def test_status_block_is_never_spoken():
+	reply = 'What is your date of birth?\n<!--STATUS::{"collected":[],"missing":["dob"]}-->'
+	sentences = split_tokens(SentenceSplitter(min_chars=5), [reply[i:i + 7] for i in range(0, len(reply), 7)])
+	assert sentences == ["What is your date of birth?"]
+
+
+def test_segments_are_numbered_and_prefetched():
+	with mock.patch.object(tts_pipeline, "prefetch") as prefetch:
+		pipeline = SpeechPipeline(voice="thalia-en")
+		segments = pipeline.feed("**Welcome** to the clinic today. ") + pipeline.flush()
+		assert pipeline.feed("Too late.") == []
+
+	assert [segment["index"] for segment in segments] == [0]
+	query = parse_qs(urlparse(segments[0]["url"]).query)
+	assert query["text"] == ["Welcome to the clinic today."]
+	prefetch.assert_called_once_with("Welcome to the clinic today.", "thalia-en", tts_pipeline.TTS_MODEL)
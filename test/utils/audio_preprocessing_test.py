@@ -0,0 +1,67 @@
+import io
+import wave
+
+import av
+import numpy as np
+
+from utils.audio_preprocessing import SilenceTrimmer, normalize_audio, normalized_audio
+
+
+def wav_bytes(samples: np.ndarray, sample_rate: int, channels: int) -> bytes:
+	frames = np.repeat(samples, channels) if channels > 1 else samples
+	buffer = io.BytesIO()
+	with wave.open(buffer, "wb") as w:
+		w.setnchannels(channels)
+		w.setsampwidth(2)
+		w.setframerate(sample_rate)
+		w.writeframes(frames.astype(np.int16).tobytes())
+	return buffer.getvalue()
+
+
+def tone(seconds: float, sample_rate: int) -> np.ndarray:
+	t = np.arange(int(seconds * sample_rate)) / sample_rate
+	return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+
+
+def test_trimmer_keeps_padding_around_speech():
+	rate = 1000
+	trimmer = SilenceTrimmer(rate, threshold_db=-45, padding_ms=100)
+	samples = np.concatenate([np.zeros(1000), tone(0.5, rate), np.zeros(300), tone(0.2, rate), np.zeros(1000)])
+	output = []
+	# Fed in uneven blocks, as decoded frames arrive
+	for start in range(0, len(samples), 333):
+		output += trimmer.feed(samples[start:start + 333].astype(np.int16))
+	output += trimmer.flush()
+	assert sum(len(block) for block in output) == 100 + 500 + 300 + 200 + 100
+
+
+def test_all_silence_produces_nothing():
+	trimmer = SilenceTrimmer(1000)
+	assert trimmer.feed(np.zeros(2000, dtype=np.int16)) + trimmer.flush() == []
+
+
+def test_normalize_downmixes_resamples_and_trims():
+	rate = 44100
+	samples = np.concatenate([np.zeros(rate), tone(1, rate), np.zeros(rate)])
+	source = io.BytesIO(wav_bytes(samples, rate, channels=2))
+	output = io.BytesIO()
+
+	report = normalize_audio(source, output, sample_rate=16000)
+	assert (report["input_channels"], report["input_sample_rate"]) == (2, rate)
+	assert report["input_seconds"] == 3.0
+	assert report["output_seconds"] < 1.6
+	assert output.tell() < len(source.getvalue()) / 20
+
+	output.seek(0)
+	with av.open(output) as container:
+		stream = container.streams.audio[0]
+		assert stream.codec_context.name == "opus"
+		assert stream.codec_context.layout.nb_channels == 1
+
+
+def test_undecodable_input_is_passed_through():
+	source = io.BytesIO(b"not audio at all")
+	with normalized_audio(source, "audio/webm") as (audio, content_type):
+		assert audio is source
+		assert content_type == "audio/webm"
+		assert audio.read() == b"not audio at all"
@@ -0,0 +1,121 @@
+import io
+import wave
+from unittest import mock
+
+import numpy as np
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from services import speech_to_text
+from utils.audio_segmentation import VoiceActivitySegmenter, audio_duration, iter_speech_segments
+
+RATE = 1000
+
+
+def speech(seconds: float, rate: int = RATE) -> np.ndarray:
+	t = np.arange(int(seconds * rate)) / rate
+	return (np.sin(2 * np.pi * 110 * t) * 8000).astype(np.int16)
+
+
+def pause(seconds: float, rate: int = RATE) -> np.ndarray:
+	return np.zeros(int(seconds * rate), dtype=np.int16)
+
+
+def segment_all(segmenter, samples, block=777):
+	segments = []
+	for start in range(0, len(samples), block):
+		segments += segmenter.feed(samples[start:start + block])
+	return segments + segmenter.flush()
+
+
+def test_cuts_at_pauses_after_target_length():
+	samples = np.concatenate([speech(6), pause(1), speech(3), pause(1), speech(6), pause(1), speech(2)])
+	segmenter = VoiceActivitySegmenter(RATE, target_seconds=5, max_seconds=20, min_silence_ms=400)
+	segments = segment_all(segmenter, samples)
+
+	# The pause at 6 s closes the first segment, the one at 10 s comes too
+	# early for the second, which closes at the pause at 16 s instead
+	assert len(segments) == 3
+	starts = [start for start, _ in segments]
+	assert starts[0] == 0
+	assert starts[1] == pytest.approx(6.2, abs=0.05)
+	assert starts[2] == pytest.approx(17.2, abs=0.05)
+	# Offsets and lengths tile the recording with nothing lost
+	assert sum(len(s) for _, s in segments) == len(samples)
+
+
+def test_hard_cut_without_pause_and_silent_segments_dropped():
+	samples = np.concatenate([speech(12), pause(10)])
+	segmenter = VoiceActivitySegmenter(RATE, target_seconds=5, max_seconds=8, min_silence_ms=400)
+	segments = segment_all(segmenter, samples)
+	# Cut somewhere between the target and the cap; the trailing pause is dropped
+	assert len(segments) == 2
+	assert 5 <= len(segments[0][1]) / RATE <= 8
+	assert all(np.any(s) for _, s in segments)
+
+
+def recording():
+	rate = 16000
+	samples = np.concatenate([speech(4, rate), pause(1, rate), speech(4, rate), pause(1, rate), speech(2, rate)])
+	buffer = io.BytesIO()
+	with wave.open(buffer, "wb") as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(rate)
+		w.writeframes(samples.tobytes())
+	buffer.seek(0)
+	return buffer
+
+
+def test_segments_are_transcribed_and_stitched_in_order():
+	source = recording()
+	assert audio_duration(source) == pytest.approx(12, abs=0.05)
+	source.seek(0)
+
+	segmenter = VoiceActivitySegmenter(16000, target_seconds=3, max_seconds=10)
+	segments = list(iter_speech_segments(source, segmenter=segmenter))
+	assert len(segments) == 3
+	assert all(data.startswith(b"OggS") for _, _, data in segments)
+
+	calls = iter(["first part.", "second part.", "end."])
+	with mock.patch.object(speech_to_text, "iter_speech_segments", return_value=iter(segments)), \
+			mock.patch.object(speech_to_text, "transcribe_stream", side_effect=lambda *args: next(calls)):
+		result = speech_to_text.transcribe_segments(source, max_workers=1)
+
+	assert result["transcript"] == "first part. second part. end."
+	assert [segment["start"] for segment in result["segments"]] == [0, 4.2, 9.2]
+
+
+class RecordingAdapter(BaseAdapter):
+	"""Answers every request like Deepgram would and keeps the bodies it was sent."""
+
+	def __init__(self):
+		super().__init__()
+		self.bodies = []
+
+	def send(self, request, **kwargs):
+		body = request.body if isinstance(request.body, bytes) else b"".join(request.body)
+		self.bodies.append(body)
+		response = requests.Response()
+		response.status_code = 200
+		response.request = request
+		response._content = b'{"results": {"channels": [{"alternatives": [{"transcript": "part"}]}]}}'
+		return response
+
+	def close(self):
+		pass
+
+
+def test_each_segment_is_uploaded_as_its_opus_bytes():
+	segments = [(0.0, 4.0, b"OggS first"), (4.2, 5.0, b"OggS second")]
+	adapter = RecordingAdapter()
+	session = requests.Session()
+	session.mount("https://", adapter)
+
+	with mock.patch.object(speech_to_text, "iter_speech_segments", return_value=iter(segments)), \
+			mock.patch.object(speech_to_text, "get_http_session", return_value=session):
+		result = speech_to_text.transcribe_segments(io.BytesIO(), max_workers=1)
+
+	assert sorted(adapter.bodies) == [b"OggS first", b"OggS second"]
+	assert result["transcript"] == "part part"
@@ -0,0 +1,44 @@
+import threading
+from unittest import mock
+
+import requests
+
+from utils import clients
+
+
+def test_clients_are_built_once_across_threads():
+	built = []
+	results = []
+
+	def factory():
+		built.append(1)
+		return object()
+
+	with mock.patch.dict(clients._clients, clear=True):
+		threads = [threading.Thread(target=lambda: results.append(clients.shared_client("x", factory))) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+	assert len(built) == 1
+	assert len({id(client) for client in results}) == 1
+
+
+def test_session_is_pooled_and_has_a_default_timeout():
+	session = clients.get_http_session()
+	assert session is clients.get_http_session()
+	assert session.get_adapter("https://api.deepgram.com")._pool_maxsize == clients.HTTP_POOL_SIZE
+
+	with mock.patch.object(requests.Session, "request") as request:
+		session.post("https://example.com")
+		session.post("https://example.com", timeout=3)
+	assert request.call_args_list[0].kwargs["timeout"] == clients.HTTP_TIMEOUT
+	assert request.call_args_list[1].kwargs["timeout"] == 3
+
+
+def test_openai_client_is_shared():
+	with mock.patch.object(clients, "OPENROUTER_API_KEY", "test-key"), mock.patch.dict(clients._clients, clear=True):
+		client = clients.get_openai_client()
+		assert client is clients.get_openai_client()
+	assert client.timeout.connect == clients.HTTP_CONNECT_TIMEOUT
@@ -0,0 +1,41 @@
+import io
+import os
+
+from PIL import Image
+
+from utils.image_preprocessing import estimate_vision_tokens, fit_to_token_budget, preprocess_image
+from utils.paths import PROJECT_ROOT
+
+
+def png_bytes(img):
+	buffer = io.BytesIO()
+	img.save(buffer, format="PNG")
+	return buffer.getvalue()
+
+
+def test_handwritten_note_shrinks():
+	path = os.path.join(PROJECT_ROOT, 'test', 'files', 'form_context', 'observation', 'handwritten_note.png')
+	with open(path, "rb") as f:
+		data = f.read()
+
+	output, mime_type, report = preprocess_image(data, max_edge=1600)
+	assert mime_type == "image/jpeg"
+	assert report["output_bytes"] < report["input_bytes"]
+	assert max(report["output_size"]) <= 1600
+	# Color is kept unless grayscale is asked for
+	assert Image.open(io.BytesIO(output)).mode == "RGB"
+
+
+def test_token_budget_limits_size():
+	width, height = fit_to_token_budget(3000, 2000, token_budget=4 * 258)
+	assert estimate_vision_tokens(width, height) <= 4 * 258
+	assert abs(width / height - 1.5) < 0.01
+
+
+def test_trim_blank_margins():
+	page = Image.new("RGB", (800, 600), "white")
+	page.paste(Image.new("RGB", (100, 50), "black"), (400, 300))
+
+	_, _, report = preprocess_image(png_bytes(page), trim=True, grayscale=True)
+	assert report["output_size"][0] < 200
+	assert report["output_size"][1] < 100
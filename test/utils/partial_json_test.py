@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from utils.partial_json import PartialJSONParser
+
+DOCUMENT = {
+	"Reason": "chest pain, \"acute\" {onset}",
+	"Docs": ["prescription", "IRM"],
+	"Nested": {"a": [1, {"b": None}]},
+	"Count": 3,
+	"Flag": True,
+	"Last": -1.5e2,
+}
+TEXT = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+
+
+@pytest.mark.parametrize("step", [1, 3, 17, len(TEXT)])
+def test_fields_complete_in_order(step):
+	parser = PartialJSONParser()
+	fields = []
+	for i in range(0, len(TEXT), step):
+		fields.extend(parser.feed(TEXT[i:i + step]))
+	assert fields == list(DOCUMENT.items())
+	assert parser.finished
+
+
+def test_field_emitted_before_document_ends():
+	parser = PartialJSONParser()
+	assert parser.feed('{"a": "done", "b": "still wri') == [("a", "done")]
+	assert parser.feed('ting"') == [("b", "still writing")]
+	assert parser.feed(', "c": 4') == []
+	assert parser.feed('}') == [("c", 4)]
+
+
+def test_unparseable_value_is_skipped():
+	parser = PartialJSONParser()
+	assert parser.feed("{'a': 1, \"b\": nope, \"c\": []}") == [("c", [])]
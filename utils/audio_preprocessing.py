@@ -0,0 +1,197 @@
+import contextlib
+import os
+import tempfile
+from typing import BinaryIO
+
+import av
+import numpy as np
+
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+# Speech models are trained on 16 kHz mono, more only costs bytes
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+AUDIO_BITRATE = int(os.getenv("AUDIO_BITRATE", "24000"))
+AUDIO_TRIM_SILENCE = os.getenv("AUDIO_TRIM_SILENCE", "1") == "1"
+# Windows quieter than this (dBFS) count as silence
+AUDIO_SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", "-45"))
+# Silence kept around the speech so first and last words aren't clipped
+AUDIO_SILENCE_PADDING_MS = int(os.getenv("AUDIO_SILENCE_PADDING_MS", "250"))
+
+SILENCE_WINDOW_MS = 20
+OUTPUT_MIME_TYPE = "audio/ogg"
+
+
+def window_db(window: np.ndarray) -> float:
+	"""Loudness of int16 samples in dBFS."""
+	rms = np.sqrt(np.mean(window.astype(np.float64) ** 2)) if len(window) else 0.0
+	return 20 * np.log10(max(rms, 1.0) / 32768)
+
+
+class SilenceTrimmer:
+	"""
+	Drops leading and trailing silence from a stream of sample blocks.
+
+	Only the silence since the last voiced window is buffered, so memory
+	stays flat however long the recording is.
+	"""
+
+	def __init__(self, sample_rate: int, threshold_db: float = AUDIO_SILENCE_DB,
+				 padding_ms: int = AUDIO_SILENCE_PADDING_MS):
+		self.window = max(1, sample_rate * SILENCE_WINDOW_MS // 1000)
+		self.padding = sample_rate * padding_ms // 1000
+		self.threshold_db = threshold_db
+		self.started = False
+		self.remainder = np.zeros(0, dtype=np.int16)
+		self.silence = []
+
+	def _silence_samples(self) -> int:
+		return sum(len(block) for block in self.silence)
+
+	def _tail(self, samples: int) -> np.ndarray:
+		if not self.silence or samples <= 0:
+			return np.zeros(0, dtype=np.int16)
+		return np.concatenate(self.silence)[-samples:]
+
+	def feed(self, samples: np.ndarray) -> list[np.ndarray]:
+		"""Add samples; returns the blocks that are now safe to encode."""
+		samples = np.concatenate([self.remainder, samples])
+		usable = len(samples) - len(samples) % self.window
+		self.remainder = samples[usable:]
+
+		output = []
+		for start in range(0, usable, self.window):
+			window = samples[start:start + self.window]
+			if window_db(window) < self.threshold_db:
+				self.silence.append(window)
+				if not self.started and self._silence_samples() > self.padding:
+					# Leading silence: only the padding before speech is kept
+					self.silence = [self._tail(self.padding)]
+				continue
+
+			if self.started:
+				output.extend(self.silence)
+			else:
+				output.append(self._tail(self.padding))
+				self.started = True
+			self.silence = []
+			output.append(window)
+		return output
+
+	def flush(self) -> list[np.ndarray]:
+		if not self.started:
+			return []
+		self.silence.append(self.remainder)
+		return [self._tail(self.padding)]
+
+
+def iter_mono_samples(container, sample_rate: int = AUDIO_SAMPLE_RATE):
+	"""Decode the first audio stream of an open container as mono int16 blocks at `sample_rate`."""
+	resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+	for frame in container.decode(container.streams.audio[0]):
+		for resampled in resampler.resample(frame):
+			yield resampled.to_ndarray().reshape(-1)
+	for resampled in resampler.resample(None):
+		yield resampled.to_ndarray().reshape(-1)
+
+
+def write_opus(blocks, destination, sample_rate: int = AUDIO_SAMPLE_RATE, bitrate: int = AUDIO_BITRATE) -> int:
+	"""Encode mono int16 blocks as Opus in Ogg; returns the number of samples written."""
+	written = 0
+	with av.open(destination, "w", format="ogg") as output:
+		stream = output.add_stream("libopus", rate=sample_rate, layout="mono")
+		stream.bit_rate = bitrate
+		for block in blocks:
+			if not len(block):
+				continue
+			frame = av.AudioFrame.from_ndarray(block.reshape(1, -1), format="s16", layout="mono")
+			frame.sample_rate = sample_rate
+			written += len(block)
+			for packet in stream.encode(frame):
+				output.mux(packet)
+		for packet in stream.encode(None):
+			output.mux(packet)
+	return written
+
+
+def normalize_audio(source, destination: BinaryIO,
+					sample_rate: int = AUDIO_SAMPLE_RATE,
+					bitrate: int = AUDIO_BITRATE,
+					trim: bool = AUDIO_TRIM_SILENCE) -> dict:
+	"""
+	Re-encode speech for transcription: mono, `sample_rate`, silence trimmed,
+	Opus in Ogg at `bitrate`.
+
+	Decoding, trimming and encoding are streamed block by block.
+
+	Args:
+		source: Path or seekable binary file object of any format ffmpeg reads
+
+	Returns:
+		Report with the input/output durations and sample rate
+	"""
+	trimmer = SilenceTrimmer(sample_rate) if trim else None
+	input_samples = 0
+
+	with av.open(source) as container:
+		codec_context = container.streams.audio[0].codec_context
+
+		def blocks():
+			nonlocal input_samples
+			for samples in iter_mono_samples(container, sample_rate):
+				input_samples += len(samples)
+				yield from (trimmer.feed(samples) if trimmer else [samples])
+			if trimmer:
+				yield from trimmer.flush()
+
+		output_samples = write_opus(blocks(), destination, sample_rate, bitrate)
+
+	return {
+		"input_sample_rate": codec_context.sample_rate,
+		"input_channels": codec_context.layout.nb_channels,
+		"input_seconds": round(input_samples / sample_rate, 2),
+		"output_seconds": round(output_samples / sample_rate, 2),
+		"mime_type": OUTPUT_MIME_TYPE,
+	}
+
+
+def file_size(fileobj: BinaryIO) -> int:
+	position = fileobj.tell()
+	fileobj.seek(0, os.SEEK_END)
+	size = fileobj.tell()
+	fileobj.seek(position)
+	return size
+
+
+@contextlib.contextmanager
+def normalized_audio(source: BinaryIO, content_type: str):
+	"""
+	Yield (file object, content type) ready to upload: the normalized audio
+	when it is smaller, otherwise the original. The temporary output is
+	removed on exit.
+	"""
+	if not AUDIO_PREPROCESS:
+		yield source, content_type
+		return
+
+	input_bytes = file_size(source)
+	with tempfile.TemporaryFile() as output:
+		try:
+			report = normalize_audio(source, output)
+		except Exception as e:
+			print(f"[audio-preprocess] Skipped: {type(e).__name__}: {e}")
+			source.seek(0)
+			yield source, content_type
+			return
+
+		output_bytes = output.tell()
+		print(
+			f"[audio-preprocess] {input_bytes} -> {output_bytes} bytes, "
+			f"{report['input_channels']}ch {report['input_sample_rate']} Hz -> mono {AUDIO_SAMPLE_RATE} Hz, "
+			f"{report['input_seconds']} -> {report['output_seconds']} s"
+		)
+		# Already compact uploads (browser Opus clips) are sent as they are
+		if output_bytes >= input_bytes:
+			source.seek(0)
+			yield source, content_type
+			return
+		output.seek(0)
+		yield output, report["mime_type"]
@@ -0,0 +1,129 @@
+import io
+import os
+
+import av
+import numpy as np
+
+from utils.audio_preprocessing import (
+	AUDIO_SAMPLE_RATE,
+	AUDIO_SILENCE_DB,
+	SILENCE_WINDOW_MS,
+	iter_mono_samples,
+	window_db,
+	write_opus,
+)
+
+# Segments are cut at the first pause after this length...
+STT_SEGMENT_SECONDS = float(os.getenv("STT_SEGMENT_SECONDS", "60"))
+# ...or at the quietest point once they reach this length
+STT_SEGMENT_MAX_SECONDS = float(os.getenv("STT_SEGMENT_MAX_SECONDS", "90"))
+# A pause must last this long to count as a segment boundary
+STT_SEGMENT_MIN_SILENCE_MS = int(os.getenv("STT_SEGMENT_MIN_SILENCE_MS", "400"))
+
+
+class VoiceActivitySegmenter:
+	"""
+	Splits a stream of mono samples into segments at pauses in speech.
+
+	Each window is classified as voiced or silent by its loudness. Once a
+	segment is `target_seconds` long it is closed at the next pause of at
+	least `min_silence_ms`, or at its quietest window after `max_seconds`.
+	Segments without any voiced window are dropped.
+	"""
+
+	def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE,
+				 target_seconds: float = STT_SEGMENT_SECONDS,
+				 max_seconds: float = STT_SEGMENT_MAX_SECONDS,
+				 min_silence_ms: int = STT_SEGMENT_MIN_SILENCE_MS,
+				 threshold_db: float = AUDIO_SILENCE_DB):
+		self.sample_rate = sample_rate
+		self.window = max(1, sample_rate * SILENCE_WINDOW_MS // 1000)
+		self.target_windows = int(target_seconds * 1000 / SILENCE_WINDOW_MS)
+		self.max_windows = max(int(max_seconds * 1000 / SILENCE_WINDOW_MS), self.target_windows + 1)
+		self.min_silence_windows = max(1, min_silence_ms // SILENCE_WINDOW_MS)
+		self.threshold_db = threshold_db
+
+		self.remainder = np.zeros(0, dtype=np.int16)
+		self.windows = []
+		self.levels = []
+		self.start_sample = 0
+		self.silence_run = 0
+
+	def _cut(self, count: int):
+		"""Close the segment after its first `count` windows; returns (start seconds, samples) or None."""
+		windows, levels = self.windows[:count], self.levels[:count]
+		self.windows, self.levels = self.windows[count:], self.levels[count:]
+		start = self.start_sample
+		samples = np.concatenate(windows) if windows else np.zeros(0, dtype=np.int16)
+		self.start_sample += len(samples)
+		if not any(level >= self.threshold_db for level in levels):
+			return None
+		return start / self.sample_rate, samples
+
+	def feed(self, samples: np.ndarray) -> list[tuple[float, np.ndarray]]:
+		"""Add samples; returns the (start seconds, samples) segments closed by them."""
+		samples = np.concatenate([self.remainder, samples])
+		usable = len(samples) - len(samples) % self.window
+		self.remainder = samples[usable:]
+
+		segments = []
+		for start in range(0, usable, self.window):
+			window = samples[start:start + self.window]
+			level = window_db(window)
+			self.windows.append(window)
+			self.levels.append(level)
+			self.silence_run = self.silence_run + 1 if level < self.threshold_db else 0
+
+			cut = None
+			if len(self.windows) >= self.target_windows and self.silence_run >= self.min_silence_windows:
+				# Cut halfway into the pause so both sides keep some silence
+				cut = len(self.windows) - self.silence_run // 2
+			elif len(self.windows) >= self.max_windows:
+				tail = self.levels[self.target_windows:]
+				cut = self.target_windows + int(np.argmin(tail)) + 1
+			if cut is not None:
+				segment = self._cut(cut)
+				self.silence_run = 0
+				if segment:
+					segments.append(segment)
+		return segments
+
+	def flush(self) -> list[tuple[float, np.ndarray]]:
+		if len(self.remainder):
+			self.windows.append(self.remainder)
+			self.levels.append(window_db(self.remainder))
+			self.remainder = np.zeros(0, dtype=np.int16)
+		segment = self._cut(len(self.windows))
+		return [segment] if segment else []
+
+
+def audio_duration(source) -> float:
+	"""Duration in seconds from the container header, 0 when unknown."""
+	with av.open(source) as container:
+		if container.duration:
+			return container.duration / av.time_base
+		stream = container.streams.audio[0]
+		if stream.duration and stream.time_base:
+			return float(stream.duration * stream.time_base)
+	return 0.0
+
+
+def iter_speech_segments(source, sample_rate: int = AUDIO_SAMPLE_RATE, segmenter: VoiceActivitySegmenter = None):
+	"""
+	Decode a recording and yield (start seconds, duration seconds, Opus bytes)
+	for each speech segment, as soon as it is closed.
+	"""
+	segmenter = segmenter or VoiceActivitySegmenter(sample_rate)
+
+	def encoded(segment):
+		start, samples = segment
+		buffer = io.BytesIO()
+		write_opus([samples], buffer, sample_rate)
+		return start, len(samples) / sample_rate, buffer.getvalue()
+
+	with av.open(source) as container:
+		for samples in iter_mono_samples(container, sample_rate):
+			for segment in segmenter.feed(samples):
+				yield encoded(segment)
+	for segment in segmenter.flush():
+		yield encoded(segment)
@@ -1,6 +1,12 @@
+import importlib.util
 import os
+import threading
 from PIL import Image
-from openai import OpenAI
+import httpx
+import requests
+from openai import DefaultHttpxClient, OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import boto3
 from botocore.config import Config
 from utils.paths import DOTENV_PATH, PROJECT_ROOT
@@ -9,17 +15,79 @@ import moondream as md
 from dotenv import load_dotenv
 load_dotenv(DOTENV_PATH)
 
+# Connections kept open per host by each shared client
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# Longest wait between two reads of a response, not for the whole response
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(name, factory):
+	"""
+	Return the process-wide client registered under `name`, building it with
+	`factory` on first use. Clients are long-lived and keep their connections
+	open, so only the first request to a host pays for DNS, TCP and TLS.
+	"""
+	client = _clients.get(name)
+	if client is None:
+		with _clients_lock:
+			client = _clients.get(name)
+			if client is None:
+				client = _clients[name] = factory()
+	return client
+
+
+class PooledSession(requests.Session):
+	"""requests.Session that applies HTTP_TIMEOUT unless a call sets its own."""
+
+	def request(self, method, url, **kwargs):
+		kwargs.setdefault("timeout", HTTP_TIMEOUT)
+		return super().request(method, url, **kwargs)
+
+
+def _build_http_session():
+	session = PooledSession()
+	# Only failed connects are retried: nothing was sent yet, so it is safe for
+	# POSTs and for streamed request bodies
+	retries = Retry(total=None, connect=2, read=0, status=0, other=0, redirect=5, backoff_factor=0.2)
+	adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+	return session
+
+
+def get_http_session():
+	"""Shared keep-alive session for plain HTTP APIs (Deepgram, Google Vision...)."""
+	return shared_client("http", _build_http_session)
+
+
 PROVIDER = "openrouter"
 OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "openai/gpt-4o-mini:nitro")
 
-def get_openai_client():
-    return OpenAI(
+
+def _build_openai_client():
+	return OpenAI(
 		base_url=OPENROUTER_BASE_URL,
-		api_key=OPENROUTER_API_KEY
+		api_key=OPENROUTER_API_KEY,
+		http_client=DefaultHttpxClient(
+			http2=HTTP2_ENABLED,
+			limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+			timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+		),
 	)
 
+
+def get_openai_client():
+	return shared_client("openai", _build_openai_client)
+
 CLOUDFLARE_TOKEN_VALUE = os.getenv("CLOUDFLARE_TOKEN_VALUE")
 CLOUDFLARE_ENDPOINT_URL = os.getenv("CLOUDFLARE_ENDPOINT_URL")
 CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
@@ -27,10 +95,17 @@ CLOUDFLARE_ACCESS_KEY = os.getenv("CLOUDFLARE_ACCESS_KEY")
 CLOUDFLARE_ACCESS_KEY_ID = os.getenv("CLOUDFLARE_ACCESS_KEY_ID")
 CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
 
-def get_s3_client():
-	config = Config(signature_version='s3v4')
+def _build_s3_client():
+	config = Config(
+		signature_version='s3v4',
+		max_pool_connections=HTTP_POOL_SIZE,
+		connect_timeout=HTTP_CONNECT_TIMEOUT,
+		read_timeout=HTTP_READ_TIMEOUT,
+		tcp_keepalive=True,
+		retries={"max_attempts": 3, "mode": "standard"},
+	)
 
-	s3 = boto3.client(
+	return boto3.client(
 		's3',
 		endpoint_url=CLOUDFLARE_ENDPOINT_URL,
 		aws_access_key_id=CLOUDFLARE_ACCESS_KEY_ID,
@@ -38,15 +113,20 @@ def get_s3_client():
 		config=config
 	)
 
-	return s3
-    
+def get_s3_client():
+	# boto3 clients are thread-safe once built; building one is not
+	return shared_client("s3", _build_s3_client)
+
 MOONDREAM_API_KEY = os.getenv("MOONDREAM_API_KEY")
 def get_moondream_client():
-	return md.vl(api_key=MOONDREAM_API_KEY)
+	return shared_client("moondream", lambda: md.vl(api_key=MOONDREAM_API_KEY))
 	
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 DEEPGRAM_BASE_URL = "https://api.deepgram.com/v1"
 
+GOOGLE_VISION_API_KEY = os.getenv("GOOGLE_VISION_API_KEY")
+GOOGLE_VISION_BASE_URL = "https://vision.googleapis.com/v1"
+
 if __name__ == "__main__":
 	moondream_client = get_moondream_client()
 	openai_client = get_openai_client()
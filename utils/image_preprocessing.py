@@ -0,0 +1,129 @@
+import io
+import math
+import os
+
+from PIL import Image, ImageChops, ImageOps
+
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "1") == "1"
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "2048"))
+# Approximate vision-token cap (0 disables), see estimate_vision_tokens
+IMAGE_TOKEN_BUDGET = int(os.getenv("IMAGE_TOKEN_BUDGET", "0"))
+# Off by default: color carries meaning in photos, highlighted forms and charts
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "0") == "1"
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_TRIM_MARGINS = os.getenv("IMAGE_TRIM_MARGINS", "0") == "1"
+
+# Gemini bills images in 768px tiles of 258 tokens each
+VISION_TILE_SIZE = 768
+VISION_TOKENS_PER_TILE = 258
+
+# Pixels darker than this (on a white page) count as content when trimming
+TRIM_THRESHOLD = 24
+TRIM_PADDING = 16
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+	tiles = math.ceil(width / VISION_TILE_SIZE) * math.ceil(height / VISION_TILE_SIZE)
+	return max(tiles, 1) * VISION_TOKENS_PER_TILE
+
+
+def fit_to_token_budget(width: int, height: int, token_budget: int) -> tuple[int, int]:
+	"""Largest size with the same aspect ratio whose token estimate fits the budget."""
+	if not token_budget or estimate_vision_tokens(width, height) <= token_budget:
+		return width, height
+
+	scale = 1.0
+	while scale > 0.05:
+		scale *= 0.9
+		w, h = max(1, int(width * scale)), max(1, int(height * scale))
+		if estimate_vision_tokens(w, h) <= token_budget:
+			return w, h
+	return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def trim_margins(img: Image.Image) -> Image.Image:
+	"""Crop uniform white borders around the content."""
+	gray = img.convert("L")
+	background = Image.new("L", gray.size, 255)
+	diff = ImageChops.difference(gray, background).point(lambda p: 255 if p > TRIM_THRESHOLD else 0)
+	bbox = diff.getbbox()
+	if not bbox:
+		return img
+
+	left, top, right, bottom = bbox
+	return img.crop((
+		max(left - TRIM_PADDING, 0),
+		max(top - TRIM_PADDING, 0),
+		min(right + TRIM_PADDING, img.width),
+		min(bottom + TRIM_PADDING, img.height),
+	))
+
+
+def flatten(img: Image.Image, grayscale: bool) -> Image.Image:
+	"""Drop alpha onto a white page and convert to the target color mode."""
+	if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+		rgba = img.convert("RGBA")
+		page = Image.new("RGB", rgba.size, (255, 255, 255))
+		page.paste(rgba, mask=rgba.split()[-1])
+		img = page
+	return img.convert("L" if grayscale else "RGB")
+
+
+def preprocess_image(data: bytes,
+					 max_edge: int = IMAGE_MAX_EDGE,
+					 token_budget: int = IMAGE_TOKEN_BUDGET,
+					 grayscale: bool = IMAGE_GRAYSCALE,
+					 fmt: str = IMAGE_FORMAT,
+					 quality: int = IMAGE_QUALITY,
+					 trim: bool = IMAGE_TRIM_MARGINS) -> tuple[bytes, str, dict]:
+	"""
+	Shrink an image for a vision model.
+
+	Applies EXIF orientation, optionally trims blank margins, resizes to
+	`max_edge` and `token_budget`, optionally converts to grayscale and
+	recompresses.
+
+	Returns:
+		(image bytes, mime type, report with before/after bytes and sizes)
+	"""
+	img = Image.open(io.BytesIO(data))
+	source_format = img.format
+	input_size = img.size
+	rotated = img.getexif().get(0x0112, 1) != 1
+
+	img = ImageOps.exif_transpose(img)
+	if trim:
+		img = trim_margins(img)
+
+	width, height = img.size
+	if max_edge and max(width, height) > max_edge:
+		scale = max_edge / max(width, height)
+		width, height = max(1, int(width * scale)), max(1, int(height * scale))
+	width, height = fit_to_token_budget(width, height, token_budget)
+
+	img = flatten(img, grayscale)
+	if (width, height) != img.size:
+		img = img.resize((width, height), Image.LANCZOS)
+
+	buffer = io.BytesIO()
+	img.save(buffer, format=fmt, quality=quality, optimize=True)
+	output = buffer.getvalue()
+	mime_type = MIME_TYPES.get(fmt, f"image/{fmt.lower()}")
+
+	# Recompressing an already small, untouched image can make it bigger
+	untouched = img.size == input_size and not rotated
+	if len(output) >= len(data) and untouched and source_format in MIME_TYPES:
+		output, mime_type = data, MIME_TYPES[source_format]
+
+	report = {
+		"input_bytes": len(data),
+		"output_bytes": len(output),
+		"input_size": list(input_size),
+		"output_size": list(img.size),
+		"estimated_tokens": estimate_vision_tokens(*img.size),
+		"mime_type": mime_type,
+	}
+	return output, mime_type, report
@@ -1,10 +1,19 @@
 import base64
+import hashlib
 import io
+import mimetypes
 import os
+import time
 from utils.clients import CLOUDFLARE_BUCKET, get_s3_client
+from utils.image_preprocessing import IMAGE_PREPROCESS, preprocess_image
 from utils.paths import PROJECT_ROOT
 from PIL import Image, ImageDraw, ImageFont
 
+# "inline" sends base64 data URLs, "r2" uploads and sends a presigned URL,
+# "auto" inlines up to IMAGE_INLINE_MAX_BYTES and falls back to R2 above it
+IMAGE_TRANSPORT = os.getenv("IMAGE_TRANSPORT", "auto")
+IMAGE_INLINE_MAX_BYTES = int(os.getenv("IMAGE_INLINE_MAX_BYTES", str(4 * 1024 * 1024)))
+
 def base64_urls_from_images(paths):
 	base64_urls = []
 	for image_path in paths:
@@ -28,6 +37,58 @@ def s3_urls_from_images(paths):
 		urls.append(url)
 	return urls
 
+def base64_url_from_bytes(data: bytes, mime_type: str) -> str:
+	"""Encode image bytes as a data URL entirely in memory."""
+	return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+def s3_url_from_bytes(data: bytes, mime_type: str) -> str:
+	"""Upload image bytes under a content-addressed key and return a presigned URL."""
+	extension = mimetypes.guess_extension(mime_type) or ".bin"
+	key = f"images/{hashlib.sha256(data).hexdigest()}{extension}"
+	s3_client = get_s3_client()
+	s3_client.put_object(Bucket=CLOUDFLARE_BUCKET, Key=key, Body=io.BytesIO(data), ContentType=mime_type)
+	return s3_client.generate_presigned_url(
+		'get_object',
+		Params={'Bucket': CLOUDFLARE_BUCKET, 'Key': key},
+		ExpiresIn=3600
+	)
+
+def image_url_from_bytes(data: bytes, mime_type: str, mode: str = None) -> str:
+	"""Return a URL the vision model can read, using the configured transport."""
+	mode = mode or IMAGE_TRANSPORT
+	if mode == "auto":
+		mode = "inline" if len(data) <= IMAGE_INLINE_MAX_BYTES else "r2"
+	if mode not in ("inline", "r2"):
+		raise ValueError(f"Unsupported image transport: {mode}")
+
+	start = time.perf_counter()
+	url = base64_url_from_bytes(data, mime_type) if mode == "inline" else s3_url_from_bytes(data, mime_type)
+	elapsed_ms = (time.perf_counter() - start) * 1000
+	print(f"[image-transport] mode={mode} bytes={len(data)} took {elapsed_ms:.1f} ms")
+	return url
+
+def prepare_image_bytes(data: bytes, mime_type: str) -> tuple[bytes, str]:
+	"""Run the preprocessing pipeline if enabled, keeping the input on failure."""
+	if not IMAGE_PREPROCESS:
+		return data, mime_type
+	try:
+		data, mime_type, report = preprocess_image(data)
+	except Exception as e:
+		print(f"[image-preprocess] Skipped: {type(e).__name__}: {e}")
+		return data, mime_type
+	print(
+		f"[image-preprocess] {report['input_bytes']} -> {report['output_bytes']} bytes, "
+		f"{report['input_size']} -> {report['output_size']}, ~{report['estimated_tokens']} tokens"
+	)
+	return data, mime_type
+
+def image_url_from_path(path: str, mode: str = None) -> str:
+	mime_type = mimetypes.guess_type(path)[0] or "image/png"
+	with open(path, "rb") as f:
+		data = f.read()
+	data, mime_type = prepare_image_bytes(data, mime_type)
+	return image_url_from_bytes(data, mime_type, mode)
+
 def annotate_image_with_text(annotations: list[tuple[float, float, str]], image_path: str, output_path: str):
 	img = Image.open(image_path)
 	draw = ImageDraw.Draw(img)
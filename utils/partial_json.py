@@ -0,0 +1,99 @@
+import json
+
+
+class PartialJSONParser:
+	"""
+	Incremental parser for a streamed JSON object.
+
+	Text is fed in arbitrary pieces and every top-level field is returned
+	as soon as its value is complete, so a form can fill in while the model
+	is still writing. Anything before the opening brace (a ```json fence,
+	stray prose) is skipped. Values that don't parse are left out; the full
+	document parsed at the end stays authoritative.
+	"""
+
+	def __init__(self):
+		self.buffer = ""
+		self.pos = 0
+		self.started = False
+		self.finished = False
+		self.depth = 0
+		self.in_string = False
+		self.escaped = False
+		# What the top-level object expects next: key, colon, value or comma
+		self.expecting = "key"
+		self.key = None
+		self.token_start = None
+		self.fields = {}
+
+	def feed(self, text: str) -> list[tuple[str, object]]:
+		"""Add streamed text; returns the (key, value) pairs completed by it."""
+		self.buffer += text
+		completed = []
+		while self.pos < len(self.buffer) and not self.finished:
+			self._step(self.buffer[self.pos], completed)
+			self.pos += 1
+		return completed
+
+	def _emit(self, end: int, completed: list) -> None:
+		raw = self.buffer[self.token_start:end].strip()
+		self.token_start = None
+		self.expecting = "comma"
+		try:
+			value = json.loads(raw)
+		except json.JSONDecodeError:
+			return
+		self.fields[self.key] = value
+		completed.append((self.key, value))
+
+	def _step(self, char: str, completed: list) -> None:
+		i = self.pos
+		if not self.started:
+			if char == "{":
+				self.started, self.depth = True, 1
+			return
+
+		if self.in_string:
+			if self.escaped:
+				self.escaped = False
+			elif char == "\\":
+				self.escaped = True
+			elif char == '"':
+				self.in_string = False
+				if self.depth == 1 and self.expecting == "key":
+					try:
+						self.key = json.loads(self.buffer[self.token_start:i + 1])
+					except json.JSONDecodeError:
+						self.key = self.buffer[self.token_start + 1:i]
+					self.token_start = None
+					self.expecting = "colon"
+				elif self.depth == 1 and self.expecting == "value":
+					self._emit(i + 1, completed)
+			return
+
+		top_level = self.depth == 1
+		if char == '"':
+			self.in_string = True
+			if top_level and self.expecting in ("key", "value"):
+				self.token_start = i
+		elif char in "{[":
+			if top_level and self.expecting == "value":
+				self.token_start = i
+			self.depth += 1
+		elif char in "}]":
+			self.depth -= 1
+			if self.depth == 1 and self.expecting == "value" and self.token_start is not None:
+				self._emit(i + 1, completed)
+			elif self.depth == 0:
+				if self.expecting == "value" and self.token_start is not None:
+					self._emit(i, completed)
+				self.finished = True
+		elif top_level and char == ":" and self.expecting == "colon":
+			self.expecting = "value"
+		elif top_level and char == ",":
+			if self.expecting == "value" and self.token_start is not None:
+				self._emit(i, completed)
+			self.expecting = "key"
+		elif top_level and self.expecting == "value" and self.token_start is None and not char.isspace():
+			# Start of a number, true, false or null
+			self.token_start = i
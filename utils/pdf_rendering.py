@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "144"))
+# Requested dpi is clamped to this; render time and image size grow with its square
+PDF_MAX_DPI = int(os.getenv("PDF_MAX_DPI", "300"))
+PDF_RENDER_FORMAT = os.getenv("PDF_RENDER_FORMAT", "png").lower()
+PDF_RENDER_JPEG_QUALITY = int(os.getenv("PDF_RENDER_JPEG_QUALITY", "85"))
+# 0 renders in the calling thread instead of a process pool
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Workers never fork the server itself: its threads may hold locks (caches,
+# HTTP pools, executors) that a forked child would deadlock on
+PDF_RENDER_START_METHOD = os.getenv(
+	"PDF_RENDER_START_METHOD",
+	"forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "jpg": "image/jpeg"}
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def render_page(pdf_path: str, page_index: int, dpi: int = PDF_RENDER_DPI, fmt: str = PDF_RENDER_FORMAT) -> bytes:
+	"""Render one page to encoded image bytes, without touching the disk."""
+	with fitz.open(pdf_path) as doc:
+		pix = doc[page_index].get_pixmap(dpi=dpi)
+		if fmt in ("jpeg", "jpg"):
+			return pix.tobytes("jpeg", jpg_quality=PDF_RENDER_JPEG_QUALITY)
+		return pix.tobytes("png")
+
+
+def _noop() -> None:
+	pass
+
+
+def get_render_pool():
+	"""Process pool shared by all requests, created on first use."""
+	global _render_pool
+	# Render workers themselves render inline rather than start pools of their own
+	if PDF_RENDER_PROCESSES <= 0 or multiprocessing.parent_process() is not None:
+		return None
+	with _render_pool_lock:
+		if _render_pool is None:
+			context = multiprocessing.get_context(PDF_RENDER_START_METHOD)
+			if PDF_RENDER_START_METHOD == "forkserver":
+				# Only the renderer is loaded in the fork server, never the app's __main__
+				context.set_forkserver_preload([__name__])
+			_render_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_PROCESSES, mp_context=context)
+		return _render_pool
+
+
+def warm_render_pool() -> None:
+	"""Start the render workers ahead of the first PDF, from a background thread at startup."""
+	pool = get_render_pool()
+	if pool is not None:
+		pool.submit(_noop).result()
+
+
+def submit_render(pdf_path: str, page_index: int, dpi: int = PDF_RENDER_DPI, fmt: str = PDF_RENDER_FORMAT) -> Future:
+	"""Start rendering a page in the process pool; the future yields image bytes."""
+	pool = get_render_pool()
+	if pool is not None:
+		return pool.submit(render_page, pdf_path, page_index, dpi, fmt)
+
+	future = Future()
+	try:
+		future.set_result(render_page(pdf_path, page_index, dpi, fmt))
+	except Exception as e:
+		future.set_exception(e)
+	return future
+
+
+def render_mime_type(fmt: str = PDF_RENDER_FORMAT) -> str:
+	return MIME_TYPES.get(fmt, "image/png")
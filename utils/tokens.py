@@ -0,0 +1,35 @@
+import math
+import threading
+
+# Used when tiktoken or its encoding file is unavailable
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+	"""Load the tiktoken encoding once; None if it cannot be loaded."""
+	global _encoding, _encoding_loaded
+	if _encoding_loaded:
+		return _encoding
+	with _encoding_lock:
+		if not _encoding_loaded:
+			try:
+				import tiktoken
+				_encoding = tiktoken.get_encoding("o200k_base")
+			except Exception:
+				_encoding = None
+			_encoding_loaded = True
+	return _encoding
+
+
+def count_tokens(text: str) -> int:
+	"""Token count of a prompt fragment (exact with tiktoken, estimated otherwise)."""
+	if not text:
+		return 0
+	encoding = get_encoding()
+	if encoding is None:
+		return math.ceil(len(text) / CHARS_PER_TOKEN)
+	return len(encoding.encode(text, disallowed_special=()))